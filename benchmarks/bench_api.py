@@ -0,0 +1,99 @@
+# coding: utf-8
+"""Benchmark the FMG JSON RPC API against the mock FortiManager.
+
+Measure, for a given server latency:
+- get: one url per request
+- get_many: the same urls packed in batched requests
+- async get_many: the batches sent concurrently
+- get and stream_get of a large table
+
+Usage:
+    python benchmarks/bench_api.py [--latency 0.01] [--urls 200]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fmgshell"))
+
+from fmgjsonrpcapi import AsyncFMGJSONRPCAPI, FMGJSONRPCAPI
+from fmgmock import MockFMG, generate_tables
+
+
+def timed(function, *args):
+    """
+    Call a function and measure its duration.
+
+    Returns:
+        (tuple): the function output, the duration (in seconds)
+    """
+    start = time.perf_counter()
+    output = function(*args)
+
+    return output, time.perf_counter() - start
+
+
+async def async_get_many(mock, urls, max_in_flight):
+    """Fetch the urls with the async API."""
+    api = AsyncFMGJSONRPCAPI(max_in_flight)
+    await api.login(mock.ip, mock.username, mock.password, mock.port, "http")
+    start = time.perf_counter()
+    responses = await api.get_many(urls, chunk_size=10)
+    elapsed = time.perf_counter() - start
+    await api.logout()
+    await api.close()
+
+    return responses, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--urls", type=int, default=200)
+    parser.add_argument("--table-size", type=int, default=100000)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    args = parser.parse_args()
+
+    tables = generate_tables(addresses=args.table_size, groups=0, policies=0)
+    table_url = "/pm/config/adom/root/obj/firewall/address"
+    urls = [f"{table_url}/address_{idx}" for idx in range(args.urls)]
+
+    with MockFMG(tables, args.latency) as mock:
+        api = FMGJSONRPCAPI()
+        api.login(mock.ip, mock.username, mock.password, mock.port, "http")
+
+        print(f"Server latency: {args.latency * 1000:.0f} ms, {args.urls} urls")
+        print(f"{'call':<28} {'requests':>9} {'elapsed (s)':>12}")
+
+        results = []
+        requests = mock.requests
+        _, elapsed = timed(lambda: [api.get(url) for url in urls])
+        results.append(("get (one url per request)", mock.requests - requests, elapsed))
+
+        requests = mock.requests
+        _, elapsed = timed(api.get_many, urls)
+        results.append(("get_many", mock.requests - requests, elapsed))
+
+        requests = mock.requests
+        _, elapsed = asyncio.run(async_get_many(mock, urls, args.max_in_flight))
+        # The login and the logout are not part of the measure
+        results.append(("async get_many", mock.requests - requests - 2, elapsed))
+
+        requests = mock.requests
+        _, elapsed = timed(api.get, table_url)
+        results.append((f"get ({args.table_size} entries)", 1, elapsed))
+
+        _, elapsed = timed(lambda: sum(1 for _ in api.stream_get(table_url)))
+        results.append((f"stream_get ({args.table_size} entries)", 1, elapsed))
+
+        for name, count, elapsed in results:
+            print(f"{name:<28} {count:>9} {elapsed:>12.3f}")
+
+        api.logout()
+
+
+if __name__ == "__main__":
+    main()
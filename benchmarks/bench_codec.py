@@ -0,0 +1,114 @@
+# coding: utf-8
+"""Benchmark the JSON codecs.
+
+Compare the encode and decode throughput of the installed JSON codecs on a
+synthetic policy package response.
+
+Usage:
+    python benchmarks/bench_codec.py [--policies 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fmgshell"))
+
+from fmgcodec import get_available_codecs, get_codec
+
+
+def generate_policy_package(count, seed=0):
+    """
+    Generate a synthetic policy package response.
+
+    Args:
+        count (int): the number of policies
+        seed (int): the random seed
+
+    Returns:
+        (dict): the JSON RPC response
+    """
+    rng = random.Random(seed)
+    policies = []
+    for idx in range(count):
+        policies.append(
+            {
+                "policyid": idx + 1,
+                "name": f"policy_{idx + 1}",
+                "uuid": f"{rng.getrandbits(128):032x}",
+                "srcintf": [f"port{rng.randrange(1, 9)}"],
+                "dstintf": [f"port{rng.randrange(1, 9)}"],
+                "srcaddr": [f"address_{rng.randrange(10000)}" for _ in range(4)],
+                "dstaddr": [f"address_{rng.randrange(10000)}" for _ in range(4)],
+                "service": [rng.choice(["HTTP", "HTTPS", "DNS", "SSH", "ALL"])],
+                "schedule": ["always"],
+                "action": rng.randrange(2),
+                "logtraffic": 2,
+                "nat": 0,
+                "comments": f"Synthetic policy {idx + 1} for the codec benchmark",
+                "_byte": rng.randrange(10**9),
+                "_hitcount": rng.randrange(10**6),
+                "_last_hit": 1666000000 + rng.randrange(10**6),
+            }
+        )
+
+    return {
+        "id": 1,
+        "result": [
+            {
+                "data": policies,
+                "status": {"code": 0, "message": "OK"},
+                "url": "/pm/config/adom/root/pkg/default/firewall/policy",
+            }
+        ],
+    }
+
+
+def measure(function, arg, repeat):
+    """
+    Get the best duration of several calls.
+
+    Returns:
+        (float): the duration (in seconds)
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--policies", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    response = generate_policy_package(args.policies)
+
+    print(f"Policy package: {args.policies} policies")
+    print(
+        f"{'codec':<8} {'size (MB)':>10} {'encode (ms)':>12} {'MB/s':>8}"
+        f" {'decode (ms)':>12} {'MB/s':>8}"
+    )
+    for name in get_available_codecs():
+        codec = get_codec(name)
+        body = codec.encode(response)
+        assert codec.decode(body) == response
+        size = len(body) / 1024 / 1024
+        encode_time = measure(codec.encode, response, args.repeat)
+        decode_time = measure(codec.decode, body, args.repeat)
+        print(
+            f"{name:<8} {size:>10.1f} {encode_time * 1000:>12.1f}"
+            f" {size / encode_time:>8.0f} {decode_time * 1000:>12.1f}"
+            f" {size / decode_time:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
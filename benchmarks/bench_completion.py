@@ -0,0 +1,85 @@
+# coding: utf-8
+"""Benchmark the FMG FS path completion.
+
+Measure fmgshell_get_matching_paths latency in a directory of 10k and 100k
+children, for prefixes of increasing length.
+
+Usage:
+    python benchmarks/bench_completion.py [--children 10000 100000]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fmgshell"))
+
+from fmgfs import Node
+from fmgshell_helpers import fmgshell_get_matching_paths
+
+
+def build_tree(count, seed=0):
+    """
+    Build a FMG FS with a table of count entries.
+
+    Args:
+        count (int): the number of table entries
+        seed (int): the random seed
+
+    Returns:
+        (Node): the root node
+    """
+    rng = random.Random(seed)
+    root = Node("root")
+    node = root
+    for name in ["pm", "config", "adom", "root", "obj", "firewall", "address"]:
+        child = Node(name)
+        node.add_child(child)
+        node = child
+
+    while len(node.children) < count:
+        name = "".join(rng.choice(string.ascii_lowercase) for _ in range(3))
+        node.add_child(Node(f"{name}_{rng.randrange(10**6)}"))
+
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--children", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--keystrokes", type=int, default=200)
+    args = parser.parse_args()
+
+    directory = "/pm/config/adom/root/obj/firewall/address/"
+    print(f"{'children':>9} {'prefix':>7} {'matches':>8} {'latency (ms)':>13}")
+    for count in args.children:
+        root = build_tree(count)
+        fmgshell = types.SimpleNamespace(fmg_fs=root, display_matches=[])
+        rng = random.Random(1)
+        for prefix_len in range(4):
+            prefixes = [
+                "".join(rng.choice(string.ascii_lowercase) for _ in range(prefix_len))
+                for _ in range(args.keystrokes)
+            ]
+            # The first keystroke builds the prefix index
+            fmgshell_get_matching_paths(fmgshell, directory)
+
+            matches = 0
+            start = time.perf_counter()
+            for prefix in prefixes:
+                matches += len(
+                    fmgshell_get_matching_paths(fmgshell, directory + prefix)
+                )
+            elapsed = (time.perf_counter() - start) / len(prefixes)
+            print(
+                f"{count:>9} {prefix_len:>7} {matches / len(prefixes):>8.0f}"
+                f" {elapsed * 1000:>13.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
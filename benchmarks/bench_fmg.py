@@ -0,0 +1,141 @@
+# coding: utf-8
+"""Benchmark the FMG cache and the live FMG FS against the mock FortiManager.
+
+Measure:
+- FMG.get: uncached, cached and validated with a checksum, cached and
+  trusted during the cache validity window
+- FMG.revalidate_cache over all the cached urls
+- the completion in a live table: when the entry names are fetched, when
+  they are validated with a checksum, and when they are trusted
+
+Usage:
+    python benchmarks/bench_fmg.py [--latency 0.01] [--entries 10000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import types
+
+FMGSHELL_DIR = os.path.join(os.path.dirname(__file__), "..", "fmgshell")
+FMG_SUPPORTED_PATH = os.path.join(FMGSHELL_DIR, "fmg_supported_path")
+
+sys.path.insert(0, FMGSHELL_DIR)
+
+from fmg import FMG
+from fmgfs import FMGFS
+from fmgmock import MockFMG, generate_tables
+from fmgshell_helpers import fmgshell_get_matching_paths
+
+
+def measure(mock, function, repeat):
+    """
+    Call a function several times.
+
+    Returns:
+        (tuple): the mean duration (in seconds), the mean number of JSON RPC
+        requests per call
+    """
+    requests = mock.requests
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    elapsed = time.perf_counter() - start
+
+    return elapsed / repeat, (mock.requests - requests) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    tables = generate_tables(adoms=4, addresses=args.entries, groups=0, policies=0)
+    table_url = "/pm/config/adom/root/obj/firewall/address"
+
+    with MockFMG(tables, args.latency) as mock:
+        fmg = FMG(cache_validity=0)
+        fmg.login(mock.ip, mock.username, mock.password, mock.port, "http")
+
+        results = []
+
+        def uncached():
+            fmg.cache.clear()
+            fmg.get(table_url, cache=True)
+
+        results.append(("get (uncached)", *measure(mock, uncached, args.repeat)))
+
+        fmg.get(table_url, cache=True)
+        results.append(
+            (
+                "get (cached, validated)",
+                *measure(mock, lambda: fmg.get(table_url, cache=True), args.repeat),
+            )
+        )
+
+        fmg.cache_validity = 60
+        results.append(
+            (
+                "get (cached, trusted)",
+                *measure(mock, lambda: fmg.get(table_url, cache=True), args.repeat),
+            )
+        )
+        fmg.cache_validity = 0
+
+        urls = [f"/pm/config/adom/adom{idx}/obj/firewall/address" for idx in (1, 2, 3)]
+        fmg.get_many(urls + [table_url], cache=True)
+        results.append(
+            (
+                f"revalidate_cache ({len(fmg.cache.entries)} entries)",
+                *measure(mock, fmg.revalidate_cache, args.repeat),
+            )
+        )
+
+        fmg_fs = FMGFS("root", file=FMG_SUPPORTED_PATH)
+        fmg_fs.fmg = fmg
+        fmgshell = types.SimpleNamespace(fmg_fs=fmg_fs, display_matches=[])
+        text = f"{table_url}/address_1"
+
+        def first_keystroke():
+            fmg.cache.clear()
+            fmgshell_get_matching_paths(fmgshell, text)
+
+        results.append(
+            ("completion (names fetched)", *measure(mock, first_keystroke, 5))
+        )
+        results.append(
+            (
+                "completion (names validated)",
+                *measure(
+                    mock,
+                    lambda: fmgshell_get_matching_paths(fmgshell, text),
+                    args.repeat,
+                ),
+            )
+        )
+
+        fmg.cache_validity = 60
+        results.append(
+            (
+                "completion (names trusted)",
+                *measure(
+                    mock,
+                    lambda: fmgshell_get_matching_paths(fmgshell, text),
+                    args.repeat,
+                ),
+            )
+        )
+
+        fmg.logout()
+
+    print(f"Server latency: {args.latency * 1000:.0f} ms, {args.entries} entries")
+    print(f"{'call':<34} {'requests':>9} {'latency (ms)':>13}")
+    for name, elapsed, requests in results:
+        print(f"{name:<34} {requests:>9.1f} {elapsed * 1000:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# coding: utf-8
+"""Benchmark the FMG FS tree.
+
+Measure the load time (from the supported path file and from its snapshot)
+and the memory of a FMG FS built from a synthetic supported path file, and
+the get_node_by_path time.
+
+Usage:
+    python benchmarks/bench_fmgfs.py [--paths 60000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fmgshell"))
+
+from fmgfs import Node, read_snapshot, write_snapshot
+
+
+def generate_paths(count, seed=0):
+    """
+    Generate synthetic supported paths, shaped like the FortiManager ones.
+
+    Args:
+        count (int): the number of paths
+        seed (int): the random seed
+
+    Returns:
+        (list): the paths
+    """
+    rng = random.Random(seed)
+    prefixes = [
+        "/pm/config/adom/*/obj",
+        "/pm/config/global/obj",
+        "/pm/config/device/*/vdom/*",
+        "/pm/config/adom/*/pkg/*",
+    ]
+    categories = [f"category{i}" for i in range(60)]
+
+    paths = set()
+    while len(paths) < count:
+        prefix = rng.choice(prefixes)
+        category = rng.choice(categories)
+        table = f"table{rng.randrange(400)}"
+        depth = rng.randrange(3)
+        subtables = "/".join(f"sub{rng.randrange(20)}" for _ in range(depth))
+        path = f"{prefix}/{category}/{table}"
+        if subtables:
+            path = f"{path}/{subtables}"
+        paths.add(f"{path}/*")
+
+    return sorted(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paths", type=int, default=60000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    paths = generate_paths(args.paths)
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("\n".join(paths))
+        file = f.name
+
+    try:
+        start = time.perf_counter()
+        root = Node("root")
+        root.load(file)
+        load_time = time.perf_counter() - start
+
+        # tracemalloc slows down the load, so memory is measured apart
+        tracemalloc.start()
+        tree = Node("root")
+        tree.load(file)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del tree
+
+        snapshot = f"{file}.snapshot"
+        write_snapshot(root, file, snapshot)
+        start = time.perf_counter()
+        read_snapshot(Node("root"), file, snapshot)
+        snapshot_time = time.perf_counter() - start
+        snapshot_size = os.path.getsize(snapshot)
+        os.unlink(snapshot)
+    finally:
+        os.unlink(file)
+
+    rng = random.Random(1)
+    lookups = [rng.choice(paths) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for path in lookups:
+        root.get_node_by_path(path)
+    lookup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for path in lookups:
+        root.get_node_by_path(path).get_full_path()
+    full_path_time = time.perf_counter() - start - lookup_time
+
+    print(f"Supported paths        : {len(paths)}")
+    print(f"Load time              : {load_time * 1000:.1f} ms")
+    print(f"Load time (snapshot)   : {snapshot_time * 1000:.1f} ms")
+    print(f"Snapshot size          : {snapshot_size / 1024:.1f} KB")
+    print(f"Memory (tree)          : {current / 1024 / 1024:.1f} MB")
+    print(f"Memory (peak)          : {peak / 1024 / 1024:.1f} MB")
+    print(f"get_node_by_path       : {lookup_time / args.lookups * 1e6:.2f} us")
+    print(f"get_full_path (cached) : {full_path_time / args.lookups * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
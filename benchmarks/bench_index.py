@@ -0,0 +1,70 @@
+# coding: utf-8
+"""Benchmark the local search index.
+
+Measure the time to index synthetic FortiManager tables, to reindex one of
+them, and to search them.
+
+Usage:
+    python benchmarks/bench_index.py [--adoms 10] [--addresses 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fmgshell"))
+
+from fmgindex import SEARCH_LIMIT, SearchIndex
+from fmgmock import generate_tables
+
+QUERIES = ["address_1234", "10.0.19.72", "group_12 address_2012", "addr*", "synthetic"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--adoms", type=int, default=10)
+    parser.add_argument("--addresses", type=int, default=20000)
+    parser.add_argument("--groups", type=int, default=2000)
+    parser.add_argument("--policies", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tables = generate_tables(args.adoms, args.addresses, args.groups, args.policies)
+    tables = {url: data for url, data in tables.items() if isinstance(data, list)}
+    fields = sum(
+        len(entry) for entries in tables.values() for entry in entries if entry
+    )
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    for url, entries in tables.items():
+        index.index_table(url, entries)
+    elapsed = time.perf_counter() - start
+    stats = index.stats()
+    print(
+        f"Indexed {stats['entries']} entries ({fields} fields) of "
+        f"{stats['tables']} tables in {elapsed:.2f} s: {stats['tokens']} tokens, "
+        f"{stats['postings']} postings"
+    )
+
+    url = max(tables, key=lambda url: len(tables[url]))
+    start = time.perf_counter()
+    index.index_table(url, tables[url])
+    elapsed = time.perf_counter() - start
+    print(f"Reindexed {url} ({len(tables[url])} entries) in {elapsed * 1000:.0f} ms")
+
+    print(f"{'query':<24} {'results':>8} {'time (ms)':>10}")
+    for query in QUERIES:
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results = index.search(query, limit=args.limit)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{query:<24} {len(results):>8} {best * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# coding: utf-8
+"""Benchmark the address and policy lookups.
+
+Measure the compile time of the lookups of a synthetic ADOM, and the time
+of the "which objects contain this IP address" and "which policy matches
+this 5-tuple" queries.
+
+Usage:
+    python benchmarks/bench_lookup.py [--addresses 200000] [--policies 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fmgshell"))
+
+from fmglookup import AddressLookup, PolicyLookup
+from fmgmock import generate_tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--addresses", type=int, default=200000)
+    parser.add_argument("--groups", type=int, default=20000)
+    parser.add_argument("--policies", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=10000)
+    args = parser.parse_args()
+
+    tables = generate_tables(1, args.addresses, args.groups, args.policies)
+    prefix = "/pm/config/adom/root"
+
+    start = time.perf_counter()
+    addresses = AddressLookup(
+        tables[f"{prefix}/obj/firewall/address"],
+        tables[f"{prefix}/obj/firewall/addrgrp"],
+    )
+    policies = PolicyLookup(
+        tables[f"{prefix}/pkg/default/firewall/policy"],
+        addresses,
+        tables[f"{prefix}/obj/firewall/service/custom"],
+        [],
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"Compiled {args.addresses} addresses, {args.groups} groups and "
+        f"{args.policies} policies in {elapsed:.2f} s"
+    )
+
+    rng = random.Random(0)
+    ips = [
+        f"10.0.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(args.queries)
+    ]
+    ports = [rng.randrange(1, 65536) for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    for ip in ips:
+        addresses.lookup(ip)
+    elapsed = time.perf_counter() - start
+    print(f"IP lookup: {elapsed / args.queries * 1000:.3f} ms per query")
+
+    matched = 0
+    start = time.perf_counter()
+    for ip, port in zip(ips, ports):
+        if policies.first_match(ip, "192.0.2.1", "tcp", port) is not None:
+            matched += 1
+    elapsed = time.perf_counter() - start
+    print(
+        f"Policy lookup: {elapsed / args.queries * 1000:.3f} ms per query "
+        f"({matched}/{args.queries} matched)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# coding: utf-8
+"""Benchmark the startup time of fmgshell one-shot commands.
+
+Measure the wall time of processes running:
+- the bare interpreter, as a floor
+- "import fmgshell", which is what every run paid before the -c mode
+  (the interactive shell imports cmd2 and all the subsystems)
+- fmgshell -c "find ...", which needs no login
+- fmgshell -c "get system status" with the password (login, session saved)
+- fmgshell -c "get system status" reusing the saved session
+
+The commands query a mock FortiManager started by the benchmark.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+FMGSHELL_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "fmgshell"
+)
+sys.path.insert(0, FMGSHELL_DIR)
+
+from fmgbatch import PASSWORD_ENV
+from fmgmock import MockFMG, generate_tables
+
+
+def time_process(argv, env, runs):
+    """
+    Run a process several times and measure its wall time.
+
+    Returns:
+        (tuple): the mean and min durations (in seconds)
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, env=env, cwd=FMGSHELL_DIR, check=True, capture_output=True)
+        durations.append(time.perf_counter() - start)
+
+    return statistics.mean(durations), min(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    mock = MockFMG(generate_tables(1, 100, 10, 100))
+    port = mock.start()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, XDG_CACHE_HOME=directory)
+        env.pop(PASSWORD_ENV, None)
+        login_env = dict(env, **{PASSWORD_ENV: mock.password})
+
+        main_py = [sys.executable, "main.py"]
+        fmg_args = ["-i", mock.ip, "-u", mock.username, "--port", str(port)]
+        fmg_args += ["--proto", "http", "-c", "get system status"]
+        cases = [
+            ("interpreter", [sys.executable, "-c", "pass"], env),
+            ("import fmgshell", [sys.executable, "-c", "import fmgshell"], env),
+            ("-c find (no login)", main_py + ["-c", f"find x -d {directory}"], env),
+            ("-c get (login)", main_py + fmg_args, login_env),
+            ("-c get (saved session)", main_py + fmg_args, env),
+        ]
+
+        # Save a session for the last case
+        subprocess.run(
+            cases[3][1],
+            env=login_env,
+            cwd=FMGSHELL_DIR,
+            check=True,
+            capture_output=True,
+        )
+
+        for name, argv, case_env in cases:
+            mean, best = time_process(argv, case_env, args.runs)
+            print(f"{name:24}: mean {mean * 1000:6.1f} ms, min {best * 1000:6.1f} ms")
+
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# coding: utf-8
+"""Benchmark the JSON RPC response decoding paths.
+
+Compare the peak RSS and the elapsed time of FMGJSONRPCAPI.get (whole body
+read, then decoded) and FMGJSONRPCAPI.stream_get (incremental decoding) on a
+synthetic table response.
+
+Usage:
+    python benchmarks/bench_stream.py [--size-mb 200]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fmgshell"))
+
+ENTRY_TEMPLATE = {
+    "name": None,
+    "type": "ipmask",
+    "subnet": ["10.0.0.0", "255.255.255.0"],
+    "comment": "Synthetic address object used by the streaming benchmark",
+    "color": 0,
+    "associated-interface": ["any"],
+    "uuid": "2b0d7a2e-5c66-51eb-0e5f-0e1a2f3c4d5e",
+}
+
+
+class SyntheticTableHandler(BaseHTTPRequestHandler):
+    """Answer any JSON RPC request with a table of size_mb megabytes."""
+
+    size_mb = 200
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        request = json.loads(self.rfile.read(length))
+
+        # No Content-Length: the body ends when the connection is closed
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        self.wfile.write(b'{"id": %d, "result": [{"data": [' % request["id"])
+        size = 0
+        idx = 0
+        batch = []
+        while size < self.size_mb * 1024 * 1024:
+            entry = dict(ENTRY_TEMPLATE, name=f"address_{idx}")
+            chunk = json.dumps(entry)
+            if idx:
+                chunk = ", " + chunk
+            batch.append(chunk)
+            size += len(chunk)
+            idx += 1
+            if len(batch) == 1000:
+                self.wfile.write("".join(batch).encode())
+                batch = []
+        self.wfile.write("".join(batch).encode())
+        self.wfile.write(
+            b'], "status": {"code": 0, "message": "OK"}, "url": "/bench"}]}'
+        )
+
+
+def run_client(mode, port):
+    """Fetch the synthetic table and report the number of entries."""
+    from fmgjsonrpcapi import FMGJSONRPCAPI
+
+    api = FMGJSONRPCAPI()
+    api.base_url = f"http://127.0.0.1:{port}/jsonrpc"
+
+    start = time.perf_counter()
+    if mode == "json":
+        response = api.get("/bench")
+        count = len(response["result"][0]["data"])
+    else:
+        count = sum(1 for _ in api.stream_get("/bench"))
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"entries": count, "elapsed": elapsed, "max_rss_kb": max_rss}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--client", choices=["json", "stream"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        run_client(args.client, args.port)
+        return
+
+    SyntheticTableHandler.size_mb = args.size_mb
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SyntheticTableHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    print(f"Synthetic response: {args.size_mb} MB")
+    print(f"{'path':<8} {'entries':>10} {'elapsed (s)':>12} {'peak RSS (MB)':>14}")
+    for mode in ["json", "stream"]:
+        # Each path runs in its own process so peak RSS is not shared
+        output = subprocess.run(
+            [sys.executable, __file__, "--client", mode, "--port", str(port)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output)
+        print(
+            f"{mode:<8} {result['entries']:>10} {result['elapsed']:>12.2f}"
+            f" {result['max_rss_kb'] / 1024:>14.1f}"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
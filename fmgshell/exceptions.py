@@ -3,10 +3,33 @@
 
 
 class FMGJSONRPCAPI_EXCEPTION(Exception):
-    def __init__(self):
-        pass
+    def __init__(self, *args):
+        super().__init__(*args)
 
 
 class WrongDebugFlag(FMGJSONRPCAPI_EXCEPTION):
     def __init__(self):
         pass
+
+
+class WrongResponseStatus(FMGJSONRPCAPI_EXCEPTION):
+    def __init__(self, url, status):
+        self.url = url
+        self.status = status
+        super().__init__(f"{url}: {status.get('message')} ({status.get('code')})")
+
+
+class ReplayMiss(FMGJSONRPCAPI_EXCEPTION):
+    def __init__(self, url, payload):
+        self.url = url
+        self.payload = payload
+        super().__init__(f"{url}: no recorded response for this request")
+
+
+class LoginFailed(FMGJSONRPCAPI_EXCEPTION):
+    def __init__(self, url, status):
+        self.url = url
+        self.status = status
+        super().__init__(
+            f"{url}: login failed: {status.get('message')} ({status.get('code')})"
+        )
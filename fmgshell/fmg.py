@@ -2,21 +2,67 @@
 
 """A class to represent a FortiManager."""
 
-from fmgjsonrpcapi import FMGJSONRPCAPI
+import concurrent.futures
+import gzip
+import threading
+import time
+
+import requests
+
+from exceptions import WrongResponseStatus
+from fmgcache import CACHE_MAX_BYTES, STORE_MAX_BYTES, PersistentStore, ResponseCache
+from fmgjsonrpcapi import (
+    MAX_IN_FLIGHT,
+    STATUS_INVALID_SESSION,
+    AsyncFMGJSONRPCAPI,
+    FMGJSONRPCAPI,
+)
+from fmgtable import TABLE_NAME_KEYS
+from fmgtask import TaskMonitor
+
+# Default number of table entries fetched per request by FMG.iter_table
+PAGE_SIZE = 1000
+
+# How long the system status is cached (in seconds)
+SYSTEM_STATUS_TTL = 3600
+
+# How long a checksum is trusted without asking FortiManager again (in seconds)
+CACHE_VALIDITY = 0
+
+# How long the entry names of a table without checksum are cached (in seconds)
+TABLE_NAMES_TTL = 300
+
+# Tables listing the ADOMs
+ADOM_TABLES = ["/dvmdb/adom", "/pm/config/adom", "/pm/pkg/adom"]
+
+# The policy packages of an ADOM (i.e., the entries of
+# /pm/config/adom/<adom>/pkg in the FMG FS) are listed by this table
+PACKAGE_TABLE_URL = "/pm/pkg/adom/{adom}"
+
+# Default number of tables exported concurrently by FMG.export
+EXPORT_WORKERS = 8
+
+# Exported entries are written to disk by batches of this size (in bytes)
+EXPORT_BATCH_BYTES = 1024 * 1024
 
 
 class FMG:
     """A FortiManager class."""
 
-    def __init__(self):
-        self.api = FMGJSONRPCAPI()
-        self.system_status = None
-        self.adoms_cache = {
-            "adom_list": [],
-            "checksum": None,
-        }
+    def __init__(
+        self, cache_max_bytes=CACHE_MAX_BYTES, cache_validity=CACHE_VALIDITY, codec=None
+    ):
+        self.api = FMGJSONRPCAPI(codec)
+        self.cache = ResponseCache(cache_max_bytes, codec=self.api.codec)
 
-    def login(self, ip, username, password, port):
+        # The last known checksums: url -> (checksum, when it was retrieved)
+        self.checksums = {}
+        self.cache_validity = cache_validity
+
+        # The FortiManager tasks being watched
+        self.tasks = TaskMonitor(self.api)
+
+    def login(self, ip, username, password, port, proto="https", persist_session=False):
         """Login to FortiManager.
 
         Args:
@@ -24,27 +70,309 @@ class FMG:
             username (str): FortiManager username
             password (str): FortiManager password
             port (int): FortiManager port (default is 443)
+            proto (string): "http" or "https" (default is "https")
+            persist_session (bool): reuse and save the session across runs
+
+        Raises:
+            LoginFailed: FortiManager didn't return a session
         """
-        self.api.login(ip, username, password, port)
+        self.api.login(ip, username, password, port, proto, persist_session)
 
     def logout(self):
         """Logout from FortiManager."""
 
+        self.tasks.stop()
         self.api.logout()
+        self.api.stop_transport()
+        self.disable_persistent_cache()
 
-    def get(self, url, attributes=None):
+    def enable_persistent_cache(self, ip, port, username, max_bytes=STORE_MAX_BYTES):
+        """Keep the cached responses on disk, so they survive restarts.
+
+        Args:
+            ip (str): FortiManager IP address or FQDN
+            port (int): FortiManager port
+            username (str): FortiManager username
+            max_bytes (int): Max size of the on-disk cache (in bytes)
+        """
+        self.disable_persistent_cache()
+        self.cache.store = PersistentStore.for_host(
+            ip, port, username, max_bytes, self.api.codec
+        )
+
+    def disable_persistent_cache(self):
+        """Stop using the on-disk cache."""
+
+        if self.cache.store:
+            self.cache.store.close()
+            self.cache.store = None
+
+    def get(self, url, attributes=None, cache=False, ttl=None, validate=True):
         """Get a table or an object definition.
 
+        With cache, the response is served from the response cache when its
+        checksum didn't change (see get_checksum()). A checksum retrieved
+        less than cache_validity seconds ago is not retrieved again. An url
+        without checksum is served from the cache only with a ttl. The
+        returned response is then shared with the cache and must not be
+        modified.
+
         Args:
             url (str): The path to the table or the object.
             attributes (dict): The list of extra attributes like "option",
                                "fields", "filter", etc.
+            cache (bool): Use the response cache. Defaults to False.
+            ttl (float): Max age of the cached response (in seconds).
+                         Defaults to None (i.e., no max age).
+            validate (bool): Validate the cached response with the url
+                             checksum; otherwise, only the ttl applies.
+                             Defaults to True.
 
         Returns:
             (dict) The table or object definition.
         """
 
-        return self.api.get(url, attributes)
+        if not cache:
+            return self.api.get(url, attributes)
+
+        key = ResponseCache.key(url, attributes)
+        entry = self.cache.get(key)
+
+        checksum = None
+        if entry is not None:
+            if validate:
+                checksum = self._get_current_checksum(url)
+            if not validate or self._is_entry_valid(entry, checksum):
+                self._record_cache(url, True)
+                return entry.data
+
+        self._record_cache(url, False)
+
+        if validate and entry is None:
+            # Fetch the checksum along with the response, in one request
+            checksum_response, response = self.api.get_many(
+                [(url, {"option": "devinfo"}), (url, attributes)]
+            )
+            checksum = self._get_checksum_from_response(checksum_response)
+            self.checksums[url] = (checksum, time.time())
+        else:
+            response = self.api.get(url, attributes)
+
+        if response["result"][0].get("status", {}).get("code") == 0:
+            # The size includes the checksum result, a few bytes
+            self.cache.put(
+                key, url, response, checksum, ttl, self.api.get_response_bytes()
+            )
+
+        return response
+
+    @staticmethod
+    def _is_entry_valid(entry, checksum):
+        """Check whether a cached response can be served.
+
+        A response is valid while its url checksum is the same. Without
+        checksum, only a response cached with a ttl is valid (expired
+        entries are not returned by the cache); otherwise it would be served
+        forever.
+
+        Args:
+            entry (CacheEntry): The cached response.
+            checksum (str): The current checksum of its url, or None.
+
+        Returns:
+            (bool)
+        """
+
+        if checksum is not None:
+            return entry.checksum == checksum
+
+        return entry.checksum is None and entry.expires is not None
+
+    def _record_cache(self, url, hit):
+        """Count a response cache lookup.
+
+        Args:
+            url (str): The path to the table or the object.
+            hit (bool): Whether the response was cached.
+        """
+
+        if hit:
+            self.cache.hits += 1
+        else:
+            self.cache.misses += 1
+        self.api.stats.record_cache(url, hit)
+
+    def cache_stats(self):
+        """Get the response cache statistics.
+
+        Returns:
+            (dict) The hits, misses, evictions, size, etc.
+        """
+
+        return self.cache.stats()
+
+    def iter_table(self, url, attributes=None, page_size=PAGE_SIZE):
+        """Iterate over the entries of a table, one page at a time.
+
+        The table is fetched with the "range" option, and each page is
+        decoded while it is received, so memory stays bounded.
+
+        Args:
+            url (str): The path to the table.
+            attributes (dict): The list of extra attributes like "fields",
+                               "filter", etc.
+            page_size (int): The number of entries fetched per request.
+
+        Raises:
+            WrongResponseStatus: FortiManager returned an error.
+
+        Yields:
+            (dict) The table entries.
+        """
+        offset = 0
+        while True:
+            page_attributes = dict(attributes) if attributes else {}
+            page_attributes["range"] = [offset, page_size]
+
+            count = 0
+            for entry in self.iter_get(url, page_attributes):
+                yield entry
+                count = count + 1
+
+            if count < page_size:
+                return
+
+            offset = offset + count
+
+    def iter_get(self, url, attributes=None):
+        """Iterate over the entries of a table while they are received.
+
+        The response is decoded incrementally, so neither the raw response
+        nor the whole table are held in memory.
+
+        Args:
+            url (str): The path to the table or the object.
+            attributes (dict): The list of extra attributes like "option",
+                               "fields", "filter", etc.
+
+        Raises:
+            WrongResponseStatus: FortiManager returned an error.
+
+        Yields:
+            (dict) The table entries.
+        """
+        session = self.api.json_rpc["session"]
+        stream = self.api.stream_get(url, attributes)
+        count = 0
+        for idx, entry in stream:
+            yield entry
+            count = count + 1
+
+        results = stream.response.get("result") or [{}]
+        status = results[0].get("status", {})
+        if (
+            status.get("code") == STATUS_INVALID_SESSION
+            and count == 0
+            and self.api.renew_session(session)
+        ):
+            # The session was invalidated before anything was received
+            stream = self.api.stream_get(url, attributes)
+            for idx, entry in stream:
+                yield entry
+
+            results = stream.response.get("result") or [{}]
+            status = results[0].get("status", {})
+
+        if status.get("code") != 0:
+            raise WrongResponseStatus(url, status)
+
+    def get_many(self, urls_with_attributes, cache=False, ttl=None):
+        """Get several tables or object definitions in a single request.
+
+        With cache, all the checksums are retrieved in one request, then the
+        responses which are not in the cache, or whose checksum changed, are
+        retrieved in another one. As with get(), an url without checksum is
+        served from the cache only with a ttl.
+
+        Args:
+            urls_with_attributes (list): list of urls (str) or of (url,
+                                         attributes) tuples.
+            cache (bool): Use the response cache. Defaults to False.
+            ttl (float): Max age of the cached responses (in seconds).
+                         Defaults to None (i.e., no max age).
+
+        Returns:
+            (list) One response per url, in the same order. Per url errors
+                   are reported in the response "status".
+        """
+
+        if not cache:
+            return self.api.get_many(urls_with_attributes)
+
+        items = []
+        for item in urls_with_attributes:
+            if isinstance(item, str):
+                items.append((item, None))
+            else:
+                items.append(tuple(item))
+
+        now = time.time()
+        stale_urls = [url for url, _ in items if not self._is_checksum_fresh(url, now)]
+        if stale_urls:
+            self.get_checksums(stale_urls)
+
+        responses = []
+        missing = []
+        for idx, (url, attributes) in enumerate(items):
+            entry = self.cache.get(ResponseCache.key(url, attributes))
+            if entry is not None and self._is_entry_valid(
+                entry, self.checksums[url][0]
+            ):
+                self._record_cache(url, True)
+                responses.append(entry.data)
+            else:
+                self._record_cache(url, False)
+                responses.append(None)
+                missing.append(idx)
+
+        fetched = self.api.get_many([items[idx] for idx in missing])
+        # The size of a response is only known when it was alone in its
+        # request
+        size = self.api.get_response_bytes() if len(missing) == 1 else None
+        for idx, response in zip(missing, fetched):
+            url, attributes = items[idx]
+            responses[idx] = response
+            if response["result"][0].get("status", {}).get("code") == 0:
+                key = ResponseCache.key(url, attributes)
+                self.cache.put(key, url, response, self.checksums[url][0], ttl, size)
+
+        return responses
+
+    def get_data_many(self, urls_with_attributes, cache=False):
+        """Get the data of several tables or object definitions at once.
+
+        Args:
+            urls_with_attributes (iterable): urls (str) or (url, attributes)
+                                             tuples.
+            cache (bool): Use the response cache. Defaults to False.
+
+        Returns:
+            (dict) url -> data. The data is None when the url failed.
+        """
+        # It is iterated twice, a generator would be exhausted by get_many()
+        urls_with_attributes = list(urls_with_attributes)
+        responses = self.get_many(urls_with_attributes, cache)
+
+        data = {}
+        for item, response in zip(urls_with_attributes, responses):
+            url = item if isinstance(item, str) else item[0]
+            result = response["result"][0]
+            if result.get("status", {}).get("code") == 0:
+                data[url] = result.get("data")
+            else:
+                data[url] = None
+
+        return data
 
     def debug(self, flag="show"):
         return self.api.debug(flag)
@@ -59,12 +387,29 @@ class FMG:
         Returns:
             [dict]: the list of items composing the "get system status"
         """
-        if self.system_status == None or force_refresh:
-            url = "/cli/global/system/status"
-            response = self.api.get(url)
-            self.system_status = response["result"][0]["data"]
+        url = "/cli/global/system/status"
+        if force_refresh:
+            self.cache.remove_url(url)
+
+        response = self.get(url, cache=True, ttl=SYSTEM_STATUS_TTL, validate=False)
+
+        return response["result"][0]["data"]
+
+    @staticmethod
+    def _get_checksum_from_response(response):
+        """
+        Extract the checksum from an "option: devinfo" response.
+
+        Args:
+            response (dict): The JSON RPC output
 
-        return self.system_status
+        Returns:
+            (str): The checksum or None
+        """
+        try:
+            return response["result"][0]["data"]["uuid"]
+        except (KeyError, IndexError, TypeError):
+            return None
 
     def get_checksum(self, url):
         """
@@ -74,24 +419,129 @@ class FMG:
             url (str): The FortiManager table of object.
 
         Returns:
-            (str): The checksum
+            (str): The checksum or None when url doesn't provide any
         """
         attributes = {"option": "devinfo"}
         response = self.get(url, attributes)
-        return response["result"][0]["data"]["uuid"]
+        checksum = self._get_checksum_from_response(response)
+        self.checksums[url] = (checksum, time.time())
 
-    def get_adoms(self):
+        return checksum
+
+    def get_checksums(self, urls):
         """
-        Get the ADOM list.
+        Retrieve the checksums of several tables or objects in one request.
+
+        Args:
+            urls (list): The FortiManager tables or objects.
 
         Returns:
-            (list): the ADOM list
+            (dict): url -> checksum (None when url doesn't provide any)
+        """
+        urls = list(dict.fromkeys(urls))
+        attributes = {"option": "devinfo"}
+        responses = self.api.get_many([(url, attributes) for url in urls])
+
+        now = time.time()
+        checksums = {}
+        for url, response in zip(urls, responses):
+            checksum = self._get_checksum_from_response(response)
+            checksums[url] = checksum
+            self.checksums[url] = (checksum, now)
+
+        return checksums
+
+    def _is_checksum_fresh(self, url, now=None):
         """
-        url = "/dvmdb/adom"
-        # First retrieve the checksum
-        checksum = self.get_checksum(url)
+        Check whether the last known checksum of url can be trusted.
 
-        if checksum != self.adoms_cache["checksum"]:
+        Args:
+            url (str): The FortiManager table of object.
+            now (float, optional): The current time.
+
+        Returns:
+            (bool)
+        """
+        known = self.checksums.get(url)
+        if known is None:
+            return False
+        if now is None:
+            now = time.time()
+
+        return now - known[1] < self.cache_validity
+
+    def _get_current_checksum(self, url):
+        """
+        Get the checksum of url, retrieving it only if the last known one
+        can't be trusted anymore.
+
+        Args:
+            url (str): The FortiManager table of object.
+
+        Returns:
+            (str): The checksum or None when url doesn't provide any
+        """
+        if self._is_checksum_fresh(url):
+            return self.checksums[url][0]
+
+        return self.get_checksum(url)
+
+    def revalidate_cache(self, urls=None):
+        """
+        Revalidate the cached responses, in memory and on disk, with their
+        checksums retrieved in bulk. Responses whose checksum changed are
+        dropped.
+
+        Args:
+            urls (list, optional): Only revalidate these urls. Defaults to
+                                   all the cached urls.
+
+        Returns:
+            (set): The urls whose checksum changed.
+        """
+        cached = self.cache.checksums()
+
+        # Responses cached without checksum only rely on their TTL
+        cached = {key: checksum for key, checksum in cached.items() if checksum}
+        if urls is not None:
+            urls = set(urls)
+            cached = {
+                key: checksum for key, checksum in cached.items() if key[0] in urls
+            }
+
+        checksums = self.get_checksums(key[0] for key in cached)
+
+        changed = set()
+        for key, checksum in cached.items():
+            if checksums[key[0]] != checksum:
+                self.cache.remove(key)
+                changed.add(key[0])
+
+        return changed
+
+    def get_table_names(self, url):
+        """
+        Get the names of the entries of a table.
+
+        Only the name attribute is fetched, a page at a time. The names are
+        cached, and refetched only when the table checksum changed.
+
+        The ADOMs and the policy packages of an ADOM are listed by other
+        tables (see ADOM_TABLES and PACKAGE_TABLE_URL).
+
+        Args:
+            url (str): The FortiManager table.
+
+        Raises:
+            WrongResponseStatus: FortiManager returned an error.
+
+        Returns:
+            (list): the entry names. It is shared with the cache and must not
+                    be modified.
+        """
+        if url in ADOM_TABLES:
+            url = "/dvmdb/adom"
+            name_key = "name"
             attributes = {
                 "filter": [
                     "restricted_prds",
@@ -101,33 +551,247 @@ class FMG:
                 "fields": ["name"],
                 "loadsub": 0,
             }
-            response = self.get(url, attributes)
+        else:
+            elements = url.split("/")
+            if elements[:4] == ["", "pm", "config", "adom"] and elements[5:] == ["pkg"]:
+                url = PACKAGE_TABLE_URL.format(adom=elements[4])
+            name_key = TABLE_NAME_KEYS.get(url.rsplit("/", 1)[-1], "name")
+            attributes = {"fields": [name_key]}
+
+        key = ResponseCache.key(url, {"names": attributes})
+        entry = self.cache.get(key)
+        checksum = self._get_current_checksum(url)
+        if entry is not None and self._is_entry_valid(entry, checksum):
+            self._record_cache(url, True)
+            return entry.data
+
+        self._record_cache(url, False)
+
+        names = []
+        for table_entry in self.iter_table(url, attributes):
+            name = table_entry.get(name_key)
+            if name is None:
+                continue
+            name = str(name)
+            if url == "/dvmdb/adom" and name == "rootp":
+                name = "global"
+            names.append(name)
+
+        ttl = None if checksum else TABLE_NAMES_TTL
+        self.cache.put(key, url, names, checksum, ttl)
+
+        return names
 
-            adom_list = []
-            for adom in response["result"][0]["data"]:
-                name = adom["name"]
-                if name == "rootp":
-                    name = "global"
-                adom_list.append(name)
+    def get_adoms(self):
+        """
+        Get the ADOM list.
+
+        The ADOM list is cached, and refetched only when its checksum
+        changed.
+
+        Returns:
+            (list): the ADOM list
+        """
+        return list(self.get_table_names("/dvmdb/adom"))
+
+    def export(
+        self, node, file, workers=EXPORT_WORKERS, page_size=PAGE_SIZE, progress=None
+    ):
+        """Export the tables below a FMG FS node to a NDJSON file.
 
-            # We update the cached checksum and adom_list
-            self.adoms_cache["checksum"] = checksum
-            self.adoms_cache["adom_list"] = adom_list
+        The tables are found by walking the FMG FS (see Node.iter_tables()),
+        and fetched concurrently by a pool of workers. Their entries are
+        streamed to the file, so no table is held in memory. Each line holds
+        an entry along with its table url:
 
-        return self.adoms_cache["adom_list"]
+            {"url": "/pm/config/adom/root/obj/firewall/address", "data": {...}}
+
+        A failing table, or a path whose tables couldn't be listed, is
+        reported in the "errors" statistic; it doesn't stop the export.
+
+        Args:
+            node (Node): the FMG FS node to export
+            file (str): the NDJSON file, gzip compressed if it ends with ".gz"
+            workers (int): the number of tables fetched concurrently
+            page_size (int): the number of entries fetched per request
+            progress (callable, optional): called with the statistics each
+                                           time entries are written
+
+        Returns:
+            (dict): the export statistics: "tables" (exported so far),
+                    "pending" (found but not exported yet), "entries",
+                    "bytes", "elapsed" (in seconds) and "errors" (a list of
+                    (url, error message) tuples)
+        """
+        codec = self.api.codec
+        stats = {
+            "tables": 0,
+            "pending": 0,
+            "entries": 0,
+            "bytes": 0,
+            "elapsed": 0.0,
+            "errors": [],
+        }
+        lock = threading.Lock()
+        stop = threading.Event()
+        start = time.perf_counter()
+
+        # One pooled connection per worker
+        self.api.set_pool_size(workers)
+
+        def write(fh, lines, done=False):
+            with lock:
+                fh.write(b"".join(lines))
+                stats["entries"] += len(lines)
+                stats["bytes"] += sum(len(line) for line in lines)
+                if done:
+                    stats["tables"] += 1
+                    stats["pending"] -= 1
+                stats["elapsed"] = time.perf_counter() - start
+                snapshot = dict(stats, errors=list(stats["errors"]))
+            if progress:
+                progress(snapshot)
+
+        def export_table(fh, table):
+            url = table.get_full_path()
+            if table.is_table():
+                entries = self.iter_table(url, page_size=page_size)
+            else:
+                entries = self.iter_get(url)
+
+            lines = []
+            size = 0
+            try:
+                for entry in entries:
+                    line = codec.encode({"url": url, "data": entry}) + b"\n"
+                    lines.append(line)
+                    size += len(line)
+                    if size >= EXPORT_BATCH_BYTES:
+                        write(fh, lines)
+                        lines = []
+                        size = 0
+                        if stop.is_set():
+                            return
+            except (WrongResponseStatus, requests.exceptions.RequestException) as error:
+                with lock:
+                    stats["errors"].append((url, str(error)))
+
+            write(fh, lines, done=True)
+
+        opener = gzip.open if file.endswith(".gz") else open
+        with opener(file, "wb") as fh:
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="fmgexport"
+            )
+            try:
+                futures = []
+                walk_errors = []
+                for table in node.iter_tables(walk_errors):
+                    with lock:
+                        stats["pending"] += 1
+                    futures.append(executor.submit(export_table, fh, table))
+                with lock:
+                    stats["errors"].extend(walk_errors)
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+            except BaseException:
+                stop.set()
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+            executor.shutdown(wait=True)
+
+        stats["elapsed"] = time.perf_counter() - start
+
+        return stats
+
+
+class AsyncFMG:
+    """A FortiManager class for asyncio.
+
+    Use it to fan out requests (i.e., across ADOMs or devices) with at most
+    max_in_flight requests sent at once:
+
+        async with AsyncFMG(max_in_flight=32) as fmg:
+            await fmg.login(ip, username, password, port)
+            responses = await asyncio.gather(*[fmg.get(url) for url in urls])
+            await fmg.logout()
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, http2=False):
+        self.api = AsyncFMGJSONRPCAPI(max_in_flight, http2=http2)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def login(
+        self, ip, username, password, port, proto="https", persist_session=False
+    ):
+        """Login to FortiManager.
+
+        Args:
+            ip (str): FortiManager IP address or FQDN
+            username (str): FortiManager username
+            password (str): FortiManager password
+            port (int): FortiManager port (default is 443)
+            proto (string): "http" or "https" (default is "https")
+            persist_session (bool): reuse and save the session across runs
+
+        Raises:
+            LoginFailed: FortiManager didn't return a session
+        """
+        await self.api.login(ip, username, password, port, proto, persist_session)
+
+    async def logout(self):
+        """Logout from FortiManager."""
+
+        await self.api.logout()
+
+    async def close(self):
+        """Release the connection and thread pools."""
+
+        await self.api.close()
+
+    async def get(self, url, attributes=None):
+        """Get a table or an object definition.
+
+        Args:
+            url (str): The path to the table or the object.
+            attributes (dict): The list of extra attributes like "option",
+                               "fields", "filter", etc.
+
+        Returns:
+            (dict) The table or object definition.
+        """
+
+        return await self.api.get(url, attributes)
+
+    async def get_many(self, urls_with_attributes):
+        """Get several tables or object definitions.
+
+        Args:
+            urls_with_attributes (list): list of urls (str) or of (url,
+                                         attributes) tuples.
+
+        Returns:
+            (list) One response per url, in the same order.
+        """
+
+        return await self.api.get_many(urls_with_attributes)
+
+    def debug(self, flag="show"):
+        return self.api.debug(flag)
 
 
 if __name__ == "__main__":
-    ip = "secops-labs-004.gcp.fortipoc.net"
-    # ip = "10.210.35.200"
-    port = 10407
-    # port = 443
-    username = "admin"
-    password = "fortinet"
-
-    fmg = FMG()
-    fmg.login(ip, username, password, port)
-    fmg.debug("off")
-    fmg.get_adoms()
-    fmg.debug("off")
-    fmg.logout()
\ No newline at end of file
+    from fmgmock import MockFMG
+
+    with MockFMG() as mock:
+        fmg = FMG()
+        fmg.login(mock.ip, mock.username, mock.password, mock.port, "http")
+        fmg.debug("off")
+        print(fmg.get_adoms())
+        fmg.debug("off")
+        fmg.logout()
@@ -0,0 +1,339 @@
+# coding: utf-8
+"""Non-interactive fmgshell: run commands, print their output in JSON.
+
+Each command prints one JSON line:
+
+    {"command": "get system status", "status": "ok", "result": {...}}
+    {"command": "ls /nowhere", "status": "error", "error": "Wrong path."}
+
+It is meant to be called often (e.g., by monitoring), so it starts fast:
+cmd2 isn't imported, each command only imports the modules it needs, and it
+logs in only for the commands querying FortiManager. The session is saved
+and reused by the next runs while it is valid (see FMGJSONRPCAPI.login()),
+so it never logs out.
+"""
+
+import argparse
+import json
+import os
+import shlex
+
+from fmgfs import FMG_SUPPORTED_PATH
+
+# Environment variable holding the FortiManager password
+PASSWORD_ENV = "FMGSHELL_PASSWORD"
+
+# Default max number of seconds the task watch command waits
+TASK_WATCH_TIMEOUT = 3600.0
+
+
+class BatchCommandError(Exception):
+    """A command failed; the message is reported in its JSON output."""
+
+
+class BatchArgumentParser(argparse.ArgumentParser):
+    """An ArgumentParser raising BatchCommandError instead of exiting."""
+
+    def error(self, message):
+        raise BatchCommandError(f"{self.prog}: {message}")
+
+    def exit(self, status=0, message=None):
+        raise BatchCommandError(message or f"{self.prog}: exit {status}")
+
+
+def build_parsers():
+    """
+    Build the parsers of the batch commands; they mirror the shell ones.
+
+    Returns:
+        (dict): command name -> parser
+    """
+    # Imported here, they are only needed to parse the commands
+    from fmgindex import SEARCH_LIMIT
+    from fmglookup import LOOKUP_ADOM, LOOKUP_PACKAGE
+    from fmgmirror import MIRROR_DIR
+
+    parsers = {}
+
+    parser = parsers["get"] = BatchArgumentParser(prog="get")
+    parser.add_argument("what", nargs="+", help="'system status' or an url")
+    parser.add_argument("--fields", nargs="+", help="Fields of the entries")
+    parser.add_argument("--filter", help="JSON RPC filter, in JSON")
+    parser.add_argument("--refresh", action="store_true")
+
+    parser = parsers["ls"] = BatchArgumentParser(prog="ls")
+    parser.add_argument("path", nargs="?", default="/", help="Absolute path")
+
+    parser = parsers["find"] = BatchArgumentParser(prog="find")
+    parser.add_argument("terms", nargs="+")
+    parser.add_argument("-d", "--directory", default=MIRROR_DIR)
+    parser.add_argument("-e", "--export", action="append", default=[])
+    parser.add_argument("-p", "--path")
+    parser.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+
+    parser = parsers["lookup"] = BatchArgumentParser(prog="lookup")
+    subparsers = parser.add_subparsers(dest="lookup", required=True)
+    lookup_ip = subparsers.add_parser("ip")
+    lookup_ip.add_argument("ip")
+    lookup_ip.add_argument("-a", "--adom", default=LOOKUP_ADOM)
+    lookup_policy = subparsers.add_parser("policy")
+    lookup_policy.add_argument("src")
+    lookup_policy.add_argument("dst")
+    lookup_policy.add_argument("protocol")
+    lookup_policy.add_argument("dst_port", type=int, nargs="?")
+    lookup_policy.add_argument("-a", "--adom", default=LOOKUP_ADOM)
+    lookup_policy.add_argument("-P", "--package", default=LOOKUP_PACKAGE)
+    lookup_policy.add_argument("--src-port", type=int)
+    lookup_policy.add_argument("--srcintf")
+    lookup_policy.add_argument("--dstintf")
+    lookup_policy.add_argument("--all", action="store_true")
+
+    parser = parsers["task"] = BatchArgumentParser(prog="task")
+    subparsers = parser.add_subparsers(dest="task", required=True)
+    task_watch = subparsers.add_parser("watch")
+    task_watch.add_argument("task_ids", type=int, nargs="+")
+    task_watch.add_argument("--timeout", type=float, default=TASK_WATCH_TIMEOUT)
+
+    return parsers
+
+
+class Batch:
+    """Run fmgshell commands non-interactively."""
+
+    def __init__(self, ip=None, username=None, password=None, port=443, proto="https"):
+        """
+        Args:
+            ip (str, optional): FortiManager IP address or FQDN
+            username (str, optional): FortiManager username
+            password (str, optional): FortiManager password; without it, only
+                                      a saved session can be used
+            port (int, optional): FortiManager port (default is 443)
+            proto (str, optional): "http" or "https" (default is "https")
+        """
+        self.ip = ip
+        self.username = username
+        self.password = password
+        self.port = port
+        self.proto = proto
+
+        self._parsers = None
+        self._fmg = None
+        self._fmg_fs = None
+        self._lookups = None
+
+    @property
+    def fmg(self):
+        """The FMG, logged in on first use."""
+        if self._fmg is not None:
+            return self._fmg
+
+        if not (self.ip and self.username):
+            raise BatchCommandError("You need to login first (--ip and --username).")
+
+        from exceptions import LoginFailed
+        from fmg import FMG
+
+        fmg = FMG()
+        if self.password is None:
+            if not fmg.api.resume_session(
+                self.ip, self.username, self.port, self.proto
+            ):
+                raise BatchCommandError(
+                    f"No valid saved session, set {PASSWORD_ENV} to log in."
+                )
+        else:
+            try:
+                fmg.login(
+                    self.ip,
+                    self.username,
+                    self.password,
+                    self.port,
+                    self.proto,
+                    persist_session=True,
+                )
+            except LoginFailed as error:
+                raise BatchCommandError(str(error)) from error
+
+        self._fmg = fmg
+
+        return fmg
+
+    @property
+    def fmg_fs(self):
+        """The FMG FS, attached to the FMG."""
+        if self._fmg_fs is None:
+            from fmgfs import FMGFS
+
+            file = os.path.join(os.path.dirname(__file__), FMG_SUPPORTED_PATH)
+            self._fmg_fs = FMGFS("root", file=file, fmg=self.fmg)
+
+        return self._fmg_fs
+
+    def run(self, line):
+        """
+        Run a command.
+
+        Args:
+            line (str): the command line
+
+        Returns:
+            (dict): the JSON output
+        """
+        record = {"command": line}
+        try:
+            argv = shlex.split(line)
+            if self._parsers is None:
+                self._parsers = build_parsers()
+            parser = self._parsers.get(argv[0])
+            if parser is None:
+                raise BatchCommandError(f"Unknown command: {argv[0]}")
+            args = parser.parse_args(argv[1:])
+            record["result"] = getattr(self, f"do_{argv[0]}")(args)
+            record["status"] = "ok"
+        except Exception as error:
+            # Whatever went wrong is reported in the output
+            record["status"] = "error"
+            record["error"] = str(error) or type(error).__name__
+
+        return record
+
+    def run_lines(self, lines, output):
+        """
+        Run commands, writing one JSON line per command.
+
+        Args:
+            lines (iterable): the command lines; the empty ones and the
+                              comments (starting with "#") are skipped
+            output (file): where the JSON lines are written
+
+        Returns:
+            (int): 0 when all the commands succeeded, 1 otherwise
+        """
+        exit_status = 0
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            record = self.run(line)
+            if record["status"] != "ok":
+                exit_status = 1
+            output.write(json.dumps(record, default=str) + "\n")
+            output.flush()
+
+        return exit_status
+
+    def do_get(self, args):
+        """Get the system status, or a table or object."""
+        if args.what == ["system", "status"]:
+            return self.fmg.get_system_status(force_refresh=args.refresh)
+
+        if len(args.what) != 1 or not args.what[0].startswith("/"):
+            raise BatchCommandError("get: expected 'system status' or an url")
+
+        attributes = {}
+        if args.fields:
+            attributes["fields"] = args.fields
+        if args.filter:
+            attributes["filter"] = json.loads(args.filter)
+
+        response = self.fmg.get(args.what[0], attributes)
+        result = response["result"][0]
+        if result.get("status", {}).get("code") != 0:
+            from exceptions import WrongResponseStatus
+
+            raise WrongResponseStatus(args.what[0], result.get("status", {}))
+
+        return result.get("data")
+
+    def do_ls(self, args):
+        """List directory content or table entries."""
+        from fmgfs import FMGFS_WrongPath
+        from fmgshell_helpers import fmgshell_get_entry_name
+
+        # Without a working directory, an empty path is the root
+        if args.path.strip("/") == "":
+            return list(self.fmg_fs.get_children_by_name())
+        if not args.path.startswith("/"):
+            raise BatchCommandError("ls: expected an absolute path")
+
+        try:
+            node = self.fmg_fs.get_node_by_path(args.path)
+        except FMGFS_WrongPath:
+            pass
+        else:
+            return list(node.get_children_by_name())
+
+        if "*" in args.path:
+            raise BatchCommandError("Wrong path.")
+
+        return [
+            fmgshell_get_entry_name(entry)
+            for entry in self.fmg.iter_table(args.path.rstrip("/"))
+        ]
+
+    def do_find(self, args):
+        """Search the mirror and the export files; no login is needed."""
+        from fmgindex import SearchIndex
+        from fmgmirror import MANIFEST_FILE, Mirror
+
+        index = SearchIndex()
+        if os.path.exists(os.path.join(args.directory, MANIFEST_FILE)):
+            # The mirror only needs the codec of the FMG
+            from fmg import FMG
+
+            index.update_from_mirror(Mirror(FMG(), args.directory))
+        if args.export:
+            from fmgcodec import get_codec
+
+            for file in args.export:
+                index.update_from_export(file, get_codec())
+
+        results = index.search(" ".join(args.terms), args.path, args.limit)
+
+        return [{"url": url, "key": key} for url, key in results]
+
+    def do_lookup(self, args):
+        """Look up the objects containing an IP address, or the policies
+        matching a 5-tuple."""
+        from fmglookup import Lookups
+
+        if self._lookups is None:
+            self._lookups = Lookups(self.fmg)
+
+        if args.lookup == "ip":
+            addresses, groups = self._lookups.get_address_lookup(args.adom).lookup(
+                args.ip
+            )
+            return {"addresses": addresses, "groups": groups}
+
+        lookup = self._lookups.get_policy_lookup(args.adom, args.package)
+        policies = lookup.all_matches(
+            args.src,
+            args.dst,
+            args.protocol,
+            args.dst_port,
+            src_port=args.src_port,
+            srcintf=args.srcintf,
+            dstintf=args.dstintf,
+        )
+
+        return policies if args.all else policies[:1]
+
+    def do_task(self, args):
+        """Wait for tasks to finish."""
+        import concurrent.futures
+
+        futures = self.fmg.tasks.watch_many(args.task_ids)
+        done, pending = concurrent.futures.wait(futures.values(), timeout=args.timeout)
+
+        results = []
+        for task_id, future in futures.items():
+            if future in pending:
+                results.append({"id": task_id, "error": "timeout"})
+            elif future.exception() is not None:
+                results.append({"id": task_id, "error": str(future.exception())})
+            else:
+                results.append(future.result())
+        self.fmg.tasks.stop()
+
+        return results
@@ -0,0 +1,588 @@
+# coding: utf-8
+"""Cache for FortiManager JSON RPC responses."""
+
+import collections
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from fmgcodec import get_codec
+from fmglog import logger
+
+# Default max size of the cached responses (in bytes)
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Default max size of the on-disk cache (in bytes)
+STORE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Number of reads of the on-disk cache whose access time is kept in memory
+# before it is written; it is also written with the next response stored
+STORE_ACCESS_BATCH = 100
+
+
+def user_cache_dir():
+    """
+    Get the fmgshell directory in the user's cache dir.
+
+    Returns:
+        (str): the directory path; it is created if needed
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    path = os.path.join(cache_home, "fmgshell")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+    return path
+
+
+class CacheEntry:
+    """A cached response."""
+
+    __slots__ = ("key", "url", "data", "checksum", "size", "created", "expires")
+
+    def __init__(self, key, url, data, checksum, size, ttl=None, created=None):
+        """
+        Args:
+            key (tuple): the cache key
+            url (str): the FMG JSON RPC API url
+            data (dict): the cached response
+            checksum (str): the url checksum when the response was fetched
+            size (int): the response size (in bytes)
+            ttl (float, optional): time to live (in seconds). Defaults to None
+            (i.e., no expiration).
+            created (float, optional): when the response was fetched.
+            Defaults to now.
+        """
+        self.key = key
+        self.url = url
+        self.data = data
+        self.checksum = checksum
+        self.size = size
+        self.created = created if created is not None else time.time()
+        self.expires = self.created + ttl if ttl is not None else None
+
+    def is_expired(self, now=None):
+        """
+        Check whether the entry outlived its TTL.
+
+        Returns:
+            (bool)
+        """
+        if self.expires is None:
+            return False
+        if now is None:
+            now = time.time()
+
+        return now >= self.expires
+
+
+class ResponseCache:
+    """LRU cache of JSON RPC responses, bounded in memory.
+
+    Entries are keyed by (url, normalized attributes). Each entry keeps the
+    url checksum it was fetched with, so the caller can validate it against
+    the current one.
+
+    When a PersistentStore is attached, entries are also written to it, and
+    entries missing from memory are looked up in it.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, store=None, codec=None):
+        """
+        Args:
+            max_bytes (int): max size of the cached responses (in bytes)
+            store (PersistentStore, optional): the on-disk cache
+            codec (StdlibCodec, optional): the JSON codec used to size and
+                                           store the responses. Defaults to
+                                           the fastest one installed.
+        """
+        self.max_bytes = max_bytes
+        self.store = store
+        self.codec = codec if codec else get_codec()
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        # Total size of the responses ever added (in bytes)
+        self.added_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.store_loads = 0
+        self.evictions = 0
+        self.expirations = 0
+        # Called with (key, url, data, checksum) for each response put in the
+        # cache (e.g., by SearchIndex)
+        self.listeners = []
+
+        # The cache can be used from several threads (i.e., prefetching)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(url, attributes=None):
+        """
+        Build the cache key for a request.
+
+        Args:
+            url (str): the FMG JSON RPC API url
+            attributes (dict, optional): the extra attributes of the request
+
+        Returns:
+            (tuple): the cache key
+        """
+        if not attributes:
+            return (url, "")
+
+        return (url, json.dumps(attributes, sort_keys=True, separators=(",", ":")))
+
+    def get(self, key):
+        """
+        Get a cached entry.
+
+        Expired entries are dropped.
+
+        Args:
+            key (tuple): the cache key
+
+        Returns:
+            (CacheEntry): the entry or None
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None and self.store:
+                entry = self.store.get(key)
+                if entry is not None:
+                    self.store_loads += 1
+                    if entry.size <= self.max_bytes:
+                        self._add(entry)
+
+            if entry is None:
+                return None
+
+            if entry.is_expired():
+                self.expirations += 1
+                self.remove(key)
+                return None
+
+            if key in self.entries:
+                self.entries.move_to_end(key)
+
+            return entry
+
+    def put(self, key, url, data, checksum=None, ttl=None, size=None):
+        """
+        Add or replace a cached entry, then evict the least recently used
+        entries until the cache fits in max_bytes.
+
+        Args:
+            key (tuple): the cache key
+            url (str): the FMG JSON RPC API url
+            data (dict): the response to cache
+            checksum (str, optional): the url checksum
+            ttl (float, optional): time to live (in seconds)
+            size (int, optional): the size of the response as received;
+                                  without it, the response is encoded to
+                                  measure it
+
+        Returns:
+            (CacheEntry): the new entry or None if the response is too big to
+            be cached
+        """
+        # The store needs the encoded response anyway
+        body = None
+        if size is None or self.store:
+            body = self.codec.encode(data)
+            size = len(body)
+        entry = CacheEntry(key, url, data, checksum, size, ttl)
+
+        with self._lock:
+            self.remove(key)
+            self.added_bytes += entry.size
+
+            if self.store:
+                self.store.put(entry, body)
+
+            if entry.size <= self.max_bytes:
+                self._add(entry)
+            else:
+                entry = None
+
+        for listener in self.listeners:
+            listener(key, url, data, checksum)
+
+        return entry
+
+    def _add(self, entry):
+        """
+        Add an entry in memory, then evict the least recently used entries
+        until the cache fits in max_bytes; the caller holds the lock.
+
+        Args:
+            entry (CacheEntry): the entry
+        """
+        self.entries[entry.key] = entry
+        self.size += entry.size
+
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def remove(self, key):
+        """
+        Remove an entry.
+
+        Args:
+            key (tuple): the cache key
+        """
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry.size
+            if self.store:
+                self.store.remove(key)
+
+    def remove_url(self, url):
+        """
+        Remove all entries for an url, whatever their attributes.
+
+        Args:
+            url (str): the FMG JSON RPC API url
+        """
+        with self._lock:
+            for key in [key for key in self.entries if key[0] == url]:
+                self.remove(key)
+            if self.store:
+                self.store.remove_url(url)
+
+    def checksums(self):
+        """
+        Get the keys and checksums of all entries, in memory and on disk.
+
+        Returns:
+            (dict): key -> checksum
+        """
+        with self._lock:
+            checksums = {key: entry.checksum for key, entry in self.entries.items()}
+            if self.store:
+                for url, attributes, checksum in self.store.checksums():
+                    checksums.setdefault((url, attributes), checksum)
+
+        return checksums
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+            if self.store:
+                self.store.clear()
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns:
+            (dict): the cache statistics
+        """
+        lookups = self.hits + self.misses
+
+        stats = {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "added_bytes": self.added_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+        if self.store:
+            stats["store_loads"] = self.store_loads
+            stats.update(self.store.stats())
+
+        return stats
+
+
+class PersistentStore:
+    """On-disk cache of JSON RPC responses, in a SQLite database.
+
+    The responses are stored compressed, along with their checksum, so a new
+    session only has to revalidate the checksums. When the database grows
+    over max_bytes, the least recently used responses are evicted.
+
+    It is only a cache: a corrupted database is recreated, and a response
+    which can't be read is dropped.
+    """
+
+    def __init__(self, path, max_bytes=STORE_MAX_BYTES, codec=None):
+        """
+        Args:
+            path (str): the SQLite database file
+            max_bytes (int): max size of the stored responses (in bytes)
+            codec (StdlibCodec, optional): the JSON codec used to decode the
+                                           stored responses. Defaults to the
+                                           fastest one installed.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.codec = codec if codec else get_codec()
+        self.evictions = 0
+        # key -> access time of the reads not written yet
+        self._accessed = {}
+
+        # The store can be used from several threads
+        self._lock = threading.Lock()
+        self._db = None
+        try:
+            self._open()
+        except sqlite3.DatabaseError as error:
+            # The database couldn't be opened at all
+            if self._db is None:
+                raise
+            logger.warning("Recreating the corrupted cache %s: %s", path, error)
+            self._db.close()
+            for file in (path, f"{path}-journal"):
+                if os.path.exists(file):
+                    os.unlink(file)
+            self._open()
+
+    def _open(self):
+        """Open the database, and create its table if needed."""
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        os.chmod(self.path, 0o600)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT NOT NULL,
+                attributes TEXT NOT NULL,
+                checksum TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                expires REAL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (url, attributes)
+            )
+            """)
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+        )
+        self._db.commit()
+        self.size = self._db.execute(
+            "SELECT COALESCE(SUM(LENGTH(body)), 0) FROM responses"
+        ).fetchone()[0]
+
+    @classmethod
+    def for_host(cls, ip, port, username, max_bytes=STORE_MAX_BYTES, codec=None):
+        """
+        Open the store of a FortiManager, in the user's cache dir.
+
+        Each FortiManager user gets its own store since what it can read
+        depends on its permissions.
+
+        Args:
+            ip (str): FortiManager IP address or FQDN
+            port (int): FortiManager port
+            username (str): FortiManager username
+            max_bytes (int): max size of the stored responses (in bytes)
+            codec (StdlibCodec, optional): the JSON codec
+
+        Returns:
+            (PersistentStore): the store
+        """
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{ip}_{port}_{username}")
+        path = os.path.join(user_cache_dir(), f"{name}.sqlite")
+
+        return cls(path, max_bytes, codec)
+
+    def get(self, key):
+        """
+        Get a stored response.
+
+        Args:
+            key (tuple): the cache key
+
+        Returns:
+            (CacheEntry): the entry or None
+        """
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT checksum, body, created, expires FROM responses "
+                    "WHERE url = ? AND attributes = ?",
+                    key,
+                ).fetchone()
+            except sqlite3.DatabaseError as error:
+                logger.warning("Cannot read the cache %s: %s", self.path, error)
+                return None
+            if row is None:
+                return None
+
+            # The access times are written in batches (see _write_accessed())
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= STORE_ACCESS_BATCH:
+                self._write_accessed()
+                self._db.commit()
+
+        checksum, body, created, expires = row
+        try:
+            body = zlib.decompress(body)
+            data = self.codec.decode(body)
+        except (zlib.error, ValueError) as error:
+            # ValueError covers the JSON and UTF-8 decoding errors
+            logger.warning("Dropping the corrupted cached %s: %s", key[0], error)
+            self.remove(key)
+            return None
+        entry = CacheEntry(key, key[0], data, checksum, len(body), created=created)
+        entry.expires = expires
+
+        return entry
+
+    def _write_accessed(self):
+        """
+        Write the access times of the reads; the caller holds the lock and
+        commits.
+        """
+        self._db.executemany(
+            "UPDATE responses SET accessed = ? WHERE url = ? AND attributes = ?",
+            [(accessed, *key) for key, accessed in self._accessed.items()],
+        )
+        self._accessed.clear()
+
+    def put(self, entry, body):
+        """
+        Store a response, then evict the least recently used responses until
+        the store fits in max_bytes.
+
+        Args:
+            entry (CacheEntry): the entry
+            body (bytes): the response in JSON format
+        """
+        blob = zlib.compress(body)
+        if len(blob) > self.max_bytes:
+            return
+
+        with self._lock:
+            # The least recently used responses are evicted below
+            self._write_accessed()
+            self._remove(entry.key)
+            self._db.execute(
+                "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    *entry.key,
+                    entry.checksum,
+                    blob,
+                    entry.size,
+                    entry.created,
+                    entry.expires,
+                    time.time(),
+                ),
+            )
+            self.size += len(blob)
+
+            while self.size > self.max_bytes:
+                url, attributes, length = self._db.execute(
+                    "SELECT url, attributes, LENGTH(body) FROM responses "
+                    "ORDER BY accessed LIMIT 1"
+                ).fetchone()
+                self._db.execute(
+                    "DELETE FROM responses WHERE url = ? AND attributes = ?",
+                    (url, attributes),
+                )
+                self.size -= length
+                self.evictions += 1
+
+            self._db.commit()
+
+    def _remove(self, key):
+        """
+        Remove a stored response; the caller holds the lock.
+
+        Args:
+            key (tuple): the cache key
+        """
+        self._accessed.pop(key, None)
+        row = self._db.execute(
+            "SELECT LENGTH(body) FROM responses WHERE url = ? AND attributes = ?",
+            key,
+        ).fetchone()
+        if row is not None:
+            self._db.execute(
+                "DELETE FROM responses WHERE url = ? AND attributes = ?", key
+            )
+            self.size -= row[0]
+
+    def remove(self, key):
+        """
+        Remove a stored response.
+
+        Args:
+            key (tuple): the cache key
+        """
+        with self._lock:
+            self._remove(key)
+            self._db.commit()
+
+    def remove_url(self, url):
+        """
+        Remove all stored responses for an url.
+
+        Args:
+            url (str): the FMG JSON RPC API url
+        """
+        with self._lock:
+            for (attributes,) in self._db.execute(
+                "SELECT attributes FROM responses WHERE url = ?", (url,)
+            ).fetchall():
+                self._remove((url, attributes))
+            self._db.commit()
+
+    def checksums(self):
+        """
+        Get the keys and checksums of all stored responses.
+
+        Returns:
+            (list): list of (url, attributes, checksum) tuples
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT url, attributes, checksum FROM responses"
+            ).fetchall()
+
+    def clear(self):
+        """Remove all stored responses."""
+        with self._lock:
+            self._accessed.clear()
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self.size = 0
+
+    def close(self):
+        """Close the database, once the access times are written."""
+        with self._lock:
+            try:
+                self._write_accessed()
+                self._db.commit()
+            except sqlite3.DatabaseError as error:
+                logger.warning("Cannot write the cache %s: %s", self.path, error)
+            self._db.close()
+
+    def stats(self):
+        """
+        Get the store statistics.
+
+        Returns:
+            (dict): the store statistics
+        """
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+        return {
+            "store_entries": count,
+            "store_bytes": self.size,
+            "store_max_bytes": self.max_bytes,
+            "store_evictions": self.evictions,
+        }
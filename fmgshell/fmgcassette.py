@@ -0,0 +1,223 @@
+# coding: utf-8
+"""Record and replay FortiManager JSON RPC sessions.
+
+A cassette is a NDJSON file, gzip compressed when its name ends with ".gz".
+Each line holds a JSON RPC request, its response and how long FortiManager
+took to answer:
+
+    {"request": {...}, "response": {...}, "status": 200, "elapsed": 0.012}
+
+The recording and replaying transports stand in for the requests.Session
+used by FMGJSONRPCAPI (see FMGJSONRPCAPI.transport).
+"""
+
+import collections
+import copy
+import datetime
+import gzip
+import json
+import threading
+import time
+
+import requests
+
+from exceptions import ReplayMiss
+
+# Replaces the secrets in the recorded requests and responses
+REDACTED = "********"
+
+# Urls whose "data" hold credentials
+LOGIN_URLS = ["/sys/login/user"]
+
+
+def open_cassette(file, mode):
+    """
+    Open a cassette file.
+
+    Args:
+        file (str): the cassette file, gzip compressed if it ends with ".gz"
+        mode (str): "r" or "w"
+
+    Returns:
+        (file): the file, in text mode
+    """
+    if file.endswith(".gz"):
+        return gzip.open(file, f"{mode}t", encoding="utf-8")
+
+    return open(file, mode, encoding="utf-8")
+
+
+def redact_request(payload):
+    """
+    Drop the volatile and secret parts of a JSON RPC request.
+
+    Args:
+        payload (dict): the JSON RPC request
+
+    Returns:
+        (dict): a copy of the request without "id" and "session", and with
+        the login passwords redacted
+    """
+    payload = {
+        key: value for key, value in payload.items() if key not in ("id", "session")
+    }
+    params = payload.get("params") or []
+    if any(param.get("url") in LOGIN_URLS for param in params):
+        payload["params"] = copy.deepcopy(params)
+        for param in payload["params"]:
+            data = param.get("data")
+            if param.get("url") in LOGIN_URLS and isinstance(data, dict):
+                if "passwd" in data:
+                    data["passwd"] = REDACTED
+
+    return payload
+
+
+def request_key(payload):
+    """
+    Build the key used to match a request against the recorded ones.
+
+    Args:
+        payload (dict): the JSON RPC request
+
+    Returns:
+        (str): the key
+    """
+    return json.dumps(redact_request(payload), sort_keys=True, separators=(",", ":"))
+
+
+class CassetteResponse:
+    """The part of requests.Response used by FMGJSONRPCAPI."""
+
+    def __init__(self, url, status_code, content, elapsed):
+        """
+        Args:
+            url (str): the requested url
+            status_code (int): the HTTP status code
+            content (bytes): the response body
+            elapsed (float): time to get the response (in seconds)
+        """
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} Error for url: {self.url}", response=self
+            )
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start : start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class RecordingTransport:
+    """Send the requests with another transport and record them in a
+    cassette.
+
+    The responses are read in full, even when they are streamed, so they
+    can be recorded.
+    """
+
+    def __init__(self, file, transport):
+        """
+        Args:
+            file (str): the cassette file, overwritten
+            transport (requests.Session): the transport actually sending the
+                requests
+        """
+        self.file = file
+        self.transport = transport
+        self.records = 0
+
+        self._lock = threading.Lock()
+        self._fh = open_cassette(file, "w")
+
+    def post(self, url, data=None, headers=None, stream=False):
+        start = time.perf_counter()
+        response = self.transport.post(url, data=data, headers=headers)
+        content = response.content
+        elapsed = time.perf_counter() - start
+
+        try:
+            output = json.loads(content)
+        except ValueError:
+            output = None
+        if isinstance(output, dict) and "session" in output:
+            output = dict(output, session=REDACTED)
+
+        record = {
+            "request": redact_request(json.loads(data)),
+            "response": output,
+            "status": response.status_code,
+            "elapsed": round(elapsed, 6),
+        }
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._fh.write(line + "\n")
+            self._fh.flush()
+            self.records += 1
+
+        return CassetteResponse(url, response.status_code, content, elapsed)
+
+    def close(self):
+        """Close the cassette; the actual transport is left open."""
+        with self._lock:
+            self._fh.close()
+
+
+class ReplayTransport:
+    """Answer the requests from a cassette, without any network access.
+
+    A request is answered with the first recorded response to the same
+    request (whatever its "id" and "session"), which is then consumed; the
+    last recorded response is replayed as many times as needed.
+    """
+
+    def __init__(self, file, latency=False):
+        """
+        Args:
+            file (str): the cassette file
+            latency (bool, optional): wait as long as FortiManager took to
+                answer when the request was recorded. Defaults to False.
+        """
+        self.file = file
+        self.latency = latency
+        self.replayed = 0
+
+        self._lock = threading.Lock()
+        self._records = collections.defaultdict(collections.deque)
+        with open_cassette(file, "r") as fh:
+            for line in fh:
+                if line.strip():
+                    record = json.loads(line)
+                    self._records[request_key(record["request"])].append(record)
+
+    def post(self, url, data=None, headers=None, stream=False):
+        payload = json.loads(data)
+        key = request_key(payload)
+        with self._lock:
+            records = self._records.get(key)
+            if not records:
+                params = payload.get("params") or [{}]
+                raise ReplayMiss(params[0].get("url"), payload)
+            record = records.popleft() if len(records) > 1 else records[0]
+            self.replayed += 1
+
+        if self.latency:
+            time.sleep(record["elapsed"])
+
+        output = record["response"]
+        if isinstance(output, dict):
+            output = dict(output, id=payload.get("id"))
+        content = json.dumps(output).encode()
+
+        return CassetteResponse(url, record["status"], content, record["elapsed"])
+
+    def close(self):
+        pass
@@ -0,0 +1,134 @@
+# coding: utf-8
+"""JSON codecs for the FortiManager JSON RPC API.
+
+The codecs encode to bytes and decode from bytes, so the request and
+response bodies never go through an intermediate str. orjson and msgspec
+are used when installed, the json module otherwise.
+"""
+
+import json
+
+# Codecs by order of preference
+JSON_CODECS = ["orjson", "msgspec", "json"]
+
+
+class StdlibCodec:
+    """JSON codec based on the json module."""
+
+    name = "json"
+
+    def encode(self, obj):
+        """
+        Encode an object in JSON.
+
+        Args:
+            obj: the object
+
+        Returns:
+            (bytes): the JSON document
+        """
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def decode(self, data):
+        """
+        Decode a JSON document.
+
+        Args:
+            data (bytes): the JSON document
+
+        Returns:
+            the object
+        """
+        return json.loads(data)
+
+
+class OrjsonCodec(StdlibCodec):
+    """JSON codec based on orjson."""
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def encode(self, obj):
+        try:
+            return self._orjson.dumps(obj, option=self._options)
+        except TypeError:
+            # e.g., integers over 64 bits
+            return super().encode(obj)
+
+    def decode(self, data):
+        return self._orjson.loads(data)
+
+
+class MsgspecCodec(StdlibCodec):
+    """JSON codec based on msgspec."""
+
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def encode(self, obj):
+        return self._encoder.encode(obj)
+
+    def decode(self, data):
+        return self._decoder.decode(data)
+
+
+CODEC_CLASSES = {
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+    "json": StdlibCodec,
+}
+
+
+def get_codec(name=None):
+    """
+    Get a JSON codec.
+
+    Args:
+        name (str, optional): "orjson", "msgspec" or "json". Defaults to
+            the first one installed, in this order.
+
+    Raises:
+        ValueError: the requested codec is unknown or not installed.
+
+    Returns:
+        (StdlibCodec): the codec
+    """
+    if name is not None:
+        try:
+            return CODEC_CLASSES[name]()
+        except (KeyError, ImportError):
+            raise ValueError(f"JSON codec not available: {name}")
+
+    for name in JSON_CODECS:
+        try:
+            return CODEC_CLASSES[name]()
+        except ImportError:
+            pass
+
+
+def get_available_codecs():
+    """
+    Get the installed JSON codecs.
+
+    Returns:
+        (list): the codec names, by order of preference
+    """
+    names = []
+    for name in JSON_CODECS:
+        try:
+            CODEC_CLASSES[name]()
+        except ImportError:
+            continue
+        names.append(name)
+
+    return names
@@ -1,10 +1,34 @@
 # coding: utf-8
 """Class for FortiManager File System."""
 
+import array
+import bisect
+import contextlib
+import gc
+import hashlib
 import json
+import os
+import struct
+import threading
+import time
+
+from exceptions import WrongResponseStatus
+from fmgcache import user_cache_dir
 
 FMG_SUPPORTED_PATH = "fmg_supported_path"
 
+# Name of the supported path element standing for any table entry
+WILDCARD = "*"
+
+# Nodes can be populated from several threads (i.e., prefetching); they share
+# a pool of locks, picked by node hash
+NODE_LOCKS = [threading.RLock() for _ in range(64)]
+
+# FMG FS snapshot header: magic, source size, source mtime, source sha256,
+# node count, names length
+SNAPSHOT_MAGIC = b"FMGFS\x01"
+SNAPSHOT_HEADER = struct.Struct(f"<{len(SNAPSHOT_MAGIC)}sQq32sII")
+
 
 class FMGFS_EXCEPTION(Exception):
     def __init__(self):
@@ -16,19 +40,54 @@ class FMGFS_WrongPath(FMGFS_EXCEPTION):
         pass
 
 
+@contextlib.contextmanager
+def gc_paused():
+    """
+    Pause the garbage collector while building a tree.
+
+    Every node references its parent, so the collector would otherwise
+    repeatedly scan the growing tree while nothing can be collected.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
 class Node:
     """Class to represent a FMG FS element."""
 
+    __slots__ = (
+        "name",
+        "parent",
+        "children",
+        "_full_path",
+        "_live",
+        "_sorted",
+        "_error",
+    )
+
     def __init__(self, name):
         """
         Class to represent a FMG FS element.
 
         Args:
-            name ([type]): [description]
+            name (str): the node name
         """
         self.name = name
         self.parent = None
-        self.children = []
+        # Children indexed by name
+        self.children = {}
+        self._full_path = None
+        # When the live children were last fetched from FortiManager
+        self._live = None
+        # Sorted children's names, for prefix lookups; built on demand
+        self._sorted = None
+        # Why the live children couldn't be fetched, the last time
+        self._error = None
 
     def __repr__(self):
         node_full_path = self.get_full_path()
@@ -42,7 +101,9 @@ class Node:
             child (Node): a child node
         """
         child.parent = self
-        self.children.append(child)
+        child._full_path = None
+        self.children[child.name] = child
+        self._sorted = None
 
     def set_parent(self, parent):
         """
@@ -51,8 +112,7 @@ class Node:
         Args:
             parent (Node): the parent node
         """
-        self.parent = parent
-        parent.children.append(self)
+        parent.add_child(self)
 
     def nprint(self, n=0):
         """
@@ -65,7 +125,7 @@ class Node:
         """
         pad = " " * n
         print(f"{pad}{self.name}")
-        for child in self.children:
+        for child in self.children.values():
             child.nprint(n + 2)
 
     def is_child_by_name(self, name):
@@ -76,33 +136,152 @@ class Node:
             name (str): the name to be checked
 
         Returns:
-            The child index or None.
+            (bool)
         """
-        result = None
-        idx = 0
-        for child in self.children:
-            if child.name == name:
-                result = idx
-                break
-            idx = idx + 1
+        return name in self.children
 
-        return result
+    def get_template(self):
+        """
+        Get the supported path node this node follows.
 
-    def get_children_by_name(self, text=None):
+        Returns:
+            (Node): the node itself
+        """
+        return self
+
+    def get_lock(self):
+        """
+        Get the lock protecting the node children.
+
+        Returns:
+            (threading.RLock): the lock
+        """
+        return NODE_LOCKS[hash(self) % len(NODE_LOCKS)]
+
+    def get_root(self):
+        """
+        Get the FMG FS root.
+
+        Returns:
+            (Node): the root node
+        """
+        node = self
+        while node.parent != None:
+            node = node.parent
+
+        return node
+
+    def is_table(self):
+        """
+        Check whether this node children are FortiManager table entries.
+
+        Returns:
+            (bool)
+        """
+        return WILDCARD in self.get_template().children
+
+    def populate(self):
+        """
+        Fetch the live children from FortiManager.
+
+        When the supported path has a wildcard below this node (i.e., this
+        node is a table), a LiveNode is added for each actual table entry.
+        The entry names are only fetched when the FMG FS root is attached to
+        a FMG, and at most once every FMG.cache_validity seconds; the FMG
+        cache refetches them only when the table checksum changed.
+
+        When they can't be fetched, the children are left as they are and
+        the error is kept until the next successful fetch (see
+        iter_tables()).
+        """
+        wildcard = self.get_template().children.get(WILDCARD)
+        if wildcard == None:
+            return
+
+        fmg = getattr(self.get_root(), "fmg", None)
+        if fmg == None:
+            return
+
+        now = time.time()
+        if self._live != None and now - self._live < fmg.cache_validity:
+            return
+
+        try:
+            names = fmg.get_table_names(self.get_full_path())
+        except WrongResponseStatus as error:
+            self._error = error
+            return
+
+        self._error = None
+        for name in names:
+            if name not in self.children:
+                self.add_child(LiveNode(name, wildcard))
+
+        # Remove the entries which don't exist anymore
+        current_names = set(names)
+        for name, child in list(self.children.items()):
+            if (
+                isinstance(child, LiveNode)
+                and child.template is wildcard
+                and name not in current_names
+            ):
+                del self.children[name]
+                self._sorted = None
+
+        self._live = now
+
+    def get_child(self, name):
+        """
+        Get a child by its name.
+
+        Args:
+            name (str): the child name
+
+        Returns:
+            The child Node or None.
+        """
+        with self.get_lock():
+            self.populate()
+            return self.children.get(name)
+
+    def get_children_by_name(self, text=None, limit=None):
         """
         Get the list of children's names.
 
+        The wildcard is not listed once the actual table entries were
+        fetched.
+
         Args:
-            text (str, optional): return only child matching text. Defaults to None
+            text (str, optional): return only child starting with text.
+            Defaults to None
+            limit (int, optional): max number of names. Defaults to None
 
         Returns:
             (list): list of children's names
         """
-        names_list = []
-        for child in self.children:
-            names_list.append(child.name)
+        with self.get_lock():
+            self.populate()
+            if not text and limit == None:
+                if self._live != None:
+                    return [name for name in self.children if name != WILDCARD]
+                return list(self.children)
+
+            # Children's names starting with text are contiguous once sorted
+            if self._sorted == None:
+                self._sorted = sorted(self.children)
+            sorted_names = self._sorted
+
+        names = []
+        idx = bisect.bisect_left(sorted_names, text or "")
+        while idx < len(sorted_names) and (limit == None or len(names) < limit):
+            name = sorted_names[idx]
+            if text and not name.startswith(text):
+                break
+            if name != WILDCARD or self._live == None:
+                names.append(name)
+            idx += 1
 
-        return names_list
+        return names
 
     def get_node_by_path(self, path, best_match=False):
         """
@@ -127,37 +306,94 @@ class Node:
 
         node = self
         for element in elements:
-            idx = node.is_child_by_name(element)
-            if idx == None:
+            child = node.get_child(element)
+            if child == None:
                 if best_match:
                     break
                 else:
                     raise FMGFS_WrongPath
-            node = node.children[idx]
+            node = child
 
         return node
 
+    def is_container_table(self):
+        """
+        Check whether this node entries are containers (e.g., ADOMs) rather
+        than objects.
+
+        The entries are containers when they are tables themselves, or when
+        they have children which aren't tables (e.g., "obj" and "pkg" below
+        an ADOM). Objects have no children, or only sub-tables which are
+        returned along with them.
+
+        Returns:
+            (bool)
+        """
+        wildcard = self.get_template().children.get(WILDCARD)
+        if wildcard == None:
+            return False
+
+        return WILDCARD in wildcard.children or any(
+            not child.is_table() for child in wildcard.children.values()
+        )
+
+    def iter_tables(self, errors=None):
+        """
+        Iterate over the tables below this node, in depth first order.
+
+        The container tables (see is_container_table()) are not listed:
+        their live entries are walked instead. This node is listed when it is
+        a table, or when it is an object without children.
+
+        Args:
+            errors (list, optional): filled with the (path, error message)
+                                     of the nodes whose live children
+                                     couldn't be fetched; the tables below
+                                     them are missing from the walk
+
+        Yields:
+            (Node): the tables
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.is_table() and not node.is_container_table():
+                yield node
+                continue
+
+            names = [name for name in node.get_children_by_name() if name != WILDCARD]
+            if node._error != None:
+                if errors != None:
+                    errors.append((node.get_full_path(), str(node._error)))
+            elif not names and node is self and node.parent != None:
+                yield node
+                continue
+
+            # The children were just populated, they are not fetched again
+            children = [node.children.get(name) for name in names]
+            stack.extend(child for child in reversed(children) if child != None)
+
     def get_full_path(self):
         """
         Get the full path.
 
+        The root node name is not part of the full path. The full path is
+        computed once, then cached.
+
         Returns:
             (str): the full path name.
         """
-        node = self
-        full_path = [node.name]
-        while node.parent != None:
-            node = node.parent
-            full_path.append(node.name)
-
-        full_path.append("")
-        full_path.reverse()
-        if len(full_path) == 2:
-            return "/"
-        else:
-            del full_path[1]
+        if self._full_path == None:
+            if self.parent == None:
+                self._full_path = "/"
+            else:
+                parent_full_path = self.parent.get_full_path()
+                if parent_full_path == "/":
+                    self._full_path = f"/{self.name}"
+                else:
+                    self._full_path = f"{parent_full_path}/{self.name}"
 
-        return "/".join(full_path)
+        return self._full_path
 
     def load(self, file=FMG_SUPPORTED_PATH):
         """
@@ -169,32 +405,294 @@ class Node:
             file (str, optional): The file containing the supported path.
             Defaults to FMG_SUPPORTED_PATH.
         """
-        with open(file, "r") as f:
+        with open(file, "r") as f, gc_paused():
             for line in f:
+                line = line.strip().lstrip("/")
+                if not line:
+                    continue
+
                 node = self
-                line = line.lstrip("/")
-                elements = line.split("/")
-                for element in elements:
+                for element in line.split("/"):
                     # Check whether element exists in list of children
-                    idx = node.is_child_by_name(element)
-                    if idx == None:
+                    child = node.children.get(element)
+                    if child == None:
                         # Does not exist; we create it
-                        new_child = Node(element)
-                        node.add_child(new_child)
-                        node = new_child
-                    else:
-                        node = node.children[idx]
+                        child = Node(element)
+                        node.add_child(child)
+                    node = child
+
+
+class LiveNode(Node):
+    """Class to represent an actual FortiManager object in the FMG FS.
+
+    A LiveNode stands for an ADOM, a table entry, etc. or for an element
+    below it. It follows the supported path node it was created from (its
+    template), and its children are created on first access.
+    """
+
+    __slots__ = ("template", "_instantiated")
+
+    def __init__(self, name, template):
+        """
+        Args:
+            name (str): the node name
+            template (Node): the supported path node it follows
+        """
+        super().__init__(name)
+        self.template = template
+        self._instantiated = False
+
+    def get_template(self):
+        """
+        Get the supported path node this node follows.
+
+        Returns:
+            (Node): the template node
+        """
+        return self.template
+
+    def populate(self):
+        """
+        Create the children following the template ones, then fetch the live
+        children from FortiManager.
+        """
+        if not self._instantiated:
+            for name, child in self.template.children.items():
+                if name != WILDCARD and name not in self.children:
+                    self.add_child(LiveNode(name, child))
+            self._instantiated = True
+
+        super().populate()
+
+
+def get_snapshot_path(file):
+    """
+    Get the snapshot path for a supported path file.
+
+    Args:
+        file (str): The file containing the supported path.
+
+    Returns:
+        (str): the snapshot path, in the user's cache dir
+    """
+    digest = hashlib.sha1(os.path.abspath(file).encode()).hexdigest()
+
+    return os.path.join(user_cache_dir(), f"fmgfs-{digest[:16]}.snapshot")
+
+
+def get_file_sha256(file):
+    """
+    Get the SHA256 digest of a file.
+
+    Args:
+        file (str): the file
+
+    Returns:
+        (bytes): the digest
+    """
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    return digest.digest()
+
+
+def write_snapshot(root, file, snapshot):
+    """
+    Write the snapshot of a FMG FS.
+
+    The tree is stored as flat arrays: the node names, in depth first order,
+    and the index of their parent (-1 for the children of root).
+
+    Args:
+        root (Node): the FMG FS root, loaded from file
+        file (str): The file containing the supported path.
+        snapshot (str): the snapshot path
+    """
+    names = []
+    parents = array.array("i")
+    stack = [(child, -1) for child in reversed(root.children.values())]
+    while stack:
+        node, parent_idx = stack.pop()
+        idx = len(names)
+        names.append(node.name)
+        parents.append(parent_idx)
+        stack.extend((child, idx) for child in reversed(node.children.values()))
+
+    names_blob = "\n".join(names).encode()
+    stat = os.stat(file)
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC,
+        stat.st_size,
+        stat.st_mtime_ns,
+        get_file_sha256(file),
+        len(names),
+        len(names_blob),
+    )
+
+    replace_snapshot(snapshot, [header, parents.tobytes(), names_blob])
+
+
+def replace_snapshot(snapshot, chunks):
+    """
+    Write a snapshot, then rename it, so a concurrent reader never sees a
+    partial file.
+
+    Args:
+        snapshot (str): the snapshot path
+        chunks (list): the snapshot content
+    """
+    tmp_snapshot = f"{snapshot}.{os.getpid()}"
+    with open(tmp_snapshot, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_snapshot, snapshot)
+
+
+def read_snapshot(root, file, snapshot):
+    """
+    Load a FMG FS from its snapshot.
+
+    When only the file size or mtime changed (e.g., it was touched or
+    checked out again), the snapshot header is updated, so the file isn't
+    hashed again at the next load.
+
+    Args:
+        root (Node): the FMG FS root, without children
+        file (str): The file containing the supported path.
+        snapshot (str): the snapshot path
+
+    Returns:
+        (bool): False when the snapshot is missing, outdated or corrupt;
+                root may then have been partly filled
+    """
+    try:
+        with open(snapshot, "rb") as f:
+            content = f.read()
+        stat = os.stat(file)
+    except OSError:
+        return False
+
+    if len(content) < SNAPSHOT_HEADER.size:
+        return False
+
+    magic, size, mtime_ns, sha256, count, names_len = SNAPSHOT_HEADER.unpack_from(
+        content
+    )
+    if magic != SNAPSHOT_MAGIC:
+        return False
+
+    # The file hash is only checked when its size or mtime changed
+    touched = (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns)
+    if touched and get_file_sha256(file) != sha256:
+        return False
+
+    parents = array.array("i")
+    offset = SNAPSHOT_HEADER.size
+    parents.frombytes(content[offset : offset + count * parents.itemsize])
+    offset = offset + count * parents.itemsize
+    try:
+        names = content[offset : offset + names_len].decode().split("\n")
+    except UnicodeDecodeError:
+        return False
+    if len(parents) != count or len(names) != count:
+        return False
+
+    nodes = []
+    with gc_paused():
+        for name, parent_idx in zip(names, parents):
+            # The parents come first, in depth first order
+            if not -1 <= parent_idx < len(nodes):
+                return False
+            node = Node(name)
+            parent = nodes[parent_idx] if parent_idx >= 0 else root
+            node.parent = parent
+            parent.children[name] = node
+            nodes.append(node)
+
+    if touched:
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, stat.st_size, stat.st_mtime_ns, sha256, count, names_len
+        )
+        try:
+            replace_snapshot(snapshot, [header, content[SNAPSHOT_HEADER.size :]])
+        except OSError:
+            pass
+
+    return True
 
 
 class FMGFS(Node):
-    """Class for FortiManager File System."""
+    """Class for FortiManager File System.
 
-    def __init__(self, name):
+    The FMG FS is loaded on first use, from a snapshot of the supported path
+    file. The snapshot is rebuilt when the supported path file changed.
+
+    Once attached to a FMG, the tables are populated with their actual
+    entries (see Node.populate()).
+    """
+
+    __slots__ = ("fmg", "_file", "_loaded")
+
+    def __init__(self, name, file=FMG_SUPPORTED_PATH, fmg=None):
+        """
+        Args:
+            name (str): the root name
+            file (str, optional): The file containing the supported path.
+            Defaults to FMG_SUPPORTED_PATH.
+            fmg (FMG, optional): the FMG used to fetch the live nodes.
+            Defaults to None (i.e., only the supported path are available).
+        """
         super().__init__(name)
-        self.load()
+        self.fmg = fmg
+        self._file = file
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        """Load the FMG FS if not done yet."""
+        if self._loaded:
+            return
+
+        try:
+            snapshot = get_snapshot_path(self._file)
+        except OSError:
+            snapshot = None
+
+        if snapshot and read_snapshot(self, self._file, snapshot):
+            self._loaded = True
+            return
+
+        self.children.clear()
+        self.load(self._file)
+
+        if snapshot:
+            try:
+                write_snapshot(self, self._file, snapshot)
+            except OSError:
+                pass
+
+    def load(self, file=FMG_SUPPORTED_PATH):
+        super().load(file)
+        self._loaded = True
+
+    def nprint(self, n=0):
+        self._ensure_loaded()
+        super().nprint(n)
+
+    def is_child_by_name(self, name):
+        self._ensure_loaded()
+        return super().is_child_by_name(name)
+
+    def get_child(self, name):
+        self._ensure_loaded()
+        return super().get_child(name)
+
+    def get_children_by_name(self, text=None, limit=None):
+        self._ensure_loaded()
+        return super().get_children_by_name(text, limit)
 
 
 if __name__ == "__main__":
     root = FMGFS("root")
-    root.load()
-    root.nprint()
\ No newline at end of file
+    root.nprint()
@@ -0,0 +1,146 @@
+# coding: utf-8
+"""HTTP/2 transport for the FortiManager JSON RPC API.
+
+It relies on httpx and h2 (pip install "httpx[http2]"), which are optional.
+The concurrent JSON RPC requests are multiplexed over a single TLS
+connection, and the responses are gzip compressed when FortiManager agrees
+to. When FortiManager doesn't negotiate HTTP/2 (or with plain HTTP), the
+requests go over HTTP/1.1.
+"""
+
+import requests
+
+# httpx is imported on first use, it is slow to import
+httpx = None
+
+# Max number of connections of the HTTP/2 transport; with HTTP/2 a single
+# one carries all the concurrent requests, the others are only used when
+# falling back to HTTP/1.1
+HTTP2_MAX_CONNECTIONS = 16
+
+# Ask for compressed responses
+HTTP2_HEADERS = {"Accept-Encoding": "gzip, deflate"}
+
+
+def import_httpx():
+    """
+    Import httpx, once.
+
+    Raises:
+        ImportError: httpx is not installed.
+
+    Returns:
+        (module): httpx
+    """
+    global httpx
+    if httpx is None:
+        import httpx as module
+
+        httpx = module
+
+    return httpx
+
+
+class HTTP2Response:
+    """The part of requests.Response used by FMGJSONRPCAPI, for an httpx
+    response."""
+
+    def __init__(self, response):
+        """
+        Args:
+            response (httpx.Response): the httpx response
+        """
+        self._response = response
+
+    @property
+    def status_code(self):
+        return self._response.status_code
+
+    @property
+    def http_version(self):
+        return self._response.http_version
+
+    @property
+    def content(self):
+        return self._response.content
+
+    @property
+    def elapsed(self):
+        return self._response.elapsed
+
+    def raise_for_status(self):
+        try:
+            self._response.raise_for_status()
+        except httpx.HTTPStatusError as error:
+            raise requests.exceptions.HTTPError(str(error)) from error
+
+    def iter_content(self, chunk_size=None):
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except httpx.HTTPError as error:
+            raise requests.exceptions.ConnectionError(str(error)) from error
+
+    def close(self):
+        self._response.close()
+
+
+class HTTP2Transport:
+    """Send the JSON RPC requests with httpx, over HTTP/2 when possible.
+
+    It is thread safe: the requests sent from several threads (e.g., by
+    AsyncFMGJSONRPCAPI) share the same HTTP/2 connection.
+    """
+
+    def __init__(self, max_connections=HTTP2_MAX_CONNECTIONS, verify=False):
+        """
+        Args:
+            max_connections (int, optional): max number of connections
+            verify (bool, optional): verify the FortiManager certificate.
+                Defaults to False.
+
+        Raises:
+            ImportError: httpx or h2 is not installed.
+        """
+        try:
+            import_httpx()
+        except ImportError as error:
+            raise ImportError(
+                "HTTP/2 requires httpx: pip install 'httpx[http2]'"
+            ) from error
+
+        # Raises ImportError when h2 is missing
+        self.client = httpx.Client(
+            http2=True,
+            verify=verify,
+            headers=HTTP2_HEADERS,
+            limits=httpx.Limits(max_connections=max_connections),
+            timeout=None,
+        )
+
+    def post(self, url, data=None, headers=None, stream=False):
+        """
+        Send a POST request.
+
+        Args:
+            url (str): the url
+            data (bytes, optional): the request body
+            headers (dict, optional): the request headers
+            stream (bool, optional): don't read the response body yet
+
+        Raises:
+            requests.exceptions.ConnectionError: the request failed.
+
+        Returns:
+            (HTTP2Response): the response
+        """
+        request = self.client.build_request("POST", url, content=data, headers=headers)
+        try:
+            response = self.client.send(request, stream=stream)
+        except httpx.HTTPError as error:
+            raise requests.exceptions.ConnectionError(str(error)) from error
+
+        return HTTP2Response(response)
+
+    def close(self):
+        """Close the connections."""
+        self.client.close()
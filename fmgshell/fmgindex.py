@@ -0,0 +1,402 @@
+# coding: utf-8
+"""Local search index over FortiManager table entries."""
+
+import bisect
+import functools
+import gzip
+import heapq
+import os
+import re
+import threading
+
+from fmgtable import get_entry_key
+
+# Default max number of entries returned by a search
+SEARCH_LIMIT = 100
+
+# Tokens are lowercase runs of these characters
+TOKEN_RE = re.compile(r"[0-9a-z_.:/-]+")
+
+# Tokens are also indexed by their parts (e.g., "address" and "12" for
+# "address_12")
+TOKEN_SEPARATORS_RE = re.compile(r"[_.:/-]+")
+
+# Number of distinct values whose tokens are cached; the same values (e.g.,
+# interface, schedule or member names) are found in many entries
+TOKEN_CACHE_SIZE = 1 << 16
+
+
+@functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def get_string_tokens(value):
+    """
+    Get the search tokens of a string.
+
+    Args:
+        value (str): the string
+
+    Returns:
+        (tuple): the tokens
+    """
+    tokens = []
+    for token in TOKEN_RE.findall(value.lower()):
+        tokens.append(token)
+        parts = TOKEN_SEPARATORS_RE.split(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+
+    return tuple(tokens)
+
+
+def get_tokens(value, tokens=None):
+    """
+    Get the search tokens of a value, recursively.
+
+    Args:
+        value: a table entry or any of its values
+        tokens (set, optional): the set the tokens are added to
+
+    Returns:
+        (set): the tokens
+    """
+    if tokens is None:
+        tokens = set()
+
+    values = [value]
+    while values:
+        value = values.pop()
+        if isinstance(value, str):
+            tokens.update(get_string_tokens(value))
+        elif isinstance(value, dict):
+            values.extend(value.values())
+        elif isinstance(value, list):
+            values.extend(value)
+        elif value is not None and not isinstance(value, bool):
+            tokens.update(get_string_tokens(str(value)))
+
+    return tokens
+
+
+class SearchIndex:
+    """Inverted index of table entries.
+
+    Each entry is indexed by the tokens of all its values (names, comments,
+    IP addresses, members, etc.). A table is indexed as a whole, and
+    indexing it again replaces its previous entries, so the index follows
+    the tables as they are refetched.
+
+    The entries can come from a Mirror (see update_from_mirror()), or from
+    the FMG cache (see attach()). The tables cached by the FMG are only
+    indexed at the next search, so the requests don't pay for it.
+    """
+
+    def __init__(self):
+        # doc id -> (url, entry key, tokens)
+        self.docs = {}
+        # token -> set of doc ids
+        self.postings = {}
+        # url -> list of doc ids
+        self.tables = {}
+        # url -> version of the indexed table (e.g., its mirror checksum)
+        self.versions = {}
+        # export file -> version of the indexed export file
+        self.exports = {}
+        # url -> (entries, version) of the tables cached but not indexed yet
+        self.pending = {}
+
+        self._next_id = 0
+        self._sorted_tokens = None
+        self._lock = threading.Lock()
+        # Serializes the indexing, so a pending table can't replace a table
+        # indexed after it was cached
+        self._index_lock = threading.Lock()
+
+    def index_table(self, url, entries, version=None):
+        """
+        Index the entries of a table, replacing the previous ones.
+
+        Args:
+            url (str): the table url
+            entries (iterable): the table entries
+            version (optional): the table version, see is_indexed()
+        """
+        with self._index_lock:
+            with self._lock:
+                # It is older than this table
+                self.pending.pop(url, None)
+            self._index_table(url, entries, version)
+
+    def _index_table(self, url, entries, version):
+        """Index the entries of a table; the caller holds the index lock."""
+        docs = []
+        for idx, entry in enumerate(entries):
+            docs.append((get_entry_key(url, entry, idx), frozenset(get_tokens(entry))))
+
+        with self._lock:
+            self._remove_table(url)
+            doc_ids = []
+            for key, tokens in docs:
+                doc_id = self._next_id
+                self._next_id += 1
+                self.docs[doc_id] = (url, key, tokens)
+                for token in tokens:
+                    posting = self.postings.get(token)
+                    if posting is None:
+                        self.postings[token] = posting = set()
+                        self._sorted_tokens = None
+                    posting.add(doc_id)
+                doc_ids.append(doc_id)
+            self.tables[url] = doc_ids
+            self.versions[url] = version
+
+    def remove_table(self, url):
+        """
+        Remove the entries of a table.
+
+        Args:
+            url (str): the table url
+        """
+        with self._index_lock:
+            with self._lock:
+                self.pending.pop(url, None)
+                self._remove_table(url)
+
+    def index_pending(self):
+        """
+        Index the tables cached since the last search.
+
+        Returns:
+            (int): the number of tables indexed
+        """
+        with self._index_lock:
+            with self._lock:
+                pending = self.pending
+                self.pending = {}
+
+            for url, (entries, version) in pending.items():
+                self._index_table(url, entries, version)
+
+        return len(pending)
+
+    def _remove_table(self, url):
+        """Remove the entries of a table; the caller holds the lock."""
+        for doc_id in self.tables.pop(url, []):
+            _, _, tokens = self.docs.pop(doc_id)
+            for token in tokens:
+                posting = self.postings[token]
+                posting.discard(doc_id)
+                if not posting:
+                    del self.postings[token]
+                    self._sorted_tokens = None
+        self.versions.pop(url, None)
+
+    def is_indexed(self, url, version):
+        """
+        Check whether a table is indexed in a given version.
+
+        Args:
+            url (str): the table url
+            version: the table version
+
+        Returns:
+            (bool)
+        """
+        return url in self.tables and self.versions.get(url) == version
+
+    def _match(self, term):
+        """
+        Get the entries matching a search term; the caller holds the lock.
+
+        Args:
+            term (str): a token, or a token prefix followed by "*"
+
+        Returns:
+            (set): the doc ids
+        """
+        if not term.endswith("*"):
+            return self.postings.get(term, set())
+
+        prefix = term[:-1]
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.postings)
+
+        doc_ids = set()
+        idx = bisect.bisect_left(self._sorted_tokens, prefix)
+        while idx < len(self._sorted_tokens):
+            token = self._sorted_tokens[idx]
+            if not token.startswith(prefix):
+                break
+            doc_ids |= self.postings[token]
+            idx += 1
+
+        return doc_ids
+
+    def search(self, query, url_prefix=None, limit=SEARCH_LIMIT):
+        """
+        Search for the entries matching all the terms of a query.
+
+        A term is a token (e.g., "10.0.0.12", "web", "address_12"), or a
+        token prefix followed by "*" (e.g., "web*").
+
+        Args:
+            query (str): the search terms
+            url_prefix (str, optional): only search the tables below this
+                                        path
+            limit (int, optional): max number of entries returned
+
+        Returns:
+            (list): the (url, entry key) tuples, sorted
+        """
+        terms = []
+        for term in query.lower().split():
+            wildcard = term.endswith("*")
+            tokens = TOKEN_RE.findall(term)
+            if wildcard and tokens:
+                tokens[-1] += "*"
+            terms.extend(tokens)
+        if not terms:
+            return []
+
+        self.index_pending()
+        with self._lock:
+            matches = sorted(
+                (self._match(term) for term in terms), key=lambda doc_ids: len(doc_ids)
+            )
+            doc_ids = set(matches[0])
+            for other in matches[1:]:
+                doc_ids &= other
+                if not doc_ids:
+                    break
+            results = [self.docs[doc_id][:2] for doc_id in doc_ids]
+
+        if url_prefix:
+            url_prefix = url_prefix.rstrip("/")
+            results = [
+                result
+                for result in results
+                if result[0] == url_prefix or result[0].startswith(f"{url_prefix}/")
+            ]
+
+        if limit:
+            return heapq.nsmallest(limit, results)
+
+        return sorted(results)
+
+    def update_from_mirror(self, mirror):
+        """
+        Index the tables of a mirror which changed since they were indexed.
+
+        Args:
+            mirror (Mirror): the mirror
+
+        Returns:
+            (int): the number of tables indexed
+        """
+        count = 0
+        for url, table in list(mirror.manifest.items()):
+            version = ("mirror", table.get("checksum"), table.get("synced"))
+            if self.is_indexed(url, version):
+                continue
+            self.index_table(url, mirror.iter_entries(url), version)
+            count += 1
+
+        # The tables gone from the mirror
+        for url in [
+            url for url, version in self.versions.items() if url not in mirror.manifest
+        ]:
+            if version and version[0] == "mirror":
+                self.remove_table(url)
+
+        return count
+
+    def update_from_export(self, file, codec):
+        """
+        Index the tables of an export file (see FMG.export()), unless it
+        didn't change since it was indexed.
+
+        Args:
+            file (str): the NDJSON export file, gzip compressed if it ends
+                        with .gz
+            codec (StdlibCodec): the JSON codec
+
+        Returns:
+            (int): the number of tables indexed
+        """
+        stat = os.stat(file)
+        version = ("export", os.path.abspath(file), stat.st_mtime, stat.st_size)
+        if self.exports.get(version[1]) == version:
+            return 0
+
+        # The lines of the tables exported concurrently are interleaved
+        tables = {}
+        opener = gzip.open if file.endswith(".gz") else open
+        with opener(file, "rb") as f:
+            for line in f:
+                record = codec.decode(line)
+                tables.setdefault(record["url"], []).append(record["data"])
+
+        for url, entries in tables.items():
+            self.index_table(url, entries, version)
+        self.exports[version[1]] = version
+
+        return len(tables)
+
+    def attach(self, cache):
+        """
+        Index the tables fetched as a whole (i.e., without attributes) and
+        cached by the FMG, at the next search (see index_pending()). The
+        objects (e.g., the system status) aren't indexed.
+
+        Args:
+            cache (ResponseCache): the FMG cache
+        """
+        cache.listeners.append(self.on_cache_put)
+
+    def on_cache_put(self, key, url, data, checksum=None):
+        """
+        Queue a cached response for indexing when it holds a whole table,
+        i.e. a list of entries. It runs in the request path, so the entries
+        are only tokenized by index_pending().
+
+        Args:
+            key (tuple): the cache key
+            url (str): the url
+            data (dict): the cached response
+            checksum (str, optional): the url checksum
+        """
+        if key[1] != "" or not isinstance(data, dict):
+            return
+
+        try:
+            entries = data["result"][0]["data"]
+        except (KeyError, IndexError, TypeError):
+            return
+
+        if not isinstance(entries, list):
+            return
+
+        version = ("cache", checksum)
+        with self._lock:
+            # The pending table is newer than the indexed one
+            if url in self.pending:
+                last_version = self.pending[url][1]
+            else:
+                last_version = self.versions.get(url)
+            if checksum is not None and last_version == version:
+                return
+            self.pending[url] = (entries, version)
+
+    def stats(self):
+        """
+        Get the index statistics.
+
+        Returns:
+            (dict): the index statistics
+        """
+        self.index_pending()
+        with self._lock:
+            return {
+                "tables": len(self.tables),
+                "entries": len(self.docs),
+                "tokens": len(self.postings),
+                "postings": sum(len(posting) for posting in self.postings.values()),
+            }
@@ -1,7 +1,16 @@
 # coding= utf-8
 """FortiManager JSON RPC API."""
 
+import asyncio
+import concurrent.futures
+import contextlib
+import hashlib
 import json
+import logging
+import os
+import threading
+import time
+
 import requests
 
 # To disable SSL warning
@@ -11,16 +20,150 @@ from urllib3.exceptions import InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
 
 from exceptions import *
+from fmgcache import user_cache_dir
+from fmgcassette import RecordingTransport, ReplayTransport
+from fmgcodec import get_codec
+from fmghttp2 import HTTP2_MAX_CONNECTIONS, HTTP2Transport
+from fmgjsonstream import STREAM_CHUNK_SIZE, JSONRPCStream
+from fmglog import logger
+from fmgstats import CallStats
+
+# Max number of param blocks sent in a single JSON RPC request
+GET_MANY_CHUNK_SIZE = 50
+
+# Default max number of JSON RPC requests in flight for the async API
+MAX_IN_FLIGHT = 16
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+LOGIN_URL = "/sys/login/user"
+LOGOUT_URL = "/sys/logout"
+
+# Cheap request used to check whether a session is still valid
+SESSION_PROBE_URL = "/sys/status"
+
+# Status code of the requests sent with an invalid (e.g., expired) session;
+# FortiManager also returns it when the session has no permission on the url
+STATUS_INVALID_SESSION = -11
+
+# Status code given by get_many() to the urls whose request failed (e.g.,
+# a network error) or returned no result
+STATUS_NO_RESULT = -1
+
+# Directory of the saved sessions, in the user's cache dir
+SESSIONS_DIR = "sessions"
+
+
+def get_payload_url(payload):
+    """
+    Get the url a JSON RPC payload is about.
+
+    Args:
+        payload (dict): The JSON RPC payload
+
+    Returns:
+        (str): the url of the first param block, followed by the number of
+        other blocks if any
+    """
+    params = payload.get("params") or [{}]
+    url = params[0].get("url")
+    if len(params) > 1:
+        return f"{url} (+{len(params) - 1})"
+
+    return url
+
+
+def get_session_file(ip, port, username, proto="https"):
+    """
+    Get the file where the session of a FortiManager user is saved.
+
+    Args:
+        ip (str): FortiManager IP address or FQDN
+        port (int): FortiManager port
+        username (str): FortiManager username
+        proto (str): "http" or "https"
+
+    Returns:
+        (str): the file path
+    """
+    directory = os.path.join(user_cache_dir(), SESSIONS_DIR)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    digest = hashlib.sha256(f"{proto}://{username}@{ip}:{port}".encode()).hexdigest()
+
+    return os.path.join(directory, f"{digest}.json")
+
+
+def load_session(file):
+    """
+    Load a saved session.
+
+    Args:
+        file (str): the session file
+
+    Returns:
+        (str): the session token, or None
+    """
+    try:
+        with open(file, encoding="utf-8") as f:
+            return json.load(f).get("session")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def save_session(file, session):
+    """
+    Save a session, readable by the user only.
+
+    Args:
+        file (str): the session file
+        session (str): the session token
+    """
+    tmp_file = f"{file}.{os.getpid()}"
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"session": session, "saved": time.time()}, f)
+    os.replace(tmp_file, file)
 
 
 class FMGJSONRPCAPI:
     """FMG JSON RPC API Class."""
 
-    def __init__(self):
+    def __init__(self, codec=None):
+        """
+        Args:
+            codec (str, optional): the JSON codec, "orjson", "msgspec" or
+                                   "json". Defaults to the fastest one
+                                   installed.
+        """
+        self.codec = get_codec(codec)
         self.http_session = requests.Session()
         self.http_session.verify = False
+        # Sends the requests over the network: the HTTP/1.1 session, or an
+        # HTTP2Transport
+        self.http_transport = self.http_session
+        # Sends the requests; the HTTP transport unless recording or
+        # replaying
+        self.transport = self.http_transport
         self.json_rpc = {"id": 0, "session": None}
+        # Where the session is saved, when it is reused across runs
+        self.session_file = None
+        # Number of times the session was renewed after it was invalidated
+        self.relogins = 0
+        self._id_lock = threading.Lock()
+        self._session_lock = threading.Lock()
+        self._credentials = None
+        # Called to get the password when a session resumed without it (see
+        # resume_session()) is invalidated; without it, the session isn't
+        # renewed
+        self.password_prompt = None
         self._debug = "off"
+        # Whether the current thread sends background requests (see
+        # in_background())
+        self._background = threading.local()
+        # Size of the last JSON RPC output received by the current thread
+        # (see get_response_bytes())
+        self._received = threading.local()
+        self.stats = CallStats()
 
     def debug(self, flag="show"):
         """
@@ -36,26 +179,139 @@ class FMGJSONRPCAPI:
         else:
             raise WrongDebugFlag
 
-    def print_debug(self, response):
+    @contextlib.contextmanager
+    def in_background(self):
         """
-        Print FortiManager JSON RPC API REQUEST/RESPONSE.
+        Send the requests of the current thread in the background (e.g.,
+        prefetching): with debug on, they are written to the debug log
+        rather than printed over the prompt.
+        """
+        previous = getattr(self._background, "active", False)
+        self._background.active = True
+        try:
+            yield
+        finally:
+            self._background.active = previous
+
+    def get_response_bytes(self):
+        """
+        Get the size of the last JSON RPC output received by the current
+        thread, e.g., to account for a response in the cache without
+        encoding it again.
+
+        Returns:
+            (int): the size (in bytes), or None if nothing was received
+        """
+        return getattr(self._received, "bytes", None)
+
+    def set_pool_size(self, size):
+        """
+        Set the max number of pooled HTTP/1.1 connections, i.e., the number
+        of requests which can be sent concurrently without opening a new
+        connection each time.
 
         Args:
-            response (dict): the requests.Session.Response object
+            size (int): the pool size
+        """
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size)
+        self.http_session.mount("https://", adapter)
+        self.http_session.mount("http://", adapter)
+
+    def record(self, file):
+        """
+        Record the requests and their responses in a cassette.
+
+        Args:
+            file (str): the cassette file, gzip compressed if it ends with
+                        ".gz"
+        """
+        self.stop_transport()
+        self.transport = RecordingTransport(file, self.http_transport)
+
+    def replay(self, file, latency=False):
+        """
+        Answer the requests from a cassette instead of FortiManager.
+
+        Args:
+            file (str): the cassette file
+            latency (bool): wait as long as FortiManager took to answer when
+                            the cassette was recorded
+        """
+        self.stop_transport()
+        self.transport = ReplayTransport(file, latency)
+
+    def stop_transport(self):
+        """
+        Stop recording or replaying, and go back to the HTTP transport.
+        """
+        if self.transport is not self.http_transport:
+            self.transport.close()
+            self.transport = self.http_transport
+
+    def enable_http2(self, max_connections=HTTP2_MAX_CONNECTIONS):
+        """
+        Send the requests with the HTTP/2 transport.
+
+        The concurrent requests are multiplexed over a single connection.
+        HTTP/1.1 is still used when FortiManager doesn't negotiate HTTP/2.
+
+        Args:
+            max_connections (int): max number of connections (only used
+                                   when falling back to HTTP/1.1)
+
+        Returns:
+            (bool): False when httpx or h2 is not installed; the requests
+                    are then still sent by the HTTP/1.1 session.
+        """
+        if isinstance(self.http_transport, HTTP2Transport):
+            return True
+
+        try:
+            transport = HTTP2Transport(max_connections)
+        except ImportError as error:
+            logger.warning("HTTP/2 not available: %s", error)
+            return False
+
+        self.stop_transport()
+        self.http_transport = self.transport = transport
+
+        return True
+
+    def disable_http2(self):
+        """
+        Send the requests with the HTTP/1.1 session.
+        """
+        if self.http_transport is self.http_session:
+            return
+
+        self.stop_transport()
+        self.http_transport.close()
+        self.http_transport = self.transport = self.http_session
+
+    def print_debug(self, payload, response):
         """
-        if self._debug == "on":
-            http_method = response.request.method
-            http_req_body = json.loads(response.request.body)
-            http_res_body = response.json()
+        Print FortiManager JSON RPC API REQUEST/RESPONSE.
 
+        Args:
+            payload (dict): the JSON RPC payload
+            response (dict): the decoded JSON RPC output
+        """
+        if self._debug == "on" and getattr(self._background, "active", False):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "REQUEST: %s RESPONSE: %s",
+                    json.dumps(payload),
+                    json.dumps(response),
+                )
+        elif self._debug == "on":
             print("REQUEST:")
             print()
-            print(f"{json.dumps(http_req_body, indent=4)}")
+            print(f"{json.dumps(payload, indent=4)}")
             print()
 
             print("RESPONSE:")
             print()
-            print(f"{json.dumps(http_res_body, indent=4)}")
+            print(f"{json.dumps(response, indent=4)}")
             print()
 
     def consume_id(self):
@@ -66,44 +322,291 @@ class FMGJSONRPCAPI:
         ------
         int
         """
-        self.json_rpc["id"] = self.json_rpc["id"] + 1
+        with self._id_lock:
+            self.json_rpc["id"] = self.json_rpc["id"] + 1
 
-        return self.json_rpc["id"]
+            return self.json_rpc["id"]
 
     def post_json_rpc(self, payload):
         """
         Complete and send the JSON RPC payload.
 
+        When the session was invalidated (e.g., it expired), a new one is
+        opened, then the payload is sent again.
+
         Args:
             payload (dic): The JSON RPC payload
 
+        Raises:
+            LoginFailed: the session was invalidated, and the login failed
+
         Returns:
             (dict): The JSON RPC output
         """
+        session = self.json_rpc["session"]
+        output = self._post_json_rpc(payload)
+
+        if (
+            self._credentials
+            and get_payload_url(payload) not in (LOGIN_URL, LOGOUT_URL)
+            and self.is_session_invalid(output)
+            and self.renew_session(session)
+        ):
+            output = self._post_json_rpc(payload)
+
+        return output
+
+    def _post_json_rpc(self, payload):
+        """
+        Complete and send the JSON RPC payload, once.
+
+        Args:
+            payload (dic): The JSON RPC payload
+
+        Returns:
+            (dict): The JSON RPC output
+        """
+        payload["session"] = self.json_rpc["session"]
+        payload["id"] = self.consume_id()
+        body = self.codec.encode(payload)
+
+        start = time.perf_counter()
+        response = self.transport.post(self.base_url, data=body, headers=JSON_HEADERS)
+        response.raise_for_status()
+        content = response.content
+        self._received.bytes = len(content)
+
+        received = time.perf_counter()
+        output = self.codec.decode(content)
+        decoded = time.perf_counter()
+
+        self.stats.record(
+            get_payload_url(payload),
+            payload["method"],
+            wall_time=decoded - start,
+            ttfb=response.elapsed.total_seconds(),
+            request_bytes=len(body),
+            response_bytes=len(content),
+            decode_time=decoded - received,
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "%s %s: %.1f ms, %d bytes",
+                payload["method"],
+                get_payload_url(payload),
+                (decoded - start) * 1000,
+                len(content),
+            )
+        self.print_debug(payload, output)
+
+        return output
+
+    def stream_json_rpc(self, payload):
+        """
+        Complete and send the JSON RPC payload, and decode the output while
+        it is received.
+
+        Args:
+            payload (dic): The JSON RPC payload
+
+        Returns:
+            (JSONRPCStream): yields (result index, data item) tuples; its
+                             response attribute holds the rest of the JSON
+                             RPC output once the iteration is over.
+        """
         payload["session"] = self.json_rpc["session"]
         payload["id"] = self.consume_id()
+        body = self.codec.encode(payload)
 
-        response = self.http_session.post(self.base_url, json=payload)
+        start = time.perf_counter()
+        response = self.transport.post(
+            self.base_url, data=body, headers=JSON_HEADERS, stream=True
+        )
         response.raise_for_status()
 
-        self.print_debug(response)
+        response_bytes = 0
+
+        def iter_chunks():
+            nonlocal response_bytes
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                response_bytes += len(chunk)
+                yield chunk
+
+        def on_close():
+            response.close()
+            self.stats.record(
+                get_payload_url(payload),
+                payload["method"],
+                wall_time=time.perf_counter() - start,
+                ttfb=response.elapsed.total_seconds(),
+                request_bytes=len(body),
+                response_bytes=response_bytes,
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "%s %s (streamed): %.1f ms, %d bytes",
+                    payload["method"],
+                    get_payload_url(payload),
+                    (time.perf_counter() - start) * 1000,
+                    response_bytes,
+                )
+            self.print_debug(payload, stream.response)
+
+        stream = JSONRPCStream(iter_chunks(), on_close)
+
+        return stream
+
+    @staticmethod
+    def is_session_invalid(output):
+        """
+        Check whether a JSON RPC output reports an invalid session.
+
+        Args:
+            output (dict): The JSON RPC output
+
+        Returns:
+            (bool)
+        """
+        for result in output.get("result") or []:
+            if result.get("status", {}).get("code") == STATUS_INVALID_SESSION:
+                return True
 
-        return response.json()
+        return False
+
+    def probe_session(self):
+        """
+        Check whether the session is valid, with a cheap request.
 
-    def login(self, ip, username, password, port=443, proto="https"):
+        Returns:
+            (bool)
+        """
+        if not self.json_rpc["session"]:
+            return False
+
+        output = self._post_json_rpc(
+            {"method": "get", "params": [{"url": SESSION_PROBE_URL}]}
+        )
+        results = output.get("result") or [{}]
+
+        return results[0].get("status", {}).get("code") == 0
+
+    def renew_session(self, stale_session):
+        """
+        Open a new session, unless the session is valid after all (i.e.,
+        the url wasn't allowed) or was already renewed by another thread.
+        The password of a session resumed without it is asked with
+        password_prompt, from the foreground only.
+
+        Args:
+            stale_session (str): the session the failed request was sent with
+
+        Raises:
+            LoginFailed: the login failed
+
+        Returns:
+            (bool): whether the failed request should be sent again
+        """
+        with self._session_lock:
+            if self.json_rpc["session"] != stale_session:
+                return True
+            if self._credentials is None or self.probe_session():
+                return False
+
+            username, password = self._credentials
+            prompted = password is None
+            if prompted:
+                # Only the foreground can ask for the password
+                if self.password_prompt is None or getattr(
+                    self._background, "active", False
+                ):
+                    return False
+                self._credentials = (username, self.password_prompt())
+
+            logger.info("Session invalidated, logging in again")
+            try:
+                self._login()
+            except LoginFailed:
+                if prompted:
+                    # Ask again next time
+                    self._credentials = (username, None)
+                raise
+            self.relogins += 1
+
+            return True
+
+    def resume_session(self, ip, username, port=443, proto="https"):
+        """
+        Reuse the session saved by a previous login with persist_session,
+        when it is still valid.
+
+        Without the password, the session is only renewed once invalidated
+        when password_prompt is set.
+
+        Args:
+            ip (str): FortiManager IP address or FQDN
+            username (str): FortiManager username
+            port (int): FortiManager port (default is 443)
+            proto (string): "http" or "https" (default is "https")
+
+        Returns:
+            (bool): whether the saved session is valid; it is then used
+        """
+        self.base_url = f"{proto}://{ip}:{port}/jsonrpc"
+        self.session_file = get_session_file(ip, port, username, proto)
+        self.json_rpc["session"] = load_session(self.session_file)
+        if self._credentials is None or self._credentials[0] != username:
+            self._credentials = (username, None)
+
+        if self.probe_session():
+            logger.info("Reusing the saved session")
+            return True
+
+        self.json_rpc["session"] = None
+
+        return False
+
+    def login(
+        self, ip, username, password, port=443, proto="https", persist_session=False
+    ):
         """
         Login to FortiManager.
 
+        The credentials are kept, to log in again when the session is
+        invalidated.
+
         Args:
             ip (str): FortiManager IP address or FQDN
             username (str): FortiManager username
             password (str): FortiManager password
             port (int): FortiManager port (default is 443)
             proto (string): "http" or "https" (default is "https")
+            persist_session (bool): reuse the session saved by a previous
+                                    run when it is still valid, and save the
+                                    new one otherwise (readable by the user
+                                    only, in the user's cache dir)
+
+        Raises:
+            LoginFailed: FortiManager didn't return a session
         """
+        self._credentials = (username, password)
 
-        self.base_url = f"{proto}://{ip}:{port}/jsonrpc"
-        jsonrpc_url = "/sys/login/user"
+        if persist_session:
+            if self.resume_session(ip, username, port, proto):
+                return
+        else:
+            self.base_url = f"{proto}://{ip}:{port}/jsonrpc"
+            self.session_file = None
+
+        self._login()
+
+    def _login(self):
+        """
+        Open a session with the kept credentials.
+
+        Raises:
+            LoginFailed: FortiManager didn't return a session
+        """
+        username, password = self._credentials
         payload = {
             "method": "exec",
             "params": [
@@ -112,34 +615,46 @@ class FMGJSONRPCAPI:
                         "user": username,
                         "passwd": password,
                     },
-                    "url": jsonrpc_url,
+                    "url": LOGIN_URL,
                 },
             ],
         }
 
-        response = self.post_json_rpc(payload)
+        response = self._post_json_rpc(payload)
 
-        try:
-            self.json_rpc["session"] = response["session"]
-        except KeyError as error:
-            print("ERROR: No session ID was returned.")
-            print("ERROR: Please double check your login/password.")
+        if "session" not in response:
+            results = response.get("result") or [{}]
+            raise LoginFailed(LOGIN_URL, results[0].get("status", {}))
+
+        self.json_rpc["session"] = response["session"]
+        if self.session_file:
+            save_session(self.session_file, response["session"])
 
     def logout(self):
         """
         Logout from FortiManager.
+
+        The saved session, if any, is forgotten.
         """
-        jsonrpc_url = "/sys/logout"
         payload = {
             "method": "exec",
             "params": [
                 {
-                    "url": "/sys/logout",
+                    "url": LOGOUT_URL,
                 },
             ],
         }
 
-        response = self.post_json_rpc(payload)
+        response = self._post_json_rpc(payload)
+
+        self.json_rpc["session"] = None
+        self._credentials = None
+        if self.session_file:
+            try:
+                os.unlink(self.session_file)
+            except FileNotFoundError:
+                pass
+            self.session_file = None
 
     def get(self, url, extra_payload=None):
         """
@@ -167,9 +682,247 @@ class FMGJSONRPCAPI:
 
         return self.post_json_rpc(payload)
 
+    def stream_get(self, url, extra_payload=None):
+        """
+        Implement the FMG JSON RPC API "get" method, with the output decoded
+        while it is received.
+
+        Args:
+            url (str): The FMG JSON RPC API url
+            extra_payload (dict): Extra data to merge in the payload
+
+        Returns:
+            (JSONRPCStream): yields (0, data item) tuples; its response
+                             attribute holds the status once the iteration is
+                             over.
+        """
+
+        payload = {
+            "method": "get",
+            "params": [
+                {
+                    "url": url,
+                },
+            ],
+        }
+
+        if extra_payload:
+            payload["params"][0].update(extra_payload)
+
+        return self.stream_json_rpc(payload)
+
+    def get_many(self, urls_with_attributes, chunk_size=GET_MANY_CHUNK_SIZE):
+        """
+        Implement the FMG JSON RPC API "get" method for several urls at once.
+
+        The urls are packed as several param blocks in the same JSON RPC
+        request (up to chunk_size blocks per request). The "result" list is
+        then split back per url.
+
+        Args:
+            urls_with_attributes (list): list of urls (str) or of (url,
+                                         extra_payload) tuples
+            chunk_size (int): Max number of urls per JSON RPC request
+
+        Returns:
+            (list): one response per url, in the same order, and with the
+                    same format as the one returned by get(). A failing url
+                    has its error in its "status"; it doesn't fail the whole
+                    batch.
+        """
+        params = []
+        for item in urls_with_attributes:
+            if isinstance(item, str):
+                url, extra_payload = item, None
+            else:
+                url, extra_payload = item
+
+            param = {"url": url}
+            if extra_payload:
+                param.update(extra_payload)
+            params.append(param)
+
+        responses = []
+        for start in range(0, len(params), chunk_size):
+            chunk = params[start : start + chunk_size]
+            payload = {
+                "method": "get",
+                "params": chunk,
+            }
+
+            try:
+                response = self.post_json_rpc(payload)
+                results = response.get("result", [])
+            except requests.exceptions.RequestException as error:
+                response = {"id": payload["id"]}
+                results = []
+                message = str(error)
+            else:
+                message = "No result returned for this url"
+
+            for idx, param in enumerate(chunk):
+                try:
+                    result = results[idx]
+                except IndexError:
+                    result = {
+                        "status": {"code": STATUS_NO_RESULT, "message": message},
+                        "url": param["url"],
+                    }
+
+                responses.append({"id": response.get("id"), "result": [result]})
+
+        return responses
+
+
+class AsyncFMGJSONRPCAPI:
+    """FMG JSON RPC API Class for asyncio.
+
+    The JSON RPC requests are sent by a FMGJSONRPCAPI instance from a pool of
+    threads, so at most max_in_flight requests are in flight at any time. All
+    of them share the same HTTP connection pool, or the same HTTP/2
+    connection.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, api=None, http2=False):
+        """
+        Args:
+            max_in_flight (int): Max number of concurrent JSON RPC requests
+            api (FMGJSONRPCAPI, optional): The sync API instance to use
+            http2 (bool, optional): multiplex the requests over HTTP/2 when
+                                    available
+        """
+        self.api = api if api else FMGJSONRPCAPI()
+        self.max_in_flight = max_in_flight
+        if http2:
+            self.api.enable_http2(max_in_flight)
+
+        # Allow one pooled connection per request in flight
+        self.api.set_pool_size(max_in_flight)
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="fmgjsonrpcapi"
+        )
+        self._semaphore = None
+
+    async def _run(self, func, *args):
+        """
+        Run a sync FMGJSONRPCAPI method without blocking the event loop.
+
+        Args:
+            func (callable): The FMGJSONRPCAPI method to run
+            args: The method arguments
+
+        Returns:
+            The method output
+        """
+        # The semaphore has to be created from within the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    def debug(self, flag="show"):
+        """
+        Turn on/off debug mode.
+
+        Args:
+            flag (str)
+        """
+        return self.api.debug(flag)
+
+    async def post_json_rpc(self, payload):
+        """
+        Complete and send the JSON RPC payload.
+
+        Args:
+            payload (dic): The JSON RPC payload
+
+        Returns:
+            (dict): The JSON RPC output
+        """
+        return await self._run(self.api.post_json_rpc, payload)
+
+    async def login(
+        self, ip, username, password, port=443, proto="https", persist_session=False
+    ):
+        """
+        Login to FortiManager.
+
+        Args:
+            ip (str): FortiManager IP address or FQDN
+            username (str): FortiManager username
+            password (str): FortiManager password
+            port (int): FortiManager port (default is 443)
+            proto (string): "http" or "https" (default is "https")
+            persist_session (bool): reuse and save the session across runs
+
+        Raises:
+            LoginFailed: FortiManager didn't return a session
+        """
+        await self._run(
+            self.api.login, ip, username, password, port, proto, persist_session
+        )
+
+    async def logout(self):
+        """
+        Logout from FortiManager.
+        """
+        await self._run(self.api.logout)
+
+    async def close(self):
+        """
+        Release the thread pool and the HTTP connection pool.
+        """
+        self._executor.shutdown(wait=True)
+        self.api.disable_http2()
+        self.api.http_session.close()
+
+    async def get(self, url, extra_payload=None):
+        """
+        Implement the FMG JSON RPC API "get" method
+
+        Args:
+            url (str): The FMG JSON RPC API url
+            extra_payload (dict): Extra data to merge in the payload
+
+        Returns:
+            (dict): the response in JSON format.
+        """
+        return await self._run(self.api.get, url, extra_payload)
+
+    async def get_many(self, urls_with_attributes, chunk_size=GET_MANY_CHUNK_SIZE):
+        """
+        Implement the FMG JSON RPC API "get" method for several urls at once.
+
+        The chunks are sent concurrently.
+
+        Args:
+            urls_with_attributes (list): list of urls (str) or of (url,
+                                         extra_payload) tuples
+            chunk_size (int): Max number of urls per JSON RPC request
+
+        Returns:
+            (list): one response per url, in the same order.
+        """
+        urls_with_attributes = list(urls_with_attributes)
+        chunks = [
+            urls_with_attributes[start : start + chunk_size]
+            for start in range(0, len(urls_with_attributes), chunk_size)
+        ]
+        results = await asyncio.gather(
+            *[self._run(self.api.get_many, chunk, chunk_size) for chunk in chunks]
+        )
+
+        return [response for result in results for response in result]
+
 
 if __name__ == "__main__":
-    fmg = FMGJSONRPCAPI()
-    fmg.debug("on")
-    fmg.login("secops-labs-004.gcp.fortipoc.net", "devops", "fortinet", port=10407)
-    fmg.logout()
\ No newline at end of file
+    from fmgmock import MockFMG
+
+    with MockFMG() as mock:
+        fmg = FMGJSONRPCAPI()
+        fmg.debug("on")
+        fmg.login(mock.ip, mock.username, mock.password, mock.port, "http")
+        fmg.logout()
@@ -0,0 +1,225 @@
+# coding: utf-8
+"""Incremental decoding of FortiManager JSON RPC responses."""
+
+import codecs
+import json
+
+# Size of the chunks read from the socket
+STREAM_CHUNK_SIZE = 64 * 1024
+
+WHITESPACES = " \t\n\r"
+
+# Characters which can continue a number (e.g., "1" can be the start of
+# "1.5e3")
+NUMBER_CHARS = "0123456789.eE+-"
+
+
+class JSONRPCStream:
+    """Decode a JSON RPC response while it is received.
+
+    Iterating over a JSONRPCStream yields (result_index, item) tuples, one for
+    each element of result[result_index].data, as soon as it has been
+    received. Only the item being decoded is kept in memory, never the whole
+    body nor the whole object tree.
+
+    Once the iteration is over, the response attribute contains the JSON RPC
+    response without the data (i.e., "id", and "status" and "url" for each
+    result).
+    """
+
+    def __init__(self, chunks, on_close=None):
+        """
+        Args:
+            chunks (iterable): the raw response body as chunks of bytes
+            on_close (callable, optional): called once the iteration is over
+        """
+        self.chunks = iter(chunks)
+        self.on_close = on_close
+        self.response = {}
+
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self):
+        try:
+            yield from self._parse_response()
+        finally:
+            if self.on_close:
+                self.on_close()
+
+    def _fill(self):
+        """
+        Read the next chunk from the socket.
+
+        Returns:
+            (bool): False when there is nothing left to read
+        """
+        if self._eof:
+            return False
+
+        # We drop what was already decoded
+        if self._pos:
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self._buf += self._decoder.decode(b"", final=True)
+            self._eof = True
+            return False
+
+        self._buf += self._decoder.decode(chunk)
+        return True
+
+    def _peek(self):
+        """
+        Skip the whitespaces and return the next character.
+
+        Returns:
+            (str): the next character
+        """
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in WHITESPACES:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise json.JSONDecodeError(
+                    "Unexpected end of data", self._buf, self._pos
+                )
+
+    def _expect(self, chars):
+        """
+        Consume the next character which has to be one of chars.
+
+        Args:
+            chars (str): the expected characters
+
+        Returns:
+            (str): the consumed character
+        """
+        char = self._peek()
+        if char not in chars:
+            raise json.JSONDecodeError(
+                f"Expecting one of '{chars}'", self._buf, self._pos
+            )
+        self._pos += 1
+
+        return char
+
+    def _value(self):
+        """
+        Decode the next JSON value.
+
+        Returns:
+            The decoded value
+        """
+        self._peek()
+        while True:
+            available = len(self._buf) - self._pos
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                # Wait for, at least, twice the data before retrying, so
+                # large values are not decoded over and over
+                wanted = 2 * available
+            else:
+                # A number could continue in the next chunk, even when only
+                # a prefix of it (e.g., "1" of "1.5e") could be decoded
+                if (
+                    self._eof
+                    or isinstance(value, bool)
+                    or not isinstance(value, (int, float))
+                    or end < len(self._buf)
+                    and self._buf[end] not in NUMBER_CHARS
+                ):
+                    self._pos = end
+                    return value
+                wanted = available + 1
+
+            while len(self._buf) - self._pos < wanted and self._fill():
+                pass
+
+    def _parse_response(self):
+        """Parse the top level JSON RPC object."""
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == "result" and self._peek() == "[":
+                self.response["result"] = []
+                yield from self._parse_results()
+            else:
+                self.response[key] = self._value()
+            if self._expect(",}") == "}":
+                return
+
+    def _parse_results(self):
+        """Parse the JSON RPC result list."""
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+
+        idx = 0
+        while True:
+            result = {}
+            self.response["result"].append(result)
+            yield from self._parse_result(idx, result)
+            if self._expect(",]") == "]":
+                return
+            idx += 1
+
+    def _parse_result(self, idx, result):
+        """
+        Parse a JSON RPC result.
+
+        Args:
+            idx (int): the result index
+            result (dict): filled with everything but the data
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == "data" and self._peek() == "[":
+                yield from self._parse_data(idx)
+            elif key == "data":
+                data = self._value()
+                if data is not None:
+                    yield idx, data
+            else:
+                result[key] = self._value()
+            if self._expect(",}") == "}":
+                return
+
+    def _parse_data(self, idx):
+        """
+        Parse a JSON RPC result data list.
+
+        Args:
+            idx (int): the result index
+        """
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+
+        while True:
+            yield idx, self._value()
+            if self._expect(",]") == "]":
+                return
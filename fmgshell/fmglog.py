@@ -0,0 +1,91 @@
+# coding: utf-8
+"""Debug logging for fmgshell."""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+
+# Default debug log file
+DEBUG_FILE = "fmgshell.debug"
+
+# Default max size of the debug log file before rotation (in bytes)
+DEBUG_FILE_MAX_BYTES = 5 * 1024 * 1024
+
+# Default number of rotated debug log files kept
+DEBUG_FILE_BACKUP_COUNT = 3
+
+logger = logging.getLogger("fmgshell")
+logger.setLevel(logging.WARNING)
+logger.propagate = False
+logger.addHandler(logging.NullHandler())
+
+_listener = None
+_queue_handler = None
+
+
+def enable_debug_log(
+    file=DEBUG_FILE,
+    max_bytes=DEBUG_FILE_MAX_BYTES,
+    backup_count=DEBUG_FILE_BACKUP_COUNT,
+):
+    """
+    Start writing the debug messages to a rotated file.
+
+    The messages are queued and written by a background thread, so the
+    caller never waits on disk I/O.
+
+    Args:
+        file (str, optional): the debug log file
+        max_bytes (int, optional): max size of the file before rotation
+        backup_count (int, optional): number of rotated files kept
+    """
+    global _listener, _queue_handler
+
+    disable_debug_log()
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        file, maxBytes=max_bytes, backupCount=backup_count, delay=True
+    )
+    file_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(threadName)s %(name)s: %(message)s")
+    )
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _listener.start()
+
+    logger.addHandler(_queue_handler)
+    logger.setLevel(logging.DEBUG)
+
+
+def disable_debug_log():
+    """Stop writing the debug messages, once the queued ones are written."""
+    global _listener, _queue_handler
+
+    logger.setLevel(logging.WARNING)
+
+    if _queue_handler is not None:
+        logger.removeHandler(_queue_handler)
+        _queue_handler = None
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def is_debug_log_enabled():
+    """
+    Check whether the debug messages are written.
+
+    Returns:
+        (bool)
+    """
+    return logger.isEnabledFor(logging.DEBUG)
+
+
+# Flush the queued messages on exit
+atexit.register(disable_debug_log)
@@ -0,0 +1,704 @@
+# coding: utf-8
+"""Compiled lookups over the firewall objects and policies of an ADOM.
+
+- AddressLookup answers "which addresses and address groups contain an IP
+  address": the address networks are kept in one dict per prefix length, so
+  a lookup costs at most one dict lookup per prefix length in use, and the
+  groups containing each object are expanded once, then memoized.
+- PolicyLookup answers "which policy of a package first matches a 5-tuple":
+  each address, service and interface maps to the bitset (an int) of the
+  policies using it, so a lookup ORs and ANDs a few bitsets instead of
+  walking the policies.
+"""
+
+import ipaddress
+
+from exceptions import WrongResponseStatus
+
+# Object tables; the global ones come first, so the ADOM ones override them
+OBJECT_PREFIXES = ["/pm/config/global", "/pm/config/adom/{adom}"]
+ADDRESS_TABLES = ["obj/firewall/address", "obj/firewall/address6"]
+ADDRESS_GROUP_TABLES = ["obj/firewall/addrgrp", "obj/firewall/addrgrp6"]
+SERVICE_TABLES = ["obj/firewall/service/custom"]
+SERVICE_GROUP_TABLES = ["obj/firewall/service/group"]
+
+# Policies of a policy package
+POLICY_URL = "/pm/config/adom/{adom}/pkg/{package}/firewall/policy"
+
+# Default ADOM and policy package of the lookup commands
+LOOKUP_ADOM = "root"
+LOOKUP_PACKAGE = "default"
+
+# Objects matching everything, when they aren't defined
+ANY_ADDRESS = "all"
+ANY_SERVICE = "ALL"
+ANY_INTERFACE = "any"
+
+# FortiManager returns the enum values as integers, or as strings with
+# "verbose"
+ENABLE = ("enable", 1)
+ADDRESS_TYPES_IPMASK = ("ipmask", 0)
+ADDRESS_TYPES_IPRANGE = ("iprange", 1)
+ADDRESS_TYPES_INTERFACE_SUBNET = ("interface-subnet", 10)
+ADDRESS6_TYPES_IPPREFIX = ("ipprefix", 0)
+SERVICE_PROTOCOLS_ICMP = ("ICMP", 1)
+SERVICE_PROTOCOLS_IP = ("IP", 2)
+SERVICE_PROTOCOLS_TCP_UDP_SCTP = ("TCP/UDP/SCTP", 5)
+SERVICE_PROTOCOLS_ICMP6 = ("ICMP6", 6)
+
+# IP protocol numbers
+IP_PROTOCOLS = {"icmp": 1, "tcp": 6, "udp": 17, "sctp": 132, "icmp6": 58}
+
+# Service port range fields, per IP protocol number
+PORT_RANGE_FIELDS = {6: "tcp-portrange", 17: "udp-portrange", 132: "sctp-portrange"}
+
+# Port range matching any port
+ANY_PORTS = (0, 65535, 0, 65535)
+
+
+def as_list(value):
+    """
+    Get a table entry value as a list.
+
+    Args:
+        value: a list, a space separated string or None
+
+    Returns:
+        (list)
+    """
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+
+    return str(value).split()
+
+
+def parse_address(entry):
+    """
+    Get the networks of an address object.
+
+    Args:
+        entry (dict): the firewall address or address6 entry
+
+    Returns:
+        (list): the ipaddress networks; empty for the addresses which aren't
+                defined by IP addresses (e.g., FQDN or geography)
+    """
+    # FortiManager returns a default "subnet" (0.0.0.0/0) or "ip6" (::/0)
+    # for all the types, so they only count for the types using them;
+    # ipmask and ipprefix are the default types
+    address_type = entry.get("type", ADDRESS_TYPES_IPMASK[0])
+    try:
+        if address_type in ADDRESS_TYPES_IPRANGE:
+            start = ipaddress.ip_address(entry["start-ip"])
+            end = ipaddress.ip_address(entry["end-ip"])
+            return list(ipaddress.summarize_address_range(start, end))
+
+        if "ip6" in entry:
+            if address_type in ADDRESS6_TYPES_IPPREFIX:
+                return [ipaddress.ip_network(entry["ip6"], strict=False)]
+            return []
+
+        if (
+            address_type in ADDRESS_TYPES_IPMASK
+            or address_type in ADDRESS_TYPES_INTERFACE_SUBNET
+        ):
+            subnet = as_list(entry["subnet"])
+            return [ipaddress.ip_network("/".join(subnet[:2]), strict=False)]
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    return []
+
+
+def parse_port_range(value):
+    """
+    Parse a service port range.
+
+    Args:
+        value (str): "dst", "dst_low-dst_high", with an optional source port
+                     range: "dst:src_low-src_high"
+
+    Returns:
+        (tuple): the (dst low, dst high, src low, src high) ports
+    """
+
+    def parse(ports):
+        low, _, high = ports.partition("-")
+        return int(low), int(high or low)
+
+    dst, _, src = str(value).partition(":")
+
+    return parse(dst) + (parse(src) if src else (0, 65535))
+
+
+def expand_groups(groups, name, memo, stack=()):
+    """
+    Expand a group into its non-group members, recursively.
+
+    Args:
+        groups (dict): group name -> member names
+        name (str): the group or member name
+        memo (dict): the groups already expanded
+        stack (tuple): the groups being expanded, to break the cycles
+
+    Returns:
+        (frozenset): the member names
+    """
+    if name not in groups:
+        return frozenset([name])
+    if name in memo:
+        return memo[name]
+    if name in stack:
+        return frozenset()
+
+    members = set()
+    for member in groups[name]:
+        members |= expand_groups(groups, member, memo, stack + (name,))
+    memo[name] = frozenset(members)
+
+    return memo[name]
+
+
+class AddressLookup:
+    """Find the addresses and address groups containing an IP address."""
+
+    def __init__(self, addresses, groups):
+        """
+        Args:
+            addresses (list): the firewall address (and address6) entries
+            groups (list): the firewall address group entries
+        """
+        # (IP version, prefix length) -> network address (int) -> names
+        self.networks = {}
+        # IP version -> prefix lengths in use, most specific first
+        self.prefix_lengths = {4: [], 6: []}
+        # member -> the groups it is a direct member of
+        self.parents = {}
+        # group -> entry
+        self.groups = {}
+        # member -> all the groups it is a member of (memoized)
+        self._ancestors = {}
+
+        names = set()
+        for entry in addresses:
+            names.add(entry.get("name"))
+            for network in parse_address(entry):
+                self._add_network(entry.get("name"), network)
+
+        if ANY_ADDRESS not in names:
+            for network in ("0.0.0.0/0", "::/0"):
+                self._add_network(ANY_ADDRESS, ipaddress.ip_network(network))
+
+        for entry in groups:
+            self.groups[entry.get("name")] = entry
+            for member in as_list(entry.get("member")):
+                self.parents.setdefault(member, []).append(entry.get("name"))
+
+        # Groups with exclusions are checked member by member
+        self.exclusions = any(
+            entry.get("exclude") in ENABLE and entry.get("exclude-member")
+            for entry in groups
+        )
+
+        for version in self.prefix_lengths:
+            self.prefix_lengths[version] = sorted(
+                {length for v, length in self.networks if v == version}, reverse=True
+            )
+
+    def _add_network(self, name, network):
+        networks = self.networks.setdefault((network.version, network.prefixlen), {})
+        networks.setdefault(int(network.network_address), []).append(name)
+
+    def get_addresses(self, ip):
+        """
+        Get the addresses containing an IP address.
+
+        Args:
+            ip (str or ipaddress.IPv4Address): the IP address
+
+        Raises:
+            ValueError: ip isn't an IP address
+
+        Returns:
+            (list): the address names, most specific first
+        """
+        ip = ipaddress.ip_address(ip)
+        value = int(ip)
+        max_length = ip.max_prefixlen
+
+        names = []
+        for length in self.prefix_lengths[ip.version]:
+            shift = max_length - length
+            found = self.networks[(ip.version, length)].get(value >> shift << shift)
+            if found:
+                names.extend(found)
+
+        return names
+
+    def get_ancestors(self, name):
+        """
+        Get all the groups an object is a member of, directly or not.
+
+        Args:
+            name (str): the address or group name
+
+        Returns:
+            (frozenset): the group names
+        """
+        ancestors = self._ancestors.get(name)
+        if ancestors is not None:
+            return ancestors
+
+        ancestors = set()
+        pending = list(self.parents.get(name, []))
+        while pending:
+            group = pending.pop()
+            if group in ancestors:
+                continue
+            ancestors.add(group)
+            pending.extend(self.parents.get(group, []))
+
+        self._ancestors[name] = ancestors = frozenset(ancestors)
+
+        return ancestors
+
+    def _contains(self, name, addresses, memo, stack=()):
+        """
+        Check whether an object contains the IP address, with the group
+        exclusions.
+
+        Args:
+            name (str): the address or group name
+            addresses (set): the addresses containing the IP address
+            memo (dict): the groups already checked
+            stack (tuple): the groups being checked, to break the cycles
+
+        Returns:
+            (bool)
+        """
+        if name in addresses:
+            return True
+        entry = self.groups.get(name)
+        if entry is None or name in stack:
+            return False
+        if name in memo:
+            return memo[name]
+
+        stack += (name,)
+        contains = any(
+            self._contains(member, addresses, memo, stack)
+            for member in as_list(entry.get("member"))
+        )
+        if contains and entry.get("exclude") in ENABLE:
+            contains = not any(
+                self._contains(member, addresses, memo, stack)
+                for member in as_list(entry.get("exclude-member"))
+            )
+        memo[name] = contains
+
+        return contains
+
+    def lookup(self, ip):
+        """
+        Get the addresses and address groups containing an IP address.
+
+        Args:
+            ip (str): the IP address
+
+        Raises:
+            ValueError: ip isn't an IP address
+
+        Returns:
+            (tuple): the address names (most specific first) and the sorted
+                     group names
+        """
+        # The global and ADOM objects can share names
+        addresses = list(dict.fromkeys(self.get_addresses(ip)))
+
+        groups = set()
+        for name in addresses:
+            groups |= self.get_ancestors(name)
+
+        if self.exclusions:
+            matched = set(addresses)
+            memo = {}
+            groups = {group for group in groups if self._contains(group, matched, memo)}
+
+        return addresses, sorted(groups)
+
+
+class PolicyLookup:
+    """Find the policies of a package matching a 5-tuple."""
+
+    def __init__(self, policies, addresses, services, service_groups):
+        """
+        Args:
+            policies (list): the firewall policy entries, in sequence order
+            addresses (AddressLookup): the ADOM addresses
+            services (list): the firewall custom service entries
+            service_groups (list): the firewall service group entries
+        """
+        self.policies = policies
+        self.addresses = addresses
+        self.all_bits = (1 << len(policies)) - 1
+
+        # name -> bitset of the policies using it
+        self.srcaddr_bits = {}
+        self.dstaddr_bits = {}
+        self.srcintf_bits = {}
+        self.dstintf_bits = {}
+        # (protocol, dst low, dst high, src low, src high) -> bitset; the
+        # protocol is None for any protocol
+        self.service_bits = {}
+
+        self.enabled_bits = 0
+        self.srcaddr_negate_bits = 0
+        self.dstaddr_negate_bits = 0
+        self.service_negate_bits = 0
+
+        matchers = {}
+        for entry in services:
+            matchers[entry.get("name")] = self._compile_service(entry)
+        if ANY_SERVICE not in matchers:
+            matchers[ANY_SERVICE] = [(None,) + ANY_PORTS]
+
+        groups = {
+            entry.get("name"): as_list(entry.get("member")) for entry in service_groups
+        }
+        expanded = {}
+
+        for idx, policy in enumerate(policies):
+            bit = 1 << idx
+            if policy.get("status", 1) not in ("disable", 0):
+                self.enabled_bits |= bit
+            if policy.get("srcaddr-negate") in ENABLE:
+                self.srcaddr_negate_bits |= bit
+            if policy.get("dstaddr-negate") in ENABLE:
+                self.dstaddr_negate_bits |= bit
+            if policy.get("service-negate") in ENABLE:
+                self.service_negate_bits |= bit
+
+            for field, bits in (
+                ("srcaddr", self.srcaddr_bits),
+                ("dstaddr", self.dstaddr_bits),
+                ("srcintf", self.srcintf_bits),
+                ("dstintf", self.dstintf_bits),
+            ):
+                for name in as_list(policy.get(field)):
+                    bits[name] = bits.get(name, 0) | bit
+
+            keys = set()
+            for name in as_list(policy.get("service")):
+                for member in expand_groups(groups, name, expanded):
+                    keys.update(matchers.get(member, []))
+            for key in keys:
+                self.service_bits[key] = self.service_bits.get(key, 0) | bit
+
+        # protocol -> [(dst low, dst high, src low, src high, bitset)]
+        self.service_ranges = {}
+        for (protocol, *ports), bits in self.service_bits.items():
+            self.service_ranges.setdefault(protocol, []).append((*ports, bits))
+
+    @staticmethod
+    def _compile_service(entry):
+        """
+        Compile a custom service into (protocol, dst low, dst high, src low,
+        src high) keys.
+
+        Args:
+            entry (dict): the firewall service custom entry
+
+        Returns:
+            (list): the keys
+        """
+        protocol = entry.get("protocol", SERVICE_PROTOCOLS_TCP_UDP_SCTP[0])
+
+        if protocol in SERVICE_PROTOCOLS_TCP_UDP_SCTP:
+            keys = []
+            for number, field in PORT_RANGE_FIELDS.items():
+                for value in as_list(entry.get(field)):
+                    try:
+                        keys.append((number,) + parse_port_range(value))
+                    except ValueError:
+                        pass
+            return keys
+
+        if protocol in SERVICE_PROTOCOLS_ICMP:
+            return [(IP_PROTOCOLS["icmp"],) + ANY_PORTS]
+
+        if protocol in SERVICE_PROTOCOLS_ICMP6:
+            return [(IP_PROTOCOLS["icmp6"],) + ANY_PORTS]
+
+        if protocol in SERVICE_PROTOCOLS_IP:
+            number = entry.get("protocol-number", 0)
+            return [((number or None),) + ANY_PORTS]
+
+        # Proxy services (e.g., HTTP, CONNECT) don't match firewall policies
+        return []
+
+    def _get_address_bits(self, ip, bits, negate_bits):
+        addresses, groups = self.addresses.lookup(ip)
+        matched = 0
+        for name in addresses + groups:
+            matched |= bits.get(name, 0)
+
+        return (matched & ~negate_bits) | (~matched & negate_bits & self.all_bits)
+
+    def _get_service_bits(self, protocol, dst_port, src_port):
+        matched = 0
+        for ranges in (
+            self.service_ranges.get(protocol, ()),
+            self.service_ranges.get(None, ()),
+        ):
+            for dst_low, dst_high, src_low, src_high, bits in ranges:
+                if dst_port is not None and not dst_low <= dst_port <= dst_high:
+                    continue
+                if src_port is not None and not src_low <= src_port <= src_high:
+                    continue
+                matched |= bits
+
+        negate_bits = self.service_negate_bits
+
+        return (matched & ~negate_bits) | (~matched & negate_bits & self.all_bits)
+
+    def _get_interface_bits(self, interface, bits):
+        if interface is None:
+            return self.all_bits
+
+        return bits.get(interface, 0) | bits.get(ANY_INTERFACE, 0)
+
+    def match(
+        self,
+        src,
+        dst,
+        protocol,
+        dst_port=None,
+        src_port=None,
+        srcintf=None,
+        dstintf=None,
+    ):
+        """
+        Get the policies matching a 5-tuple.
+
+        Args:
+            src (str): the source IP address
+            dst (str): the destination IP address
+            protocol (int or str): the IP protocol number or name (e.g.,
+                                   "tcp")
+            dst_port (int, optional): the destination port
+            src_port (int, optional): the source port; any when None
+            srcintf (str, optional): the incoming interface; any when None
+            dstintf (str, optional): the outgoing interface; any when None
+
+        Raises:
+            ValueError: src or dst isn't an IP address, or protocol is
+                        unknown
+
+        Returns:
+            (int): the bitset of the matching policies, bit n being the
+                   n-th policy
+        """
+        if isinstance(protocol, str):
+            if protocol.isdigit():
+                protocol = int(protocol)
+            elif protocol.lower() in IP_PROTOCOLS:
+                protocol = IP_PROTOCOLS[protocol.lower()]
+            else:
+                raise ValueError(f"Unknown protocol: {protocol}")
+        src = ipaddress.ip_address(src)
+        dst = ipaddress.ip_address(dst)
+
+        bits = self.enabled_bits
+        bits &= self._get_interface_bits(srcintf, self.srcintf_bits)
+        bits &= self._get_interface_bits(dstintf, self.dstintf_bits)
+        if bits:
+            bits &= self._get_service_bits(protocol, dst_port, src_port)
+        if bits:
+            bits &= self._get_address_bits(
+                src, self.srcaddr_bits, self.srcaddr_negate_bits
+            )
+        if bits:
+            bits &= self._get_address_bits(
+                dst, self.dstaddr_bits, self.dstaddr_negate_bits
+            )
+
+        return bits
+
+    def first_match(self, *args, **kwargs):
+        """
+        Get the first policy matching a 5-tuple, i.e., the one applied.
+
+        Args:
+            see match()
+
+        Returns:
+            (dict): the policy or None
+        """
+        bits = self.match(*args, **kwargs)
+        if not bits:
+            return None
+
+        return self.policies[(bits & -bits).bit_length() - 1]
+
+    def all_matches(self, *args, **kwargs):
+        """
+        Get all the policies matching a 5-tuple, in sequence order.
+
+        Args:
+            see match()
+
+        Returns:
+            (list): the policies
+        """
+        bits = self.match(*args, **kwargs)
+        policies = []
+        while bits:
+            low_bit = bits & -bits
+            policies.append(self.policies[low_bit.bit_length() - 1])
+            bits ^= low_bit
+
+        return policies
+
+
+class Lookups:
+    """Build the lookups of ADOMs and policy packages from the FMG cache.
+
+    The tables are fetched with the response cache, and the lookups are only
+    compiled again when one of their tables changed.
+    """
+
+    def __init__(self, fmg):
+        """
+        Args:
+            fmg (FMG): the FortiManager
+        """
+        self.fmg = fmg
+        # (adom, package) -> (table versions, lookup)
+        self._compiled = {}
+
+    @staticmethod
+    def get_object_urls(adom, tables):
+        return [
+            f"{prefix.format(adom=adom)}/{table}"
+            for prefix in OBJECT_PREFIXES
+            for table in tables
+        ]
+
+    def _get_tables(self, urls, required=()):
+        """
+        Get tables through the response cache.
+
+        Args:
+            urls (list): the table urls
+            required (tuple): the urls which must exist
+
+        Raises:
+            WrongResponseStatus: a required url failed
+
+        Returns:
+            (tuple): url -> entries, missing tables being empty, and the
+                     table versions (None when a table has no checksum)
+        """
+        tables = {}
+        versions = []
+        for url, response in zip(urls, self.fmg.get_many(urls, cache=True)):
+            result = response["result"][0]
+            status = result.get("status", {})
+            if status.get("code") == 0:
+                data = result.get("data") or []
+                tables[url] = data if isinstance(data, list) else [data]
+                # The checksums were refreshed by FMG.get_many()
+                versions.append(self.fmg.checksums.get(url, (None,))[0])
+            elif url in required:
+                raise WrongResponseStatus(url, status)
+            else:
+                tables[url] = []
+                versions.append(("status", status.get("code")))
+
+        return tables, tuple(versions)
+
+    def _get_compiled(self, key, versions, build):
+        """
+        Get a compiled lookup, compiling it again when one of its tables
+        changed.
+
+        Args:
+            key (tuple): the lookup key
+            versions (tuple): the versions of what it is compiled from
+            build (function): compiles the lookup
+
+        Returns:
+            the lookup
+        """
+        compiled = self._compiled.get(key)
+        if compiled is not None and compiled[0] == versions and None not in versions:
+            return compiled[1]
+
+        lookup = build()
+        self._compiled[key] = (versions, lookup)
+
+        return lookup
+
+    def get_address_lookup(self, adom):
+        """
+        Get the address lookup of an ADOM.
+
+        Args:
+            adom (str): the ADOM name
+
+        Raises:
+            WrongResponseStatus: FortiManager failed
+
+        Returns:
+            (AddressLookup)
+        """
+        address_urls = self.get_object_urls(adom, ADDRESS_TABLES)
+        group_urls = self.get_object_urls(adom, ADDRESS_GROUP_TABLES)
+        tables, versions = self._get_tables(address_urls + group_urls)
+
+        def build():
+            return AddressLookup(
+                [entry for url in address_urls for entry in tables[url]],
+                [entry for url in group_urls for entry in tables[url]],
+            )
+
+        return self._get_compiled((adom, None), versions, build)
+
+    def get_policy_lookup(self, adom, package):
+        """
+        Get the policy lookup of a policy package.
+
+        Args:
+            adom (str): the ADOM name
+            package (str): the policy package path
+
+        Raises:
+            WrongResponseStatus: the package doesn't exist, or FortiManager
+                                 failed
+
+        Returns:
+            (PolicyLookup)
+        """
+        addresses = self.get_address_lookup(adom)
+
+        policy_url = POLICY_URL.format(adom=adom, package=package)
+        service_urls = self.get_object_urls(adom, SERVICE_TABLES)
+        group_urls = self.get_object_urls(adom, SERVICE_GROUP_TABLES)
+        tables, versions = self._get_tables(
+            [policy_url] + service_urls + group_urls, required=(policy_url,)
+        )
+
+        def build():
+            return PolicyLookup(
+                tables[policy_url],
+                addresses,
+                [entry for url in service_urls for entry in tables[url]],
+                [entry for url in group_urls for entry in tables[url]],
+            )
+
+        # The address lookup is compiled in the policy lookup
+        versions += self._compiled[(adom, None)][0]
+
+        return self._get_compiled((adom, package), versions, build)
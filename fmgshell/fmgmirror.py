@@ -0,0 +1,301 @@
+# coding: utf-8
+"""Incremental on-disk mirror of FortiManager tables.
+
+A mirror directory holds:
+- manifest.json: for each mirrored table, its checksum ("option: devinfo"
+  uuid), its file, its number of entries and when it was fetched
+- tables/: one gzip compressed NDJSON file per table, with one entry per
+  line
+- tables/*.hashes: the digest of each table entry, used to diff the
+  successive versions of a table
+- changes.ndjson: what changed at each sync, one line per changed table and
+  one summary line per sync
+
+A sync only fetches the tables whose checksum changed (or which don't
+provide any), so a sync of an unchanged FortiManager costs one "option:
+devinfo" request per GET_MANY_CHUNK_SIZE tables.
+"""
+
+import concurrent.futures
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+from exceptions import WrongResponseStatus
+from fmg import PAGE_SIZE
+from fmgtable import get_entry_key
+
+# Default mirror directory
+MIRROR_DIR = "fmgshell-mirror"
+
+# Default number of tables fetched concurrently
+MIRROR_WORKERS = 8
+
+MANIFEST_FILE = "manifest.json"
+CHANGES_FILE = "changes.ndjson"
+TABLES_DIR = "tables"
+
+
+def is_below(url, path):
+    """
+    Check whether an url is a path or below it.
+
+    Args:
+        url (str): the url
+        path (str): the path, without trailing slash
+
+    Returns:
+        (bool)
+    """
+    return url == path or url.startswith(f"{path}/")
+
+
+def write_json(file, data):
+    """
+    Write a JSON file atomically.
+
+    Args:
+        file (str): the file
+        data: the content
+    """
+    tmp_file = f"{file}.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_file, file)
+
+
+class Mirror:
+    """Local mirror of FortiManager tables, refreshed from their checksums."""
+
+    def __init__(self, fmg, directory=MIRROR_DIR):
+        """
+        Args:
+            fmg (FMG): the FortiManager
+            directory (str, optional): the mirror directory. Defaults to
+                MIRROR_DIR.
+        """
+        self.fmg = fmg
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, MANIFEST_FILE)
+        self.changes_file = os.path.join(directory, CHANGES_FILE)
+        self.tables_dir = os.path.join(directory, TABLES_DIR)
+
+        os.makedirs(self.tables_dir, mode=0o700, exist_ok=True)
+        try:
+            with open(self.manifest_file, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+
+        self._lock = threading.Lock()
+
+    def get_table_file(self, url):
+        """
+        Get the file of a mirrored table.
+
+        Args:
+            url (str): the table url
+
+        Returns:
+            (str): the file path, relative to the mirror directory
+        """
+        digest = hashlib.sha1(url.encode()).hexdigest()
+
+        return os.path.join(TABLES_DIR, f"{digest}.ndjson.gz")
+
+    def iter_entries(self, url):
+        """
+        Iterate over the entries of a mirrored table.
+
+        Args:
+            url (str): the table url
+
+        Yields:
+            (dict): the table entries
+        """
+        table = self.manifest.get(url)
+        if table is None:
+            return
+
+        with gzip.open(os.path.join(self.directory, table["file"]), "rb") as f:
+            for line in f:
+                yield self.fmg.api.codec.decode(line)
+
+    def _load_hashes(self, file):
+        try:
+            with open(os.path.join(self.directory, f"{file}.hashes")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _fetch(self, url, is_table, page_size):
+        """
+        Fetch a table into the mirror, then diff it against the previous
+        version.
+
+        Args:
+            url (str): the table url
+            is_table (bool): False for a single object
+            page_size (int): the number of entries fetched per request
+
+        Returns:
+            (dict): the table manifest and the change record
+        """
+        codec = self.fmg.api.codec
+        file = self.get_table_file(url)
+        path = os.path.join(self.directory, file)
+        tmp_path = f"{path}.{threading.get_ident()}"
+
+        if is_table:
+            entries = self.fmg.iter_table(url, page_size=page_size)
+        else:
+            entries = self.fmg.iter_get(url)
+
+        hashes = {}
+        try:
+            with gzip.open(tmp_path, "wb") as f:
+                for idx, entry in enumerate(entries):
+                    line = codec.encode(entry)
+                    f.write(line + b"\n")
+                    key = get_entry_key(url, entry, idx)
+                    hashes[key] = hashlib.sha1(line).hexdigest()
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        previous = self._load_hashes(file)
+        os.replace(tmp_path, path)
+        write_json(f"{path}.hashes", hashes)
+
+        change = {
+            "url": url,
+            "added": sorted(key for key in hashes if key not in previous),
+            "removed": sorted(key for key in previous if key not in hashes),
+            "modified": sorted(
+                key
+                for key, digest in hashes.items()
+                if key in previous and previous[key] != digest
+            ),
+        }
+        table = {"file": file, "entries": len(hashes), "synced": time.time()}
+
+        return table, change
+
+    def sync(self, nodes, workers=MIRROR_WORKERS, page_size=PAGE_SIZE):
+        """
+        Bring the mirror of the tables below FMG FS nodes up to date.
+
+        The checksums of all the tables are retrieved in bulk; only the
+        tables whose checksum changed, or which don't provide any, are
+        fetched again. The tables which aren't below the nodes anymore but
+        were mirrored from them (e.g., deleted ADOMs) are dropped, unless
+        the walk failed above them (e.g., the ADOM list couldn't be read):
+        they are kept, and the failing path is reported in "errors".
+
+        Args:
+            nodes (list): the FMG FS nodes to mirror
+            workers (int): the number of tables fetched concurrently
+            page_size (int): the number of entries fetched per request
+
+        Returns:
+            (dict): the sync summary: "checked", "fetched", "unchanged",
+                    "changed", "dropped" tables, "added", "removed",
+                    "modified" entries, "elapsed" (in seconds), and "errors"
+                    (a list of (url, error message) tuples)
+        """
+        start = time.perf_counter()
+        tables = {}
+        walk_errors = []
+        for node in nodes:
+            for table in node.iter_tables(walk_errors):
+                tables[table.get_full_path()] = table.is_table()
+
+        checksums = self.fmg.get_checksums(tables)
+        to_fetch = [
+            url
+            for url, checksum in checksums.items()
+            if checksum is None
+            or url not in self.manifest
+            or self.manifest[url].get("checksum") != checksum
+        ]
+
+        summary = {
+            "checked": len(tables),
+            "fetched": 0,
+            "unchanged": len(tables) - len(to_fetch),
+            "changed": 0,
+            "dropped": 0,
+            "added": 0,
+            "removed": 0,
+            "modified": 0,
+            "elapsed": 0.0,
+            "errors": list(walk_errors),
+        }
+        changes = []
+
+        def fetch(url):
+            try:
+                table, change = self._fetch(url, tables[url], page_size)
+            except (
+                WrongResponseStatus,
+                requests.exceptions.RequestException,
+            ) as error:
+                with self._lock:
+                    summary["errors"].append((url, str(error)))
+                return
+
+            table["checksum"] = checksums[url]
+            with self._lock:
+                self.manifest[url] = table
+                summary["fetched"] += 1
+                if change["added"] or change["removed"] or change["modified"]:
+                    summary["changed"] += 1
+                    changes.append(change)
+                    for key in ("added", "removed", "modified"):
+                        summary[key] += len(change[key])
+
+        # One pooled connection per worker
+        self.fmg.api.set_pool_size(workers)
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="fmgmirror"
+        ) as executor:
+            for future in [executor.submit(fetch, url) for url in to_fetch]:
+                future.result()
+
+        # The tables gone from the FortiManager; the ones below a path
+        # whose walk failed are unknown, not gone
+        paths = [node.get_full_path().rstrip("/") for node in nodes]
+        failed_paths = [path.rstrip("/") for path, _ in walk_errors]
+        for url in list(self.manifest):
+            if url in tables:
+                continue
+            if not any(is_below(url, path) for path in paths):
+                continue
+            if any(is_below(url, path) for path in failed_paths):
+                continue
+            table = self.manifest.pop(url)
+            for suffix in ("", ".hashes"):
+                try:
+                    os.unlink(os.path.join(self.directory, table["file"] + suffix))
+                except FileNotFoundError:
+                    pass
+            summary["dropped"] += 1
+            changes.append({"url": url, "dropped": True})
+
+        write_json(self.manifest_file, self.manifest)
+
+        summary["elapsed"] = time.perf_counter() - start
+        now = time.time()
+        with open(self.changes_file, "a", encoding="utf-8") as f:
+            for change in changes:
+                f.write(json.dumps(dict(change, time=now)) + "\n")
+            record = {key: value for key, value in summary.items() if key != "errors"}
+            record["errors"] = len(summary["errors"])
+            f.write(json.dumps({"sync": record, "time": now}) + "\n")
+
+        return summary
@@ -0,0 +1,586 @@
+# coding: utf-8
+"""Mock FortiManager JSON RPC server.
+
+The mock serves synthetic tables over HTTP, in-process, so the FMG JSON RPC
+API, the FMG middleware and the FMG FS can be exercised and benchmarked
+without a FortiManager.
+
+It implements the "exec" method for /sys/login/user and /sys/logout, and the
+"get" method with the "fields", "filter", "range" and "option: devinfo"
+attributes. A request can carry several param blocks. Tasks added with
+add_task() are served by /task/task/<id>.
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import ipaddress
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fmgtable import TABLE_NAME_KEYS
+
+# Default credentials accepted by the mock
+MOCK_USERNAME = "admin"
+MOCK_PASSWORD = "fortinet"
+
+# FortiManager status codes
+STATUS_OK = 0
+STATUS_INVALID_URL = -6
+STATUS_OBJECT_NOT_FOUND = -3
+STATUS_NO_PERMISSION = -11
+STATUS_LOGIN_FAIL = -22
+
+STATUS_MESSAGES = {
+    STATUS_OK: "OK",
+    STATUS_INVALID_URL: "Invalid url",
+    STATUS_OBJECT_NOT_FOUND: "Object does not exist",
+    STATUS_NO_PERMISSION: "No permission for the resource",
+    STATUS_LOGIN_FAIL: "Login fail",
+}
+
+# Tasks
+TASK_URL_PREFIX = "/task/task/"
+TASK_STATE_RUNNING = 1
+TASK_STATE_DONE = 4
+TASK_STATE_ERROR = 5
+
+# Custom services of the generated ADOMs: name, TCP port ranges
+SERVICES = [
+    ("HTTP", ["80"]),
+    ("HTTPS", ["443"]),
+    ("SSH", ["22"]),
+    ("DNS", ["53"]),
+    ("HIGH-PORTS", ["1024-65535"]),
+]
+
+# Filter operators
+FILTER_OPERATORS = {
+    "==": lambda value, other: value == other,
+    "!=": lambda value, other: value != other,
+    "<": lambda value, other: value < other,
+    "<=": lambda value, other: value <= other,
+    ">": lambda value, other: value > other,
+    ">=": lambda value, other: value >= other,
+    "in": lambda value, *others: value in others,
+    "like": lambda value, pattern: fnmatch.fnmatchcase(
+        str(value), pattern.replace("%", "*").replace("_", "?")
+    ),
+    "contain": lambda value, other: other in value,
+}
+
+
+def match_filter(entry, filter):
+    """
+    Check whether a table entry matches a FMG JSON RPC API filter.
+
+    A filter is either [field, operator, value, ...], [filter, "&&",
+    filter, ...], [filter, "||", filter, ...] or ["!", filter]. A list field
+    matches when one of its values does.
+
+    Args:
+        entry (dict): the table entry
+        filter (list): the filter
+
+    Returns:
+        (bool)
+    """
+    if filter[0] == "!":
+        return not match_filter(entry, filter[1])
+
+    if isinstance(filter[0], list):
+        results = [match_filter(entry, item) for item in filter[::2]]
+        if "||" in filter[1::2]:
+            return any(results)
+        return all(results)
+
+    field, operator, *others = filter
+    value = entry.get(field)
+    if value is None:
+        return False
+
+    function = FILTER_OPERATORS[operator]
+    values = value if isinstance(value, list) and operator != "contain" else [value]
+    for value in values:
+        try:
+            if function(value, *others):
+                return True
+        except TypeError:
+            pass
+
+    return False
+
+
+def generate_tables(adoms=1, addresses=1000, groups=100, policies=1000, seed=0):
+    """
+    Generate synthetic FortiManager tables.
+
+    Each ADOM gets a firewall address table, a firewall address group table,
+    a firewall service table and a "default" policy package. The urls follow
+    the FMG FS supported path.
+
+    Args:
+        adoms (int): the number of ADOMs, "root" being the first one
+        addresses (int): the number of addresses per ADOM
+        groups (int): the number of address groups per ADOM
+        policies (int): the number of policies per ADOM
+        seed (int): the seed of the generated data
+
+    Returns:
+        (dict): url -> table (list) or object (dict)
+    """
+    adom_names = ["root"] + [f"adom{idx}" for idx in range(1, adoms)]
+    tables = {
+        "/cli/global/system/status": {
+            "Hostname": "FMG-MOCK",
+            "Platform Type": "FMG-VM64",
+            "Version": "v7.2.2-build1334 221025 (GA)",
+            "Serial Number": "FMG-VM0000000000",
+            "Admin Domain Configuration": "Enabled",
+            "HA Mode": "Stand Alone",
+        },
+        "/dvmdb/adom": [
+            {"name": name, "oid": 100 + idx, "restricted_prds": "fos"}
+            for idx, name in enumerate(adom_names)
+        ]
+        + [{"name": "rootp", "oid": 10, "restricted_prds": "fos"}],
+        "/dvmdb/device": [],
+        "/sys/status": {"Version": "v7.2.2-build1334 221025 (GA)"},
+    }
+
+    # The FMG FS lists the "rootp" ADOM as "global"
+    for adom_idx, adom in enumerate(adom_names + ["global"]):
+        prefix = f"/pm/config/adom/{adom}"
+        network = ipaddress.IPv4Network(f"10.{adom_idx % 256}.0.0/16")
+        address_table = []
+        for idx in range(addresses):
+            subnet = network.network_address + (idx * 4) % network.num_addresses
+            address_table.append(
+                {
+                    "name": f"address_{idx}",
+                    "type": "ipmask",
+                    "subnet": [str(subnet), "255.255.255.252"],
+                    "comment": f"Synthetic address {idx}",
+                    "color": idx % 32,
+                    "uuid": hashlib.md5(f"{seed}{adom}{idx}".encode()).hexdigest(),
+                }
+            )
+        tables[f"{prefix}/obj/firewall/address"] = address_table
+
+        tables[f"{prefix}/obj/firewall/addrgrp"] = [
+            {
+                "name": f"group_{idx}",
+                "member": [
+                    f"address_{member}"
+                    for member in range(idx, addresses, max(groups, 1))
+                ][:10],
+                "color": 0,
+            }
+            for idx in range(groups if addresses else 0)
+        ]
+
+        tables[f"{prefix}/obj/firewall/service/custom"] = [
+            {"name": name, "protocol": 5, "tcp-portrange": ports, "udp-portrange": []}
+            for name, ports in SERVICES
+        ]
+
+        tables[f"/pm/pkg/adom/{adom}"] = [{"name": "default", "type": "pkg"}]
+
+        tables[f"{prefix}/pkg/default/firewall/policy"] = [
+            {
+                "policyid": idx + 1,
+                "name": f"policy_{idx + 1}",
+                "srcintf": ["any"],
+                "dstintf": ["any"],
+                "srcaddr": [f"address_{idx % addresses}" if addresses else "all"],
+                "dstaddr": ["all"],
+                "service": [SERVICES[idx % len(SERVICES)][0]],
+                "action": 1,
+                "schedule": ["always"],
+            }
+            for idx in range(policies)
+        ]
+
+    return tables
+
+
+class MockFMG:
+    """In-process mock FortiManager.
+
+    Usage:
+        with MockFMG(generate_tables(), latency=0.01) as mock:
+            fmg = FMG()
+            fmg.login(mock.ip, mock.username, mock.password, mock.port, "http")
+
+    The tables can be modified while the server is running with set_table()
+    and set_entry(); each change updates the checksum returned by "option:
+    devinfo" for the modified url.
+    """
+
+    def __init__(
+        self,
+        tables=None,
+        latency=0.0,
+        username=MOCK_USERNAME,
+        password=MOCK_PASSWORD,
+    ):
+        """
+        Args:
+            tables (dict, optional): url -> table (list) or object (dict).
+                Defaults to generate_tables().
+            latency (float, optional): time spent before answering each
+                request (in seconds). Defaults to 0.0.
+            username (str, optional): the accepted username
+            password (str, optional): the accepted password
+        """
+        self.tables = generate_tables() if tables is None else tables
+        self.latency = latency
+        self.username = username
+        self.password = password
+        self.ip = "127.0.0.1"
+        self.port = None
+
+        self.versions = {}
+        self.sessions = set()
+        # task id -> (start time, duration, title, final state)
+        self.tasks = {}
+        # Number of JSON RPC requests and param blocks served
+        self.requests = 0
+        self.params = 0
+
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self, port=0):
+        """
+        Start serving in a background thread.
+
+        Args:
+            port (int, optional): the listening port. Defaults to a free one.
+
+        Returns:
+            (int): the listening port
+        """
+        handler = type("Handler", (MockFMGRequestHandler,), {"mock": self})
+        self._server = ThreadingHTTPServer((self.ip, port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mock-fmg", daemon=True
+        )
+        self._thread.start()
+
+        return self.port
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.ip}:{self.port}/jsonrpc"
+
+    def set_table(self, url, data):
+        """
+        Add or replace a table or an object.
+
+        Args:
+            url (str): the url
+            data (list or dict): the table entries or the object
+        """
+        with self._lock:
+            self.tables[url] = data
+            self.versions[url] = self.versions.get(url, 0) + 1
+
+    def set_entry(self, url, entry):
+        """
+        Add or replace an entry of a table.
+
+        Args:
+            url (str): the table url
+            entry (dict): the entry
+        """
+        name_key = TABLE_NAME_KEYS.get(url.rsplit("/", 1)[-1], "name")
+        with self._lock:
+            # Requests being served keep reading the previous table
+            table = list(self.tables.get(url, []))
+            for idx, existing in enumerate(table):
+                if existing.get(name_key) == entry.get(name_key):
+                    table[idx] = entry
+                    break
+            else:
+                table.append(entry)
+            self.tables[url] = table
+            self.versions[url] = self.versions.get(url, 0) + 1
+
+    def expire_sessions(self):
+        """Invalidate all the sessions, as if they expired."""
+        with self._lock:
+            self.sessions.clear()
+
+    def add_task(self, duration, title="", state=TASK_STATE_DONE):
+        """
+        Add a task, which progresses linearly from now on.
+
+        Args:
+            duration (float): how long the task runs (in seconds)
+            title (str, optional): the task title
+            state (int, optional): the task state once it's finished
+
+        Returns:
+            (int): the task id
+        """
+        with self._lock:
+            task_id = len(self.tasks) + 1
+            self.tasks[task_id] = (time.monotonic(), duration, title, state)
+
+        return task_id
+
+    def get_task(self, task_id):
+        """
+        Get the /task/task/<id> data of a task.
+
+        Args:
+            task_id (int): the task id
+
+        Returns:
+            (dict): the task data, or None
+        """
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+
+        start, duration, title, state = task
+        elapsed = time.monotonic() - start
+        percent = min(int(elapsed / duration * 100), 100) if duration else 100
+
+        return {
+            "id": task_id,
+            "title": title,
+            "percent": percent,
+            "state": state if percent == 100 else TASK_STATE_RUNNING,
+            "num_done": 1 if percent == 100 and state == TASK_STATE_DONE else 0,
+            "num_err": 1 if percent == 100 and state != TASK_STATE_DONE else 0,
+            "num_lines": 1,
+        }
+
+    def checksum(self, url):
+        """
+        Get the checksum of an url, as returned by "option: devinfo".
+
+        Args:
+            url (str): the url
+
+        Returns:
+            (str): the checksum
+        """
+        version = self.versions.get(url, 0)
+        return hashlib.md5(f"{url}:{version}".encode()).hexdigest()
+
+    def lookup(self, url):
+        """
+        Get the table or the object behind an url.
+
+        Args:
+            url (str): the url
+
+        Returns:
+            (list or dict): the table or the object, or None
+        """
+        url = url.rstrip("/") or "/"
+        data = self.tables.get(url)
+        if data is not None:
+            return data
+
+        if url.startswith(TASK_URL_PREFIX) and url[len(TASK_URL_PREFIX) :].isdigit():
+            return self.get_task(int(url[len(TASK_URL_PREFIX) :]))
+
+        # An entry of a table
+        table_url, _, name = url.rpartition("/")
+        table = self.tables.get(table_url)
+        if not isinstance(table, list):
+            return None
+        name_key = TABLE_NAME_KEYS.get(table_url.rsplit("/", 1)[-1], "name")
+        for entry in table:
+            if str(entry.get(name_key)) == name:
+                return entry
+
+        return None
+
+    def handle(self, request):
+        """
+        Answer a JSON RPC request.
+
+        Args:
+            request (dict): the JSON RPC request
+
+        Returns:
+            (dict): the JSON RPC response
+        """
+        with self._lock:
+            self.requests += 1
+            self.params += len(request.get("params", []))
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        response = {"id": request.get("id"), "result": []}
+        method = request.get("method")
+        for param in request.get("params", []):
+            url = param.get("url", "")
+            if method == "exec" and url == "/sys/login/user":
+                data = param.get("data", {})
+                if (data.get("user"), data.get("passwd")) != (
+                    self.username,
+                    self.password,
+                ):
+                    result = self.result(url, STATUS_LOGIN_FAIL)
+                else:
+                    session = secrets.token_urlsafe(24)
+                    with self._lock:
+                        self.sessions.add(session)
+                    response["session"] = session
+                    result = self.result(url)
+            elif request.get("session") not in self.sessions:
+                result = self.result(url, STATUS_NO_PERMISSION)
+            elif method == "exec" and url == "/sys/logout":
+                with self._lock:
+                    self.sessions.discard(request["session"])
+                result = self.result(url)
+            elif method == "get":
+                result = self.get(param)
+            else:
+                result = self.result(url, STATUS_INVALID_URL)
+            response["result"].append(result)
+
+        return response
+
+    def get(self, param):
+        """
+        Answer a "get" param block.
+
+        Args:
+            param (dict): the param block
+
+        Returns:
+            (dict): the result
+        """
+        url = param["url"]
+        with self._lock:
+            data = self.lookup(url)
+            checksum = self.checksum(url)
+        if data is None:
+            return self.result(url, STATUS_OBJECT_NOT_FOUND)
+
+        if param.get("option") == "devinfo":
+            return self.result(url, data={"uuid": checksum})
+
+        fields = param.get("fields")
+        if isinstance(data, dict):
+            if fields:
+                data = {key: data[key] for key in fields if key in data}
+            return self.result(url, data=data)
+
+        if param.get("filter"):
+            data = [entry for entry in data if match_filter(entry, param["filter"])]
+        if param.get("range"):
+            offset, limit = param["range"]
+            data = data[offset : offset + limit]
+        if fields:
+            data = [
+                {key: entry[key] for key in fields if key in entry} for entry in data
+            ]
+
+        return self.result(url, data=data)
+
+    @staticmethod
+    def result(url, code=STATUS_OK, data=None):
+        """
+        Build a JSON RPC result.
+
+        Args:
+            url (str): the url
+            code (int, optional): the status code. Defaults to STATUS_OK.
+            data (optional): the result data
+
+        Returns:
+            (dict): the result
+        """
+        result = {
+            "status": {"code": code, "message": STATUS_MESSAGES[code]},
+            "url": url,
+        }
+        if data is not None:
+            result["data"] = data
+
+        return result
+
+
+class MockFMGRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end of a MockFMG."""
+
+    mock = None
+    protocol_version = "HTTP/1.1"
+    # The headers and the body are sent separately; with Nagle's algorithm,
+    # the body would wait for the client delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length))
+        except ValueError:
+            self.send_error(400)
+            return
+
+        body = json.dumps(self.mock.handle(request)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock FortiManager JSON RPC server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--adoms", type=int, default=1)
+    parser.add_argument("--addresses", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--policies", type=int, default=1000)
+    args = parser.parse_args()
+
+    tables = generate_tables(args.adoms, args.addresses, args.groups, args.policies)
+    mock = MockFMG(tables, args.latency)
+    mock.start(args.port)
+    print(
+        f"Mock FortiManager listening on {mock.base_url} "
+        f"(user: {mock.username}, password: {mock.password})"
+    )
+
+    try:
+        mock._thread.join()
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
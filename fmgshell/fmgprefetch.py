@@ -0,0 +1,190 @@
+# coding: utf-8
+"""Background prefetching of FMG FS directories."""
+
+import concurrent.futures
+import threading
+
+from fmgfs import WILDCARD
+
+# Default number of directories fetched in parallel
+PREFETCH_WORKERS = 4
+
+# Default max number of bytes fetched for a working directory
+PREFETCH_BUDGET = 16 * 1024 * 1024
+
+
+class Prefetcher:
+    """Warm the FMG cache for the directories likely to be entered next.
+
+    Once the working directory changes, its live children, then the ones of
+    its sub-directories, are fetched by a pool of threads. Moving to another
+    directory cancels what was not fetched yet.
+    """
+
+    def __init__(self, fmg, workers=PREFETCH_WORKERS, budget=PREFETCH_BUDGET):
+        """
+        Args:
+            fmg (FMG): the FMG whose cache is warmed
+            workers (int): number of directories fetched in parallel
+            budget (int): max number of bytes fetched for a working directory
+        """
+        self.fmg = fmg
+        self.workers = workers
+        self.budget = budget
+        self.enabled = True
+
+        self._executor = None
+        self._futures = []
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def configure(self, workers=None, budget=None):
+        """
+        Change the prefetching settings.
+
+        Args:
+            workers (int, optional): number of directories fetched in parallel
+            budget (int, optional): max number of bytes fetched for a working
+            directory
+        """
+        self.cancel()
+        if budget is not None:
+            self.budget = budget
+        if workers is not None and workers != self.workers:
+            self.workers = workers
+            self.shutdown()
+
+    def prefetch(self, node):
+        """
+        Start prefetching the children of node, cancelling any prefetching
+        in progress.
+
+        Args:
+            node (Node): the new working directory
+        """
+        generation = self.cancel()
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="fmgprefetch"
+                )
+        start_bytes = self.fmg.cache.added_bytes
+        self._submit(self._prefetch, node, generation, start_bytes)
+
+    def _submit(self, func, node, generation, start_bytes):
+        """
+        Schedule func(node, generation, start_bytes) unless generation was
+        cancelled.
+
+        Args:
+            func (callable): the function to run
+            node (Node): the node to fetch
+            generation (int): the prefetching generation
+            start_bytes (int): the cache added bytes when it started
+        """
+        with self._lock:
+            if generation != self._generation or self._executor is None:
+                return
+            future = self._executor.submit(func, node, generation, start_bytes)
+            self._futures.append(future)
+
+    def _is_current(self, generation, start_bytes):
+        """
+        Check whether prefetching for generation should go on.
+
+        Args:
+            generation (int): the prefetching generation
+            start_bytes (int): the cache added bytes when it started
+
+        Returns:
+            (bool)
+        """
+        if generation != self._generation:
+            return False
+
+        return self.fmg.cache.added_bytes - start_bytes < self.budget
+
+    def _prefetch(self, node, generation, start_bytes):
+        """
+        Fetch the children of node, then schedule its sub-directories.
+
+        Args:
+            node (Node): the working directory
+            generation (int): the prefetching generation
+            start_bytes (int): the cache added bytes when it started
+        """
+        if not self._is_current(generation, start_bytes):
+            return
+
+        with self.fmg.api.in_background():
+            children = node.get_children_by_name()
+
+        # Table entries without sub-directories can't be entered
+        template = node.get_template()
+        wildcard = template.children.get(WILDCARD)
+        if (
+            wildcard is not None
+            and not wildcard.children
+            and len(template.children) == 1
+        ):
+            return
+
+        for name in children:
+            if not self._is_current(generation, start_bytes):
+                return
+            with self.fmg.api.in_background():
+                child = node.get_child(name)
+            if child is not None and child.is_table():
+                self._submit(self._populate, child, generation, start_bytes)
+
+    def _populate(self, node, generation, start_bytes):
+        """
+        Fetch the children of node.
+
+        Args:
+            node (Node): a sub-directory of the working directory
+            generation (int): the prefetching generation
+            start_bytes (int): the cache added bytes when it started
+        """
+        if self._is_current(generation, start_bytes):
+            with self.fmg.api.in_background():
+                node.get_children_by_name()
+
+    def cancel(self):
+        """
+        Cancel the prefetching in progress.
+
+        Returns:
+            (int): the new prefetching generation
+        """
+        with self._lock:
+            self._generation += 1
+            for future in self._futures:
+                future.cancel()
+            self._futures = []
+
+            return self._generation
+
+    def shutdown(self):
+        """Cancel the prefetching in progress and stop the threads."""
+        self.cancel()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def stats(self):
+        """
+        Get the prefetching settings.
+
+        Returns:
+            (dict): the settings
+        """
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "budget": self.budget,
+        }
@@ -2,19 +2,43 @@
 """fmgshell: a shell to operate FortiManager."""
 
 import argparse
+import concurrent.futures
 import getpass
+import logging
+import os
+import threading
+import time
 
 import cmd2
 
-from fmg import FMG
+from exceptions import LoginFailed, WrongResponseStatus
+from fmg import EXPORT_WORKERS, FMG, PAGE_SIZE
 from fmgfs import *
+from fmgindex import SEARCH_LIMIT, SearchIndex
 from fmgjsonrpcapi import FMGJSONRPCAPI
+from fmglookup import LOOKUP_ADOM, LOOKUP_PACKAGE, Lookups
+from fmglog import DEBUG_FILE, disable_debug_log, enable_debug_log, logger
+from fmgmirror import MANIFEST_FILE, MIRROR_DIR, MIRROR_WORKERS, Mirror
+from fmgprefetch import Prefetcher
 from fmgshell_helpers import *
 
 FMGSHELL_HISTORY_FILE = ".fmgshell_history"
 FMGFS_ROOT_DIR = "root"
 CMD2_CATEGORY = "fmgshell commands"
 
+# How long fmgshell trusts a table checksum before checking it again (in
+# seconds); it avoids a request per completion or listing of the same table
+FMGSHELL_CACHE_VALIDITY = 10
+
+# Default file written by the export command
+EXPORT_FILE = "fmgshell-export.ndjson.gz"
+
+# How often the export command reports its progress (in seconds)
+EXPORT_PROGRESS_INTERVAL = 1.0
+
+# How often the task watch command reports the progress (in seconds)
+TASK_WATCH_REPORT_INTERVAL = 5.0
+
 
 class FMGShell(cmd2.Cmd):
     """Sub-class of the cmd2.Cmd."""
@@ -32,7 +56,7 @@ class FMGShell(cmd2.Cmd):
         self.logged_in = False
 
         # We use the FMG class for any FMG API (and caching?) operations
-        self.fmg = FMG()
+        self.fmg = FMG(cache_validity=FMGSHELL_CACHE_VALIDITY)
 
         # We use the FMGFS class for creating a kind of FMG file system
         self.fmg_fs = FMGFS("root")
@@ -40,9 +64,19 @@ class FMGShell(cmd2.Cmd):
         # The current working directory in the FMG file system
         self.working_directory = self.fmg_fs
 
-        # Debug file
-        self.debug_file = "fmgshell.debug"
-        self.debug_fh = open(self.debug_file, "a")
+        # Fetch the working directory children in background
+        self.prefetcher = Prefetcher(self.fmg)
+
+        # Debug log file, written once debug is on
+        self.debug_file = DEBUG_FILE
+
+        # Local search index, fed by the whole tables put in the cache, the
+        # mirror and the export files
+        self.search_index = SearchIndex()
+        self.search_index.attach(self.fmg.cache)
+
+        # Compiled address and policy lookups
+        self.lookups = Lookups(self.fmg)
 
     # Login to FMG
     login_parser = argparse.ArgumentParser()
@@ -57,6 +91,43 @@ class FMGShell(cmd2.Cmd):
     )
 
     login_parser.add_argument("--port", required=False, help="FortiManager TCP port")
+    login_parser.add_argument(
+        "--proto",
+        choices=["https", "http"],
+        default="https",
+        help="Protocol (default is https)",
+    )
+    login_parser.add_argument(
+        "--persistent-cache",
+        action="store_true",
+        help="Keep cached responses on disk across sessions",
+    )
+    login_parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Use HTTP/2 when available (requires httpx[http2])",
+    )
+    login_parser.add_argument(
+        "--record",
+        metavar="FILE",
+        help="Record the session in a cassette (gzip compressed if FILE ends "
+        "with .gz)",
+    )
+    login_parser.add_argument(
+        "--replay",
+        metavar="FILE",
+        help="Replay a recorded session instead of connecting to FortiManager",
+    )
+    login_parser.add_argument(
+        "--new-session",
+        action="store_true",
+        help="Log in even if the session saved by a previous login is still valid",
+    )
+    login_parser.add_argument(
+        "--replay-latency",
+        action="store_true",
+        help="Replay the recorded session with its original latencies",
+    )
 
     @cmd2.with_argparser(login_parser)
     def do_login(self, args):
@@ -69,14 +140,61 @@ class FMGShell(cmd2.Cmd):
         fmg_username = args.username
         fmg_password = args.password
         fmg_port = args.port
-        if fmg_password == None:
-            fmg_password = getpass.getpass()
         if fmg_port == None:
             fmg_port = 443
 
-        self.fmg.login(fmg_ip, fmg_username, fmg_password, fmg_port)
+        if args.http2 and not self.fmg.api.enable_http2():
+            self.perror("HTTP/2 not available (requires httpx[http2]), using HTTP/1.1")
+
+        if args.replay:
+            self.fmg.api.replay(args.replay, args.replay_latency)
+        elif args.record:
+            self.fmg.api.record(args.record)
+
+        # A cassette holds the login of its own session
+        persist_session = not (args.new_session or args.replay or args.record)
+
+        try:
+            if (
+                fmg_password == None
+                and persist_session
+                and self.fmg.api.resume_session(
+                    fmg_ip, fmg_username, fmg_port, args.proto
+                )
+            ):
+                self.poutput(
+                    "Reusing the saved session; the password will be asked "
+                    "when it expires."
+                )
+                self.fmg.api.password_prompt = getpass.getpass
+            else:
+                if fmg_password == None and not args.replay:
+                    fmg_password = getpass.getpass()
+                self.fmg.login(
+                    fmg_ip,
+                    fmg_username,
+                    fmg_password,
+                    fmg_port,
+                    args.proto,
+                    persist_session=persist_session,
+                )
+        except LoginFailed as error:
+            self.perror(f"Error: {error}")
+            self.fmg.api.stop_transport()
+            return
+
+        if args.persistent_cache:
+            self.fmg.enable_persistent_cache(fmg_ip, fmg_port, fmg_username)
+
         self.logged_in = True
 
+        # The FMG FS can now be populated with the actual ADOMs, objects, etc.
+        self.fmg_fs.fmg = self.fmg
+
+        if args.persistent_cache:
+            # Drop what changed since the last session, in one request
+            self.fmg.revalidate_cache()
+
     cmd2.categorize(do_login, CMD2_CATEGORY)
 
     # Logout from FMG
@@ -85,6 +203,8 @@ class FMGShell(cmd2.Cmd):
         if self.logged_in:
             self.fmg.logout()
             self.logged_in = False
+            self.prefetcher.shutdown()
+            self.fmg_fs.fmg = None
         else:
             self.poutput("Not logged in.")
 
@@ -101,14 +221,95 @@ class FMGShell(cmd2.Cmd):
         """Turn on/off debug mode."""
         if args.mode == "on":
             self.fmg.debug("on")
+            enable_debug_log(self.debug_file)
         if args.mode == "off":
             self.fmg.debug("off")
+            disable_debug_log()
         if args.mode == "show":
             mode = self.fmg.debug()
             self.poutput(f"Debug is {mode}.")
 
     cmd2.categorize(do_debug, CMD2_CATEGORY)
 
+    # Show or clear the response cache
+    cache_parser = argparse.ArgumentParser(prog="cache")
+    cache_parser.add_argument(
+        "action", choices=["stats", "clear"], help="Show stats or clear the cache"
+    )
+
+    @cmd2.with_argparser(cache_parser)
+    def do_cache(self, args):
+        """Show or clear the response cache."""
+        if args.action == "stats":
+            stats = self.fmg.cache_stats()
+            self.poutput(fmgshell_print_stats(stats))
+        if args.action == "clear":
+            self.fmg.cache.clear()
+
+    cmd2.categorize(do_cache, CMD2_CATEGORY)
+
+    # Show the JSON RPC calls statistics
+    stats_parser = argparse.ArgumentParser(prog="stats")
+    stats_parser.add_argument(
+        "action",
+        nargs="?",
+        default="show",
+        choices=["show", "reset", "export"],
+        help="Show, reset or export the statistics",
+    )
+    stats_parser.add_argument("file", nargs="?", help="Export file (JSON format)")
+    stats_parser.add_argument(
+        "--top", type=int, default=20, help="Number of urls shown (slowest first)"
+    )
+
+    @cmd2.with_argparser(stats_parser)
+    def do_stats(self, args):
+        """Show statistics on the FortiManager JSON RPC calls."""
+        if args.action == "show":
+            summary = self.fmg.api.stats.summary()
+            self.poutput(fmgshell_print_call_stats(summary[: args.top]))
+        if args.action == "reset":
+            self.fmg.api.stats.reset()
+        if args.action == "export":
+            if not args.file:
+                self.poutput("An export file is required.")
+                return
+            try:
+                self.fmg.api.stats.export(args.file)
+            except OSError as error:
+                self.perror(f"Error: {error}")
+
+    cmd2.categorize(do_stats, CMD2_CATEGORY)
+
+    # Configure the background prefetching
+    prefetch_parser = argparse.ArgumentParser(prog="prefetch")
+    prefetch_parser.add_argument(
+        "mode",
+        nargs="?",
+        default="show",
+        choices=["on", "off", "show"],
+        help="Turn on/off background prefetching",
+    )
+    prefetch_parser.add_argument(
+        "--workers", type=int, help="Number of directories fetched in parallel"
+    )
+    prefetch_parser.add_argument(
+        "--budget", type=int, help="Max number of bytes fetched per directory"
+    )
+
+    @cmd2.with_argparser(prefetch_parser)
+    def do_prefetch(self, args):
+        """Configure the background prefetching of the working directory."""
+        self.prefetcher.configure(workers=args.workers, budget=args.budget)
+        if args.mode == "on":
+            self.prefetcher.enabled = True
+        if args.mode == "off":
+            self.prefetcher.enabled = False
+        if args.mode == "show":
+            self.poutput(fmgshell_print_stats(self.prefetcher.stats()))
+
+    cmd2.categorize(do_prefetch, CMD2_CATEGORY)
+
     # "get" command
     get_parser = argparse.ArgumentParser(prog="get")
     # "get system" command
@@ -141,29 +342,434 @@ class FMGShell(cmd2.Cmd):
 
     cmd2.categorize(do_pwd, CMD2_CATEGORY)
 
+    def get_node(self, path):
+        """
+        Get the FMG FS node for an absolute or relative path.
+
+        Args:
+            path (str): the path to the node; the working directory when
+                        empty
+
+        Raises:
+            FMGFS_WrongPath: path doesn't exist
+
+        Returns:
+            Node: the node
+        """
+        if len(path) == 0:
+            return self.working_directory
+        if path == "/":
+            return self.fmg_fs
+        if path[0] == "/":
+            return self.fmg_fs.get_node_by_path(path)
+
+        return self.working_directory.get_node_by_path(path)
+
     # Change working directory
     def do_cd(self, args):
         """Change working directory."""
         if self.logged_in:
-            dest_dir = str(args)
-            if len(dest_dir) == 0 or dest_dir == "/":
-
-                self.working_directory = self.fmg_fs
+            # Like in a shell, "cd" alone goes back to the root
+            dest_dir = str(args) or "/"
+            try:
+                node = self.get_node(dest_dir)
+            except FMGFS_WrongPath:
+                print("Wrong path.")
             else:
-                try:
-                    if dest_dir[0] == "/":
-                        node = self.fmg_fs.get_node_by_path(dest_dir)
-                    else:
-                        node = self.working_directory.get_node_by_path(dest_dir)
-                except FMGFS_WrongPath:
-                    print("Wrong path.")
-                else:
-                    self.working_directory = node
+                self.working_directory = node
+                self.prefetcher.prefetch(node)
         else:
             self.poutput("You need to login first.")
 
     cmd2.categorize(do_cd, CMD2_CATEGORY)
 
+    # List directory content or table entries
+    ls_parser = argparse.ArgumentParser(prog="ls")
+    ls_parser.add_argument(
+        "path",
+        nargs="?",
+        default="",
+        help="Directory or table (default is the working directory)",
+    )
+    ls_parser.add_argument(
+        "--page-size",
+        type=int,
+        default=PAGE_SIZE,
+        help="Number of table entries fetched per request",
+    )
+
+    @cmd2.with_argparser(ls_parser)
+    def do_ls(self, args):
+        """List directory content or table entries."""
+        if not self.logged_in:
+            self.poutput("You need to login first.")
+            return
+
+        try:
+            node = self.get_node(args.path)
+        except FMGFS_WrongPath:
+            pass
+        else:
+            for name in node.get_children_by_name():
+                self.poutput(name)
+            return
+
+        # Not a FMG FS directory; we try it as a FortiManager table
+        url = fmgshell_get_absolute_path(self, args.path)
+        if "*" in url:
+            self.poutput("Wrong path.")
+            return
+
+        try:
+            for entry in self.fmg.iter_table(url, page_size=args.page_size):
+                self.poutput(fmgshell_get_entry_name(entry))
+        except WrongResponseStatus as error:
+            self.poutput(f"Error: {error}")
+
+    cmd2.categorize(do_ls, CMD2_CATEGORY)
+
+    # Export the tables below a path
+    export_parser = argparse.ArgumentParser(prog="export")
+    export_parser.add_argument(
+        "path",
+        nargs="?",
+        default="",
+        help="Directory or table (default is the working directory)",
+    )
+    export_parser.add_argument(
+        "-o",
+        "--output",
+        default=EXPORT_FILE,
+        help="NDJSON file, gzip compressed if it ends with .gz "
+        f"(default is {EXPORT_FILE})",
+    )
+    export_parser.add_argument(
+        "--workers",
+        type=int,
+        default=EXPORT_WORKERS,
+        help="Number of tables fetched in parallel",
+    )
+    export_parser.add_argument(
+        "--page-size",
+        type=int,
+        default=PAGE_SIZE,
+        help="Number of table entries fetched per request",
+    )
+
+    @cmd2.with_argparser(export_parser)
+    def do_export(self, args):
+        """Export the tables below a path to a NDJSON file."""
+        if not self.logged_in:
+            self.poutput("You need to login first.")
+            return
+
+        try:
+            node = self.get_node(args.path)
+        except FMGFS_WrongPath:
+            self.poutput("Wrong path.")
+            return
+
+        last_report = 0
+        lock = threading.Lock()
+
+        def progress(stats):
+            nonlocal last_report
+            with lock:
+                if stats["elapsed"] - last_report < EXPORT_PROGRESS_INTERVAL:
+                    return
+                last_report = stats["elapsed"]
+                self.poutput(fmgshell_print_export_progress(stats))
+
+        stats = self.fmg.export(
+            node,
+            args.output,
+            workers=args.workers,
+            page_size=args.page_size,
+            progress=progress,
+        )
+
+        self.poutput(fmgshell_print_export_progress(stats))
+        for url, message in stats["errors"]:
+            self.perror(f"Error: {message}")
+        self.poutput(f"Exported {node.get_full_path()} to {args.output}")
+
+    cmd2.categorize(do_export, CMD2_CATEGORY)
+
+    # Mirror the tables below paths
+    sync_parser = argparse.ArgumentParser(prog="sync")
+    sync_parser.add_argument(
+        "paths",
+        nargs="*",
+        help="Directories or tables (default is the working directory)",
+    )
+    sync_parser.add_argument(
+        "-d",
+        "--directory",
+        default=MIRROR_DIR,
+        help=f"Mirror directory (default is {MIRROR_DIR})",
+    )
+    sync_parser.add_argument(
+        "--workers",
+        type=int,
+        default=MIRROR_WORKERS,
+        help="Number of tables fetched in parallel",
+    )
+    sync_parser.add_argument(
+        "--page-size",
+        type=int,
+        default=PAGE_SIZE,
+        help="Number of table entries fetched per request",
+    )
+
+    @cmd2.with_argparser(sync_parser)
+    def do_sync(self, args):
+        """Update the local mirror of the tables below paths; only the
+        tables whose checksum changed are fetched."""
+        if not self.logged_in:
+            self.poutput("You need to login first.")
+            return
+
+        nodes = []
+        for path in args.paths or [""]:
+            try:
+                nodes.append(self.get_node(path))
+            except FMGFS_WrongPath:
+                self.poutput(f"Wrong path: {path}")
+                return
+
+        mirror = Mirror(self.fmg, args.directory)
+        summary = mirror.sync(nodes, workers=args.workers, page_size=args.page_size)
+        self.search_index.update_from_mirror(mirror)
+
+        errors = summary.pop("errors")
+        self.poutput(fmgshell_print_stats(summary))
+        for url, message in errors:
+            self.perror(f"Error: {message}")
+
+    cmd2.categorize(do_sync, CMD2_CATEGORY)
+
+    # Search the local index
+    find_parser = argparse.ArgumentParser(prog="find")
+    find_parser.add_argument(
+        "terms",
+        nargs="+",
+        help="Names, comments, IP addresses, etc.; a term ending with * is a "
+        "prefix. Entries matching all the terms are listed.",
+    )
+    find_parser.add_argument(
+        "-d",
+        "--directory",
+        default=MIRROR_DIR,
+        help=f"Mirror directory (default is {MIRROR_DIR})",
+    )
+    find_parser.add_argument(
+        "-e",
+        "--export",
+        action="append",
+        default=[],
+        help="Also search an export file (can be repeated)",
+    )
+    find_parser.add_argument(
+        "-p", "--path", help="Only search the tables below this path"
+    )
+    find_parser.add_argument(
+        "--limit",
+        type=int,
+        default=SEARCH_LIMIT,
+        help=f"Max number of entries listed (default is {SEARCH_LIMIT}, 0 for all)",
+    )
+
+    @cmd2.with_argparser(find_parser)
+    def do_find(self, args):
+        """Find the table entries mentioning names, comments or IP
+        addresses, in the mirror, the export files and the cached tables;
+        FortiManager isn't queried."""
+        if os.path.exists(os.path.join(args.directory, MANIFEST_FILE)):
+            self.search_index.update_from_mirror(Mirror(self.fmg, args.directory))
+        for file in args.export:
+            try:
+                self.search_index.update_from_export(file, self.fmg.api.codec)
+            except OSError as error:
+                self.perror(f"Error: {error}")
+                return
+
+        # Resolved without FMG FS, which would query FortiManager
+        path = args.path
+        if path and not path.startswith("/"):
+            path = f"{self.working_directory.get_full_path().rstrip('/')}/{path}"
+
+        start = time.perf_counter()
+        results = self.search_index.search(
+            " ".join(args.terms), url_prefix=path, limit=args.limit
+        )
+        elapsed = time.perf_counter() - start
+
+        for url, key in results:
+            self.poutput(f"{url}/{key}")
+        stats = self.search_index.stats()
+        self.poutput(
+            f"{len(results)} entries found in {elapsed * 1000:.1f} ms "
+            f"({stats['entries']} entries of {stats['tables']} tables indexed)"
+        )
+
+    cmd2.categorize(do_find, CMD2_CATEGORY)
+
+    # Look up the objects containing an IP address, or the policy matching a
+    # 5-tuple
+    lookup_parser = argparse.ArgumentParser(prog="lookup")
+    lookup_subparser = lookup_parser.add_subparsers(dest="lookup", required=True)
+    # "lookup ip" command
+    lookup_ip = lookup_subparser.add_parser(
+        "ip", help="Addresses and address groups containing an IP address"
+    )
+    lookup_ip.add_argument("ip", help="IP address")
+    lookup_ip.add_argument(
+        "-a", "--adom", default=LOOKUP_ADOM, help=f"ADOM (default is {LOOKUP_ADOM})"
+    )
+    # "lookup policy" command
+    lookup_policy = lookup_subparser.add_parser(
+        "policy", help="First policy of a package matching a 5-tuple"
+    )
+    lookup_policy.add_argument("src", help="Source IP address")
+    lookup_policy.add_argument("dst", help="Destination IP address")
+    lookup_policy.add_argument("protocol", help="tcp, udp, sctp, icmp or a number")
+    lookup_policy.add_argument("dst_port", type=int, nargs="?", help="Destination port")
+    lookup_policy.add_argument(
+        "-a", "--adom", default=LOOKUP_ADOM, help=f"ADOM (default is {LOOKUP_ADOM})"
+    )
+    lookup_policy.add_argument(
+        "-P",
+        "--package",
+        default=LOOKUP_PACKAGE,
+        help=f"Policy package (default is {LOOKUP_PACKAGE})",
+    )
+    lookup_policy.add_argument("--src-port", type=int, help="Source port")
+    lookup_policy.add_argument("--srcintf", help="Incoming interface")
+    lookup_policy.add_argument("--dstintf", help="Outgoing interface")
+    lookup_policy.add_argument(
+        "--all", action="store_true", help="List all the matching policies"
+    )
+
+    @cmd2.with_argparser(lookup_parser)
+    def do_lookup(self, args):
+        """Look up the objects containing an IP address, or the policy
+        matching a 5-tuple."""
+        if not self.logged_in:
+            self.poutput("You need to login first.")
+            return
+
+        try:
+            if args.lookup == "ip":
+                addresses, groups = self.lookups.get_address_lookup(args.adom).lookup(
+                    args.ip
+                )
+                self.poutput(fmgshell_print_lookup_ip(addresses, groups))
+                return
+
+            lookup = self.lookups.get_policy_lookup(args.adom, args.package)
+            match = lookup.all_matches if args.all else lookup.first_match
+            policies = match(
+                args.src,
+                args.dst,
+                args.protocol,
+                args.dst_port,
+                src_port=args.src_port,
+                srcintf=args.srcintf,
+                dstintf=args.dstintf,
+            )
+        except (ValueError, WrongResponseStatus) as error:
+            self.perror(f"Error: {error}")
+            return
+
+        if not args.all:
+            policies = [policies] if policies else []
+        if not policies:
+            self.poutput("No matching policy (implicit deny).")
+        for policy in policies:
+            self.poutput(fmgshell_print_policy(policy))
+
+    cmd2.categorize(do_lookup, CMD2_CATEGORY)
+
+    # Watch FortiManager tasks
+    task_parser = argparse.ArgumentParser(prog="task")
+    task_subparser = task_parser.add_subparsers(dest="task", required=True)
+    # "task watch" command
+    task_watch = task_subparser.add_parser(
+        "watch", help="Watch tasks until they finish (Ctrl-C to stop waiting)"
+    )
+    task_watch.add_argument("task_ids", type=int, nargs="+", help="Task ids")
+    task_watch.add_argument(
+        "--background",
+        action="store_true",
+        help="Don't wait, only report the tasks once they finish",
+    )
+    # "task list" command
+    task_subparser.add_parser("list", help="List the tasks being watched")
+
+    @cmd2.with_argparser(task_parser)
+    def do_task(self, args):
+        """Watch FortiManager tasks."""
+        if not self.logged_in:
+            self.poutput("You need to login first.")
+            return
+
+        monitor = self.fmg.tasks
+        if args.task == "list":
+            for task in monitor.get_tasks():
+                self.poutput(fmgshell_print_task(task.task_id, task.data))
+            self.poutput(
+                f"{len(monitor.tasks)} tasks watched, {monitor.polls} polls in "
+                f"{monitor.requests} requests"
+            )
+            return
+
+        def report(future, task_id):
+            try:
+                self.poutput(fmgshell_print_task(task_id, future.result()))
+            except concurrent.futures.CancelledError:
+                pass
+            except WrongResponseStatus as error:
+                self.perror(f"Error: {error}")
+
+        futures = {}
+        for task_id in args.task_ids:
+            future = monitor.watch(task_id)
+            futures[future] = task_id
+            if args.background:
+                future.add_done_callback(
+                    lambda future, task_id=task_id: report(future, task_id)
+                )
+        if args.background:
+            return
+
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending,
+                    timeout=TASK_WATCH_REPORT_INTERVAL,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in sorted(done, key=futures.get):
+                    report(future, futures[future])
+                if pending and not done:
+                    percents = [
+                        (task.data or {}).get("percent", 0)
+                        for task in monitor.get_tasks()
+                        if task.future in pending
+                    ]
+                    self.poutput(
+                        f"{len(futures) - len(pending)}/{len(futures)} tasks "
+                        f"finished, {sum(percents) / max(len(percents), 1):.0f}% "
+                        "average progress of the others"
+                    )
+        except KeyboardInterrupt:
+            self.poutput(
+                f"{len(pending)} tasks still watched in background, see task list"
+            )
+
+    cmd2.categorize(do_task, CMD2_CATEGORY)
+
     def complete_cd(self, text, line, begidx, endidx):
 
         if self.logged_in:
@@ -200,15 +806,16 @@ class FMGShell(cmd2.Cmd):
         if len(results) == 1:
             self.allow_appended_space = False
 
-        if True:
-            print(file=self.debug_fh, flush=True)
-            print(f"Result: {results}", file=self.debug_fh, flush=True)
-            print(f"Text: {text}", file=self.debug_fh, flush=True)
-            print(f"Full path text: {text}", file=self.debug_fh, flush=True)
-            print(f"Type(Text)): {type(text)}", file=self.debug_fh, flush=True)
-            print(f"Line: {line}", file=self.debug_fh, flush=True)
-            print(f"Begidx: {begidx}", file=self.debug_fh, flush=True)
-            print(f"Endidx: {endidx}\n", file=self.debug_fh, flush=True)
-            print(file=self.debug_fh, flush=True)
-
-        return results
\ No newline at end of file
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "complete_cd: results: %s, text: %r, full path text: %r, "
+                "line: %r, begidx: %d, endidx: %d",
+                results,
+                text,
+                full_path_text,
+                line,
+                begidx,
+                endidx,
+            )
+
+        return results
@@ -1,10 +1,18 @@
 # coding=utf-8
 """Helpers for fmgshell operations."""
 
-import os.path
-
 import json
-from fmgfs import FMGFS
+import logging
+
+from fmgfs import FMGFS, FMGFS_WrongPath
+from fmglog import logger
+from fmgtask import get_task_state
+
+# Max number of paths offered by the completion
+MAX_COMPLETION_MATCHES = 1000
+
+# Attributes used to name a table entry, by order of preference
+ENTRY_NAME_KEYS = ["name", "policyid", "seq", "id", "oid"]
 
 
 def fmgshell_print_get_system_status(response):
@@ -34,6 +42,194 @@ def fmgshell_print_get_system_status(response):
     return content
 
 
+def fmgshell_print_stats(stats):
+    """
+    Print statistics.
+
+    Args:
+        stats (dict): The statistics
+
+    Returns:
+        contant (str): the formatted output
+    """
+    key_len = max(len(str(key)) for key in stats) + 1
+
+    content = ""
+    for key, value in stats.items():
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        content = content + f"{key:<{key_len}}: {value}" + "\n"
+
+    return content
+
+
+def fmgshell_print_lookup_ip(addresses, groups):
+    """
+    Print the objects containing an IP address.
+
+    Args:
+        addresses (list): The address names
+        groups (list): The address group names
+
+    Returns:
+        contant (str): the formatted output
+    """
+    return (
+        f"addresses : {', '.join(addresses) or '-'}\n"
+        f"groups    : {', '.join(groups) or '-'}"
+    )
+
+
+def fmgshell_print_policy(policy):
+    """
+    Print a firewall policy.
+
+    Args:
+        policy (dict): The policy
+
+    Returns:
+        contant (str): the formatted output
+    """
+    fields = ["policyid", "name", "srcintf", "dstintf", "srcaddr", "dstaddr"]
+    fields += ["service", "action"]
+
+    content = ""
+    for field in fields:
+        value = policy.get(field)
+        if isinstance(value, list):
+            value = ", ".join(str(item) for item in value)
+        content = content + f"{field:<9}: {value}" + "\n"
+
+    return content
+
+
+def fmgshell_print_task(task_id, task):
+    """
+    Print a FortiManager task.
+
+    Args:
+        task_id (int): The task id
+        task (dict): The /task/task/<id> data, or None when not polled yet
+
+    Returns:
+        contant (str): the formatted output
+    """
+    if task is None:
+        return f"task {task_id}: not polled yet"
+
+    return (
+        f"task {task_id}: {get_task_state(task)} {task.get('percent', 0)}% "
+        f"{task.get('title', '')} ({task.get('num_done', 0)} done, "
+        f"{task.get('num_err', 0)} errors)"
+    )
+
+
+def fmgshell_print_export_progress(stats):
+    """
+    Print the progress of an export.
+
+    Args:
+        stats (dict): The FMG.export statistics
+
+    Returns:
+        contant (str): the formatted output
+    """
+    elapsed = stats["elapsed"]
+    mbytes = stats["bytes"] / 1024 / 1024
+    throughput = mbytes / elapsed if elapsed else 0.0
+    entry_rate = stats["entries"] / elapsed if elapsed else 0.0
+
+    return (
+        f"{stats['tables']} tables ({stats['pending']} pending), "
+        f"{stats['entries']} entries, {mbytes:.1f} MB in {elapsed:.1f} s "
+        f"({throughput:.1f} MB/s, {entry_rate:.0f} entries/s)"
+    )
+
+
+def fmgshell_print_call_stats(summary):
+    """
+    Print the JSON RPC calls statistics.
+
+    Args:
+        summary (list): The CallStats summary
+
+    Returns:
+        contant (str): the formatted output
+    """
+
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.1f}"
+
+    columns = [
+        ("calls", lambda s: str(s["calls"])),
+        ("p50 ms", lambda s: ms(s["wall_p50"])),
+        ("p90 ms", lambda s: ms(s["wall_p90"])),
+        ("p99 ms", lambda s: ms(s["wall_p99"])),
+        ("ttfb ms", lambda s: ms(s["ttfb_p50"])),
+        ("decode ms", lambda s: ms(s["decode_total"])),
+        ("req KB", lambda s: f"{s['request_bytes'] / 1024:.1f}"),
+        ("res KB", lambda s: f"{s['response_bytes'] / 1024:.1f}"),
+        ("hit/miss", lambda s: f"{s['cache_hits']}/{s['cache_misses']}"),
+    ]
+
+    rows = [[f"{s['method']} {s['url']}"] + [f(s) for _, f in columns] for s in summary]
+    header = ["method url"] + [name for name, _ in columns]
+    widths = [
+        max(len(row[idx]) for row in rows + [header]) for idx in range(len(header))
+    ]
+
+    content = ""
+    for row in [header] + rows:
+        content = content + f"{row[0]:<{widths[0]}}"
+        for value, width in zip(row[1:], widths[1:]):
+            content = content + f"  {value:>{width}}"
+        content = content + "\n"
+
+    return content
+
+
+def fmgshell_get_absolute_path(fmgshell, path):
+    """
+    Return the absolute version of path.
+
+    Args:
+        fmgshell (FMGSHELL): a FMGSHELL instance
+        path (str): an absolute path or a path relative to the working
+        directory
+
+    Returns:
+        (str): the absolute path
+    """
+    if path.startswith("/"):
+        return path.rstrip("/") or "/"
+
+    path_prefix = fmgshell.working_directory.get_full_path()
+    if len(path) == 0:
+        return path_prefix
+    if path_prefix == "/":
+        return f"{path_prefix}{path}".rstrip("/")
+
+    return f"{path_prefix}/{path}".rstrip("/")
+
+
+def fmgshell_get_entry_name(entry):
+    """
+    Return the name of a table entry.
+
+    Args:
+        entry (dict): a table entry
+
+    Returns:
+        (str): the entry name, or the entry itself in JSON format when it has
+        no name
+    """
+    for key in ENTRY_NAME_KEYS:
+        if key in entry:
+            return str(entry[key])
+
+    return json.dumps(entry)
+
+
 def fmgshell_get_matching_paths(fmgshell, full_path_text):
     """
     Return list of FMG FS path that match with text.
@@ -44,51 +240,46 @@ def fmgshell_get_matching_paths(fmgshell, full_path_text):
         absolute path
 
     Returns:
-        (list): list of matching paths
+        (list): list of matching paths, at most MAX_COMPLETION_MATCHES
     """
-    # Get the node matching the best the full_path_text
-    node = fmgshell.fmg_fs.get_node_by_path(full_path_text, best_match=True)
+    # The text is a directory followed by the prefix of one of its children
+    dir_path, _, prefix = full_path_text.rpartition("/")
 
-    # Get the content for selected node
-    matches = node.get_children_by_name()
+    # Get the node for that directory
+    if dir_path.strip("/"):
+        try:
+            node = fmgshell.fmg_fs.get_node_by_path(dir_path)
+        except FMGFS_WrongPath:
+            node = None
+    else:
+        node = fmgshell.fmg_fs
 
-    # We replace each match element with an absolute path
-    path_prefix = node.get_full_path()
-    if path_prefix == "/":
-        matches = [f"{path_prefix}{element}/" for element in matches]
+    # Get the content for selected node, matching the prefix
+    if node:
+        matches = node.get_children_by_name(prefix, limit=MAX_COMPLETION_MATCHES)
     else:
-        matches = [f"{path_prefix}/{element}/" for element in matches]
+        matches = []
 
     # Completion should only display last part of the path
     # cmd2.Cmd.display_matches is containing what completion offers as choices
     # to the user, but completion still work on "matches".
-    fmgshell.display_matches = [
-        os.path.basename(element.rstrip("/")) for element in matches
-    ]
+    fmgshell.display_matches = matches
 
-    if True:
-        print(file=fmgshell.debug_fh, flush=True)
-        print(
-            f"fmgshell_get_matching_paths: node: {node}",
-            file=fmgshell.debug_fh,
-            flush=True,
-        )
-        print(
-            f"fmgshell_get_matching_paths: matches: {matches}",
-            file=fmgshell.debug_fh,
-            flush=True,
-        )
-        print(
-            f"fmgshell_get_matching_paths: display_matches: {fmgshell.display_matches}",
-            file=fmgshell.debug_fh,
-            flush=True,
-        )
-        print(
-            f'fmgshell_get_matching_paths: full_path_text: "{full_path_text}"',
-            file=fmgshell.debug_fh,
-            flush=True,
+    # We replace each match element with an absolute path
+    if node:
+        path_prefix = node.get_full_path()
+        if path_prefix == "/":
+            matches = [f"{path_prefix}{element}/" for element in matches]
+        else:
+            matches = [f"{path_prefix}/{element}/" for element in matches]
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "fmgshell_get_matching_paths: node: %s, full_path_text: %r, %d matches",
+            node,
+            full_path_text,
+            len(matches),
         )
-        print(file=fmgshell.debug_fh, flush=True)
 
     return matches
 
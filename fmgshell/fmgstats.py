@@ -0,0 +1,183 @@
+# coding: utf-8
+"""Statistics on FortiManager JSON RPC calls."""
+
+import collections
+import json
+import time
+
+# Default number of calls kept
+STATS_MAX_CALLS = 10000
+
+
+class CallRecord:
+    """A JSON RPC call, or a cache lookup."""
+
+    __slots__ = (
+        "timestamp",
+        "url",
+        "method",
+        "wall_time",
+        "ttfb",
+        "request_bytes",
+        "response_bytes",
+        "decode_time",
+        "cache",
+    )
+
+    def __init__(
+        self,
+        url,
+        method,
+        wall_time=None,
+        ttfb=None,
+        request_bytes=None,
+        response_bytes=None,
+        decode_time=None,
+        cache=None,
+    ):
+        """
+        Args:
+            url (str): the FMG JSON RPC API url
+            method (str): the FMG JSON RPC API method
+            wall_time (float, optional): the call duration (in seconds)
+            ttfb (float, optional): the time to first byte (in seconds)
+            request_bytes (int, optional): the request body size
+            response_bytes (int, optional): the response body size
+            decode_time (float, optional): the JSON decoding duration (in
+            seconds)
+            cache (str, optional): "hit" or "miss" for cache lookups
+        """
+        self.timestamp = time.time()
+        self.url = url
+        self.method = method
+        self.wall_time = wall_time
+        self.ttfb = ttfb
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.decode_time = decode_time
+        self.cache = cache
+
+    def to_dict(self):
+        """
+        Get the record as a dict.
+
+        Returns:
+            (dict)
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def percentile(values, pct):
+    """
+    Get a percentile, with the nearest rank method.
+
+    Args:
+        values (list): sorted values
+        pct (float): the percentile, between 0 and 100
+
+    Returns:
+        The percentile value or None when values is empty
+    """
+    if not values:
+        return None
+
+    rank = max(int(round(pct / 100 * len(values))) - 1, 0)
+
+    return values[min(rank, len(values) - 1)]
+
+
+class CallStats:
+    """Ring buffer of the last JSON RPC calls and cache lookups."""
+
+    def __init__(self, max_calls=STATS_MAX_CALLS):
+        """
+        Args:
+            max_calls (int): number of calls kept
+        """
+        self.records = collections.deque(maxlen=max_calls)
+
+    def record(self, url, method, **measures):
+        """
+        Record a call.
+
+        Args:
+            url (str): the FMG JSON RPC API url
+            method (str): the FMG JSON RPC API method
+            measures: the CallRecord measures
+        """
+        self.records.append(CallRecord(url, method, **measures))
+
+    def record_cache(self, url, hit, method="get"):
+        """
+        Record a cache lookup, in the same row as the calls it saves.
+
+        Args:
+            url (str): the FMG JSON RPC API url
+            hit (bool): whether the response was cached
+            method (str, optional): the FMG JSON RPC API method served
+        """
+        self.records.append(CallRecord(url, method, cache="hit" if hit else "miss"))
+
+    def reset(self):
+        """Drop all records."""
+        self.records.clear()
+
+    def summary(self):
+        """
+        Summarize the records per url and method.
+
+        The cache lookups are counted in "cache_hits" and "cache_misses",
+        not in "calls".
+
+        Returns:
+            (list): one dict per (url, method), the slowest first
+        """
+        groups = collections.defaultdict(list)
+        for record in list(self.records):
+            groups[(record.url, record.method)].append(record)
+
+        summary = []
+        for (url, method), records in groups.items():
+            wall_times = sorted(r.wall_time for r in records if r.wall_time is not None)
+            ttfbs = sorted(r.ttfb for r in records if r.ttfb is not None)
+            decode_times = [r.decode_time for r in records if r.decode_time is not None]
+            hits = sum(1 for r in records if r.cache == "hit")
+            misses = sum(1 for r in records if r.cache == "miss")
+            summary.append(
+                {
+                    "url": url,
+                    "method": method,
+                    "calls": sum(1 for r in records if r.cache is None),
+                    "wall_p50": percentile(wall_times, 50),
+                    "wall_p90": percentile(wall_times, 90),
+                    "wall_p99": percentile(wall_times, 99),
+                    "wall_total": sum(wall_times),
+                    "ttfb_p50": percentile(ttfbs, 50),
+                    "decode_total": sum(decode_times),
+                    "request_bytes": sum(r.request_bytes or 0 for r in records),
+                    "response_bytes": sum(r.response_bytes or 0 for r in records),
+                    "cache_hits": hits,
+                    "cache_misses": misses,
+                }
+            )
+
+        summary.sort(key=lambda s: s["wall_total"], reverse=True)
+
+        return summary
+
+    def export(self, file):
+        """
+        Export the records and their summary in JSON format.
+
+        Args:
+            file (str): the output file
+        """
+        with open(file, "w") as f:
+            json.dump(
+                {
+                    "summary": self.summary(),
+                    "calls": [record.to_dict() for record in list(self.records)],
+                },
+                f,
+                indent=4,
+            )
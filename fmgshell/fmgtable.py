@@ -0,0 +1,30 @@
+# coding: utf-8
+"""Naming of FortiManager table entries.
+
+Kept apart from fmg, so the modules which only handle table data (e.g., the
+search index) don't import the API stack.
+"""
+
+# Attribute naming the entries of a table, when it isn't "name"
+TABLE_NAME_KEYS = {
+    "policy": "policyid",
+}
+
+
+def get_entry_key(url, entry, idx):
+    """
+    Get the key identifying an entry in its table.
+
+    Args:
+        url (str): the table url
+        entry (dict): the entry
+        idx (int): the entry position in the table
+
+    Returns:
+        (str): the entry name, or its position when it has none
+    """
+    name_key = TABLE_NAME_KEYS.get(url.rsplit("/", 1)[-1], "name")
+    if isinstance(entry, dict) and name_key in entry:
+        return str(entry[name_key])
+
+    return f"#{idx}"
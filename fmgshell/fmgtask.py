@@ -0,0 +1,385 @@
+# coding: utf-8
+"""Polling of FortiManager tasks.
+
+Installs, imports and script runs return a task id; the task progress is
+then read from /task/task/<id>. TaskMonitor polls all the watched tasks from
+a single thread, with one multi-param request per tick, and each task is
+polled less often while it doesn't progress.
+"""
+
+import concurrent.futures
+import logging
+import threading
+import time
+
+import requests
+
+from exceptions import LoginFailed, WrongResponseStatus
+from fmgjsonrpcapi import STATUS_INVALID_SESSION, STATUS_NO_RESULT
+from fmglog import logger
+
+TASK_URL = "/task/task/{task_id}"
+
+# Polling interval of a task (in seconds): it starts at the min, is
+# multiplied by TASK_POLL_BACKOFF while the task doesn't progress, and
+# follows the expected end of the task while it does
+TASK_POLL_MIN_INTERVAL = 1.0
+TASK_POLL_MAX_INTERVAL = 30.0
+TASK_POLL_BACKOFF = 1.5
+
+# Max number of tasks polled per request; the task data is small, so a
+# batch of installs is polled in a single request
+TASK_POLL_CHUNK_SIZE = 500
+
+# The tasks due within this delay (in seconds) are polled along with the
+# ones which are due, so the polls of a batch stay in the same requests
+TASK_POLL_COALESCE = 0.5
+
+# Poll status codes which don't tell anything about the task (the request
+# failed, or the session is invalid and couldn't be renewed yet): the task
+# is polled again later
+TASK_POLL_RETRY_CODES = {STATUS_NO_RESULT, STATUS_INVALID_SESSION}
+
+# Max number of consecutive polls of a task failing with an invalid session;
+# the session was renewed in between, so the task can't be read (e.g., the
+# user has no permission on it, or the password is needed to log in again)
+TASK_POLL_MAX_SESSION_ERRORS = 5
+
+# Task states; FortiManager returns them as integers, or as strings with
+# "verbose"
+TASK_STATES = [
+    "pending",
+    "running",
+    "cancelling",
+    "cancelled",
+    "done",
+    "error",
+    "aborting",
+    "aborted",
+    "warning",
+    "to_continue",
+    "unknown",
+]
+TASK_FINISHED_STATES = {"cancelled", "done", "error", "aborted", "warning"}
+
+
+def get_task_state(task):
+    """
+    Get the state name of a task.
+
+    Args:
+        task (dict): the /task/task/<id> data
+
+    Returns:
+        (str): the state name
+    """
+    state = task.get("state")
+    if isinstance(state, int) and 0 <= state < len(TASK_STATES):
+        return TASK_STATES[state]
+
+    return str(state)
+
+
+def is_task_finished(task):
+    """
+    Check whether a task is finished.
+
+    Args:
+        task (dict): the /task/task/<id> data
+
+    Returns:
+        (bool)
+    """
+    return get_task_state(task) in TASK_FINISHED_STATES
+
+
+class WatchedTask:
+    """A task watched by TaskMonitor."""
+
+    def __init__(self, task_id, progress=None):
+        """
+        Args:
+            task_id (int): the task id
+            progress (callable, optional): called with the task data each
+                                           time it is polled
+        """
+        self.task_id = task_id
+        self.url = TASK_URL.format(task_id=task_id)
+        self.future = concurrent.futures.Future()
+        self.progress = progress
+        # The last polled task data
+        self.data = None
+        self.polls = 0
+        # Number of consecutive polls failing with an invalid session
+        self.session_errors = 0
+        self.interval = TASK_POLL_MIN_INTERVAL
+        self.next_poll = time.monotonic()
+        self._last_percent = None
+        self._last_time = None
+
+    def update(self, data, now):
+        """
+        Record a poll of the task, then schedule the next one.
+
+        A task which doesn't progress is polled less and less often; a task
+        which progresses is polled around its expected end.
+
+        Args:
+            data (dict): the task data
+            now (float): the poll time (time.monotonic())
+        """
+        self.data = data
+        self.polls += 1
+        self.session_errors = 0
+
+        percent = data.get("percent") or 0
+        if self._last_percent is not None and percent > self._last_percent:
+            rate = (percent - self._last_percent) / (now - self._last_time)
+            interval = (100 - percent) / rate
+        else:
+            interval = self.interval * TASK_POLL_BACKOFF
+
+        if self._last_percent is None or percent != self._last_percent:
+            self._last_percent = percent
+            self._last_time = now
+
+        self.interval = min(
+            max(interval, TASK_POLL_MIN_INTERVAL), TASK_POLL_MAX_INTERVAL
+        )
+        self.next_poll = now + self.interval
+
+    def back_off(self, now):
+        """
+        Schedule the next poll after a failed one.
+
+        Args:
+            now (float): the poll time (time.monotonic())
+        """
+        self.interval = min(self.interval * TASK_POLL_BACKOFF, TASK_POLL_MAX_INTERVAL)
+        self.next_poll = now + self.interval
+
+
+class TaskMonitor:
+    """Watch FortiManager tasks until they finish.
+
+    Usage:
+        future = fmg.tasks.watch(task_id)
+        task = future.result()
+
+    The monitor thread starts with the first watched task, and stops once
+    no task is left.
+    """
+
+    def __init__(self, api):
+        """
+        Args:
+            api (FMGJSONRPCAPI): the FortiManager JSON RPC API
+        """
+        self.api = api
+        # task id -> WatchedTask
+        self.tasks = {}
+        # Number of poll requests, of polled tasks, and of failed polls
+        self.requests = 0
+        self.polls = 0
+        self.errors = 0
+
+        self._thread = None
+        self._stopped = False
+        self._condition = threading.Condition()
+
+    def watch(self, task_id, callback=None, progress=None):
+        """
+        Watch a task until it finishes.
+
+        Args:
+            task_id (int): the task id
+            callback (callable, optional): called with the future once the
+                                           task is finished
+            progress (callable, optional): called with the task data each
+                                           time it is polled
+
+        Returns:
+            (concurrent.futures.Future): its result is the last task data;
+                it fails with WrongResponseStatus when the task can't be
+                read (e.g., it doesn't exist), or when the session stays
+                invalid for TASK_POLL_MAX_SESSION_ERRORS polls. Network
+                errors don't fail it, the task is polled again later.
+        """
+        task_id = int(task_id)
+        with self._condition:
+            task = self.tasks.get(task_id)
+            if task is None:
+                task = self.tasks[task_id] = WatchedTask(task_id, progress)
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(
+                    target=self._run, name="fmgtask", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+        if callback:
+            task.future.add_done_callback(callback)
+
+        return task.future
+
+    def watch_many(self, task_ids, callback=None, progress=None):
+        """
+        Watch several tasks until they finish.
+
+        Args:
+            task_ids (iterable): the task ids
+            callback (callable, optional): see watch()
+            progress (callable, optional): see watch()
+
+        Returns:
+            (dict): task id -> future
+        """
+        return {
+            int(task_id): self.watch(task_id, callback, progress)
+            for task_id in task_ids
+        }
+
+    def get_tasks(self):
+        """
+        Get the tasks being watched.
+
+        Returns:
+            (list): the WatchedTask objects, sorted by task id
+        """
+        with self._condition:
+            return [self.tasks[task_id] for task_id in sorted(self.tasks)]
+
+    def stop(self):
+        """Stop watching; the pending futures are cancelled."""
+        with self._condition:
+            self._stopped = True
+            thread = self._thread
+            self._condition.notify()
+
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+        with self._condition:
+            for task in self.tasks.values():
+                task.future.cancel()
+            self.tasks.clear()
+
+    def _run(self):
+        """Poll the tasks which are due, until no task is left."""
+        try:
+            while True:
+                with self._condition:
+                    while True:
+                        # The futures cancelled by their caller aren't polled
+                        for task in list(self.tasks.values()):
+                            if task.future.cancelled():
+                                del self.tasks[task.task_id]
+                        if self._stopped or not self.tasks:
+                            self._thread = None
+                            return
+                        now = time.monotonic()
+                        next_poll = min(task.next_poll for task in self.tasks.values())
+                        if next_poll <= now:
+                            break
+                        self._condition.wait(next_poll - now)
+
+                    due = [
+                        task
+                        for task in self.tasks.values()
+                        if task.next_poll <= now + TASK_POLL_COALESCE
+                    ]
+
+                with self.api.in_background():
+                    self._poll(due)
+        finally:
+            # After an unexpected error, the next watch() starts a new thread
+            with self._condition:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _poll(self, tasks):
+        """
+        Poll tasks in one multi-param request (or a few, for many tasks).
+
+        Args:
+            tasks (list): the WatchedTask objects
+        """
+        try:
+            responses = self.api.get_many(
+                [task.url for task in tasks], chunk_size=TASK_POLL_CHUNK_SIZE
+            )
+        except (
+            LoginFailed,
+            WrongResponseStatus,
+            requests.exceptions.RequestException,
+        ) as error:
+            # Try again later
+            logger.warning("Task polling failed: %s", error)
+            now = time.monotonic()
+            with self._condition:
+                self.errors += 1
+                for task in tasks:
+                    task.back_off(now)
+            return
+
+        now = time.monotonic()
+        finished = []
+        retried = []
+        with self._condition:
+            self.requests += -(-len(tasks) // TASK_POLL_CHUNK_SIZE)
+            self.polls += len(tasks)
+            for task, response in zip(tasks, responses):
+                result = response["result"][0]
+                status = result.get("status", {})
+                if status.get("code") == STATUS_INVALID_SESSION:
+                    task.session_errors += 1
+                if (
+                    status.get("code") in TASK_POLL_RETRY_CODES
+                    and task.session_errors < TASK_POLL_MAX_SESSION_ERRORS
+                ):
+                    task.back_off(now)
+                    retried.append(status)
+                    continue
+                if status.get("code") != 0:
+                    finished.append((task, WrongResponseStatus(task.url, status)))
+                    del self.tasks[task.task_id]
+                    continue
+
+                task.update(result.get("data") or {}, now)
+                if is_task_finished(task.data):
+                    finished.append((task, None))
+                    del self.tasks[task.task_id]
+
+            if retried:
+                self.errors += 1
+
+        if retried:
+            # Try again later
+            logger.warning(
+                "Task polling failed for %d tasks: %s (%s)",
+                len(retried),
+                retried[0].get("message"),
+                retried[0].get("code"),
+            )
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Polled %d tasks, %d finished, %d left",
+                len(tasks),
+                len(finished),
+                len(self.tasks),
+            )
+
+        for task in tasks:
+            if task.progress and task.data is not None:
+                task.progress(task.data)
+
+        for task, error in finished:
+            # A future which is running can't be cancelled anymore
+            if not task.future.set_running_or_notify_cancel():
+                continue
+            if error is not None:
+                task.future.set_exception(error)
+            else:
+                task.future.set_result(task.data)
@@ -1,12 +1,76 @@
 # coding=utf-8
 
-import fmgshell
+import argparse
+import os
+import sys
 
 
-def main():
-    shell = fmgshell.FMGShell()
-    shell.cmdloop()
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="fmgshell",
+        description="A FortiManager shell. With -c or -f, the commands are run "
+        "non-interactively and their output is printed in JSON, one line per "
+        "command. The password is read from the FMGSHELL_PASSWORD environment "
+        "variable; without it, only a session saved by a previous run can be "
+        "used.",
+    )
+    parser.add_argument(
+        "-c",
+        "--command",
+        action="append",
+        default=[],
+        help="Run a command, then exit (can be repeated)",
+    )
+    parser.add_argument(
+        "-f", "--file", help="Run the commands of a script file ('-' for stdin)"
+    )
+    parser.add_argument("-i", "--ip", help="FortiManager IP address or FQDN")
+    parser.add_argument("-u", "--username", help="FortiManager user name")
+    parser.add_argument(
+        "--port", type=int, default=443, help="FortiManager TCP port (default is 443)"
+    )
+    parser.add_argument(
+        "--proto",
+        choices=["https", "http"],
+        default="https",
+        help="Protocol (default is https)",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.command and not args.file:
+        # cmd2 is slow to import, only the interactive shell needs it
+        import fmgshell
+
+        # cmd2 would run the command line arguments as commands
+        sys.argv = sys.argv[:1]
+        shell = fmgshell.FMGShell()
+        if args.ip and args.username:
+            shell.onecmd_plus_hooks(
+                f"login -i {args.ip} -u {args.username} --port {args.port} "
+                f"--proto {args.proto}"
+            )
+        shell.cmdloop()
+        return 0
+
+    from fmgbatch import PASSWORD_ENV, Batch
+
+    batch = Batch(
+        args.ip,
+        args.username,
+        os.environ.get(PASSWORD_ENV),
+        args.port,
+        args.proto,
+    )
+
+    exit_status = batch.run_lines(args.command, sys.stdout)
+    if args.file == "-":
+        exit_status |= batch.run_lines(sys.stdin, sys.stdout)
+    elif args.file:
+        with open(args.file, encoding="utf-8") as f:
+            exit_status |= batch.run_lines(f, sys.stdout)
+
+    return exit_status
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,20 +1,20 @@
 # coding=utf-8
 
 import fmgjsonrpcapi
+from fmgmock import MockFMG
 
-fmg = fmgjsonrpcapi.FMGJSONRPCAPI()
-fmg.login("secops-labs-004.gcp.fortipoc.net", "devops", "fortinet", port=10407)
+with MockFMG() as mock:
+    fmg = fmgjsonrpcapi.FMGJSONRPCAPI()
+    fmg.login(mock.ip, mock.username, mock.password, mock.port, "http")
 
-url = "/um/object/list"
-payload = {
-    "data": {
-        "used_only": 1,
-        "version_list": 1,
-    },
-}
+    url = "/pm/config/adom/root/obj/firewall/address"
+    payload = {
+        "fields": ["name", "subnet"],
+        "range": [0, 2],
+    }
 
-fmg.debug("on")
-fmg.get(url, payload)
-fmg.debug("off")
+    fmg.debug("on")
+    fmg.get(url, payload)
+    fmg.debug("off")
 
-fmg.logout()
\ No newline at end of file
+    fmg.logout()
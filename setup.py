@@ -14,4 +14,5 @@ setuptools.setup(
     url="https://github.com/jpforcioli/fmgshell",
     packages=setuptools.find_packages(),
     python_requires=">=3.9",
+    extras_require={"http2": ["httpx[http2]"]},
 )
\ No newline at end of file
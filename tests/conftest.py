@@ -0,0 +1,7 @@
+# coding: utf-8
+"""The fmgshell modules are imported from their directory, as by main.py."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "fmgshell"))
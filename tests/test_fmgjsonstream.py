@@ -0,0 +1,81 @@
+# coding: utf-8
+"""Decode JSON RPC responses split in chunks of every size, and compare
+with json.loads()."""
+
+import json
+import random
+
+import pytest
+
+from fmgjsonstream import JSONRPCStream
+
+RESPONSES = [
+    '{"result":[{"data":[1.5e3,1]}]}',
+    '{"id": 1, "result": [{"status": {"code": 0, "message": "OK"}, '
+    '"url": "/a", "data": [-0.25, 12E-3, 1e+2, 100, -7, 3.0, 0]}]}',
+    '{"result":[{"data":{"n":1.25e-10,"s":"é€😀","b":[true,false,null]}}],'
+    '"id":12345}',
+    '{"result":[{"data":[]},{"data":[{"name":"a","v":[1,2.5]}],"url":"/b"}]}',
+    '{"result":[{"status":{"code":-3},"url":"/c"}],"id":-12}',
+    '{"result":[{"data":[123456789012345678901234567890, 6.02214076e23]}]}',
+    "{}",
+]
+
+
+def decode(body, chunk_sizes):
+    """
+    Decode a body sent in chunks.
+
+    Returns:
+        (tuple): the data of each result, and the response without the data
+    """
+    raw = body.encode()
+    chunks = []
+    idx = 0
+    for size in chunk_sizes:
+        if idx >= len(raw):
+            break
+        chunks.append(raw[idx : idx + size])
+        idx += size
+    chunks.append(raw[idx:])
+
+    stream = JSONRPCStream(chunks)
+    data = {}
+    for result_idx, item in stream:
+        data.setdefault(result_idx, []).append(item)
+
+    return data, stream.response
+
+
+def expected(body):
+    """Get what JSONRPCStream should yield for a body, with json.loads()."""
+    response = json.loads(body)
+    data = {}
+    for result_idx, result in enumerate(response.get("result", [])):
+        items = result.pop("data", None)
+        if isinstance(items, list):
+            if items:
+                data[result_idx] = items
+        elif items is not None:
+            data[result_idx] = [items]
+
+    return data, response
+
+
+@pytest.mark.parametrize("body", RESPONSES)
+@pytest.mark.parametrize("chunk_size", range(1, 17))
+def test_fixed_chunk_sizes(body, chunk_size):
+    assert decode(body, [chunk_size] * len(body)) == expected(body)
+
+
+@pytest.mark.parametrize("body", RESPONSES)
+def test_random_chunk_sizes(body):
+    rng = random.Random(body)
+    for _ in range(200):
+        chunk_sizes = [rng.randint(0, 8) for _ in range(len(body))]
+        assert decode(body, chunk_sizes) == expected(body)
+
+
+def test_truncated_body():
+    with pytest.raises(json.JSONDecodeError):
+        decode('{"result":[{"data":[1.5e', [3] * 10)